@@ -1,81 +1,103 @@
 import json
-import os
-from flask import Flask, Response
-from model import download_data, format_data, train_model, get_inference
-from config import model_file_path, TOKEN, TIMEFRAME, TRAINING_DAYS, REGION, DATA_PROVIDER, data_base_path, CG_API_KEY, MODEL
+import time
+from flask import Flask, Response, request
+from inference import get_inference, get_batch_inference, prediction_cache
+from retrain import warm_start, trigger_retrain, retrain_status, claim_finished_status
+from artifacts import artifact_caches
+from metrics import INFERENCE_REQUESTS, INFERENCE_SECONDS, record_update_status, render
+from tokens import TOKEN_REGISTRY
+from live_feed import KLINE_INTERVAL_MS
+from config import TIMEFRAME, REGION, DATA_PROVIDER, PREDICTION_HORIZONS
 
 app = Flask(__name__)
 
-def update_data():
-    print("Starting data update process...")
-    training_price_data_path = os.path.join(data_base_path, "price_data.csv")
-    
-    # Log config values
-    print(f"Config: TOKEN={TOKEN}, TRAINING_DAYS={TRAINING_DAYS}, TIMEFRAME={TIMEFRAME}, MODEL={MODEL}, REGION={REGION}, DATA_PROVIDER={DATA_PROVIDER}, CG_API_KEY={CG_API_KEY}")
-    
-    # Validate critical config values
-    if not TRAINING_DAYS or not TRAINING_DAYS.isdigit():
-        raise ValueError(f"TRAINING_DAYS must be a number, got: {TRAINING_DAYS}")
-    training_days = int(TRAINING_DAYS)  # Convert to integer
-    if training_days <= 0:
-        raise ValueError(f"TRAINING_DAYS must be positive, got: {training_days}")
-    if DATA_PROVIDER not in ["binance", "coingecko"]:
-        raise ValueError(f"DATA_PROVIDER must be 'binance' or 'coingecko', got: {DATA_PROVIDER}")
-    if DATA_PROVIDER == "coingecko" and not CG_API_KEY:
-        raise ValueError("CG_API_KEY is required for CoinGecko but is None")
+def _horizon_arg():
+    """The requested horizon (None for the default), or raise ValueError for one that isn't trained."""
+    horizon = request.args.get("horizon")
+    if horizon is not None and horizon.lower() not in PREDICTION_HORIZONS:
+        raise ValueError(f"Horizon not supported, must be one of {PREDICTION_HORIZONS}")
+    return horizon and horizon.lower()
 
-    # Force deletion of old price_data.csv to ensure fresh data
-    if os.path.exists(training_price_data_path):
-        print(f"Deleting existing {training_price_data_path}")
-        os.remove(training_price_data_path)
-    
-    try:
-        print(f"Downloading BTC data with TRAINING_DAYS={training_days}, REGION={REGION}, DATA_PROVIDER={DATA_PROVIDER}")
-        files_btc = download_data("BTC", training_days, REGION, DATA_PROVIDER)
-        print(f"Downloading ETH data with TRAINING_DAYS={training_days}, REGION={REGION}, DATA_PROVIDER={DATA_PROVIDER}")
-        files_eth = download_data("ETH", training_days, REGION, DATA_PROVIDER)
-        
-        if not files_btc or not files_eth:
-            print("Warning: No new data files downloaded for BTC or ETH")
-            if os.path.exists(training_price_data_path):
-                print(f"Using existing {training_price_data_path} for training")
-                train_model(TIMEFRAME)
-                return
-            else:
-                raise ValueError("No data files downloaded for BTC or ETH, and no existing price_data.csv")
-        
-        print("Formatting data...")
-        format_data(files_btc, files_eth, DATA_PROVIDER)
-        
-        if not os.path.exists(training_price_data_path):
-            raise FileNotFoundError(f"{training_price_data_path} was not created by format_data")
-        
-        print("Training model...")
-        train_model(TIMEFRAME)
-    except Exception as e:
-        print(f"Error in update_data: {str(e)}")
-        raise
+def _data_headers(inference):
+    """Headers telling the worker how old the data behind a prediction is, and whether it is a degraded answer."""
+    age = time.time() - (inference.bar_open_time + KLINE_INTERVAL_MS) / 1000
+    return {"X-Data-Stale": "true" if inference.stale else "false", "X-Data-Age": f"{max(age, 0):.0f}"}
 
 @app.route("/inference/<string:token>")
 def generate_inference(token):
-    if not token or token.upper() != TOKEN:
+    if not token or token.upper() not in TOKEN_REGISTRY:
         error_msg = "Token is required" if not token else "Token not supported"
         return Response(json.dumps({"error": error_msg}), status=400, mimetype='application/json')
     try:
-        inference = get_inference(token.upper(), TIMEFRAME, REGION, DATA_PROVIDER)
-        return Response(str(inference), status=200)
+        horizon = _horizon_arg()
+    except ValueError as e:
+        return Response(json.dumps({"error": str(e)}), status=400, mimetype='application/json')
+    start = time.perf_counter()
+    try:
+        inference = get_inference(token.upper(), TIMEFRAME, REGION, DATA_PROVIDER, horizon)
+        INFERENCE_REQUESTS.labels(token.upper(), "ok").inc()
+        return Response(str(inference.value), status=200, headers=_data_headers(inference))
     except Exception as e:
+        INFERENCE_REQUESTS.labels(token.upper(), "error").inc()
         return Response(json.dumps({"error": str(e)}), status=500, mimetype='application/json')
+    finally:
+        INFERENCE_SECONDS.labels(token.upper()).observe(time.perf_counter() - start)
+
+@app.route("/inference/batch")
+def generate_batch_inference():
+    # ?tokens=ETH,BTC (default: every served token)
+    tokens = [t.strip().upper() for t in request.args.get("tokens", ",".join(TOKEN_REGISTRY)).split(",") if t.strip()]
+    unsupported = [token for token in tokens if token not in TOKEN_REGISTRY]
+    if not tokens or unsupported:
+        error_msg = "Tokens are required" if not tokens else f"Tokens not supported: {unsupported}"
+        return Response(json.dumps({"error": error_msg}), status=400, mimetype='application/json')
+    try:
+        horizon = _horizon_arg()
+    except ValueError as e:
+        return Response(json.dumps({"error": str(e)}), status=400, mimetype='application/json')
+    predictions, errors = get_batch_inference(tokens, TIMEFRAME, REGION, DATA_PROVIDER, horizon)
+    for token in tokens:
+        INFERENCE_REQUESTS.labels(token, "error" if token in errors else "ok").inc()
+    body = {"predictions": {token: inference.value for token, inference in predictions.items()}}
+    stale = [token for token, inference in predictions.items() if inference.stale]
+    if stale:
+        body["stale"] = stale
+    if errors:
+        body["errors"] = errors
+    return Response(json.dumps(body), status=200 if predictions else 500, mimetype='application/json')
+
+@app.route("/model")
+def model_status():
+    status = {
+        "models": {token: cache.status() for token, cache in artifact_caches.items()},
+        "prediction_cache": prediction_cache.stats(),
+    }
+    return Response(json.dumps(status), status=200, mimetype='application/json')
+
+@app.route("/metrics")
+def metrics():
+    record_update_status(claim_finished_status())
+    body, content_type = render(artifact_caches, prediction_cache.stats())
+    return Response(body, status=200, content_type=content_type)
 
 @app.route("/update")
 def update():
+    # Retraining runs in its own process; inference keeps serving the current model meanwhile
     try:
-        update_data()
+        status, started = trigger_retrain()
+        print(f"Retrain job {status['job_id']} {'started' if started else 'already running'}")
         return "0"
     except Exception as e:
         print(f"Update failed: {str(e)}")
         return "1"
 
+@app.route("/update/status")
+def update_status():
+    status = retrain_status()
+    if status is None:
+        return Response(json.dumps({"state": "idle"}), status=200, mimetype='application/json')
+    return Response(json.dumps(status), status=200, mimetype='application/json')
+
 if __name__ == "__main__":
-    update_data()  # Regenerate data and train model on startup
+    warm_start()  # Serve the persisted models at once; stale or missing ones are retrained in the background
     app.run(host="0.0.0.0", port=8000)
@@ -0,0 +1,167 @@
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+import numpy as np
+from config import artifacts_path, TOKENS, SHARED_SERVING, SHARED_STATE_PATH
+
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 3
+SIDECAR_HEARTBEAT = "sidecar.alive"
+SIDECAR_TIMEOUT = 15
+
+ArtifactBundle = namedtuple("ArtifactBundle", ["version", "arrays", "objects", "metadata", "loaded_at"])
+
+def publish_artifacts(arrays, metadata=None, objects=None, path=artifacts_path):
+    """Publish named NumPy arrays and their metadata as one new version and make it current.
+
+    Each array is stored as <name>.npy next to meta.json; objects that are not plain arrays
+    (such as a KD-tree's counters and metric) are pickled to <name>.pkl. The bundle is written to a
+    temporary directory and renamed into place, then the CURRENT pointer is atomically
+    replaced, so readers never see a partial or mixed bundle.
+    """
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    os.makedirs(path, exist_ok=True)
+    tmp_dir = os.path.join(path, f".tmp-{version}")
+    os.makedirs(tmp_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+    for name, obj in (objects or {}).items():
+        with open(os.path.join(tmp_dir, f"{name}.pkl"), "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({"version": version, "created_at": time.time(), **(metadata or {})}, f)
+    os.rename(tmp_dir, os.path.join(path, version))
+    write_pointer(os.path.join(path, CURRENT_FILE), version)
+
+    _prune_versions(path, version)
+    return version
+
+def write_pointer(pointer_path, version):
+    """Atomically point pointer_path at version."""
+    tmp_pointer = f"{pointer_path}.tmp"
+    with open(tmp_pointer, "w") as f:
+        f.write(version)
+    os.replace(tmp_pointer, pointer_path)
+
+def _prune_versions(path, current_version):
+    versions = sorted(name for name in os.listdir(path) if not name.startswith(".") and name != CURRENT_FILE and os.path.isdir(os.path.join(path, name)))
+    for version in versions[:-KEEP_VERSIONS]:
+        if version != current_version:
+            shutil.rmtree(os.path.join(path, version), ignore_errors=True)
+
+def current_version(path=artifacts_path):
+    with open(os.path.join(path, CURRENT_FILE)) as f:
+        return f.read().strip()
+
+def load_bundle(path=artifacts_path, version=None):
+    """The bundle of a version (default: the current one).
+
+    Arrays are memory-mapped read-only rather than read, so every process serving the same
+    version shares one copy in the page cache. A pruned version's files stay readable for as
+    long as a process still maps them.
+    """
+    version = version or current_version(path)
+    version_dir = os.path.join(path, version)
+    with open(os.path.join(version_dir, "meta.json")) as f:
+        metadata = json.load(f)
+    arrays = {}
+    objects = {}
+    for name in os.listdir(version_dir):
+        if name.endswith(".npy"):
+            arrays[name[:-len(".npy")]] = np.load(os.path.join(version_dir, name), mmap_mode="r")
+        elif name.endswith(".pkl"):
+            with open(os.path.join(version_dir, name), "rb") as f:
+                objects[name[:-len(".pkl")]] = pickle.load(f)
+    return ArtifactBundle(version, arrays, objects, metadata, time.time())
+
+def serving_pointer_path(token, path=SHARED_STATE_PATH):
+    return os.path.join(path, f"{token}.serving")
+
+def sidecar_alive(path=SHARED_STATE_PATH):
+    try:
+        return time.time() - os.stat(os.path.join(path, SIDECAR_HEARTBEAT)).st_mtime < SIDECAR_TIMEOUT
+    except FileNotFoundError:
+        return False
+
+class ArtifactCache:
+    """Keeps the current model bundle in memory and swaps to new versions as they are published.
+
+    Each lookup only stats the pointer. When it changes, one thread loads the new bundle
+    while the others keep serving the previous one. The pointer is CURRENT, or under shared
+    serving the serving pointer the sidecar moves once it has loaded a version, so that every
+    worker switches together; CURRENT is followed again whenever the sidecar isn't running.
+    """
+
+    def __init__(self, path=artifacts_path, serving_pointer=None):
+        self.path = path
+        self.serving_pointer = serving_pointer
+        self._bundle = None
+        self._pointer_signature = None
+        self._lock = threading.Lock()
+
+    def _pointer_path(self):
+        if self.serving_pointer is not None and sidecar_alive() and os.path.exists(self.serving_pointer):
+            return self.serving_pointer
+        return os.path.join(self.path, CURRENT_FILE)
+
+    def _read_pointer_signature(self):
+        pointer_path = self._pointer_path()
+        try:
+            stat = os.stat(pointer_path)
+        except FileNotFoundError:
+            return None
+        return pointer_path, stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        signature = self._read_pointer_signature()
+        bundle = self._bundle
+        if bundle is not None and (signature is None or signature == self._pointer_signature):
+            return bundle
+        if signature is None:
+            raise FileNotFoundError(f"No model has been published to {self.path} yet")
+
+        # Only the very first load blocks; later swaps never hold up serving threads
+        if not self._lock.acquire(blocking=bundle is None):
+            return bundle
+        try:
+            if self._bundle is None or self._pointer_signature != signature:
+                try:
+                    with open(signature[0]) as f:
+                        self._bundle = load_bundle(self.path, f.read().strip())
+                    print(f"Loaded model version {self._bundle.version}")
+                except Exception as e:
+                    if self._bundle is None:
+                        raise
+                    print(f"Failed to load new model version, keeping {self._bundle.version}: {str(e)}")
+                self._pointer_signature = signature
+            return self._bundle
+        finally:
+            self._lock.release()
+
+    def current(self):
+        """The bundle get() serves now, for reporting: it follows the pointer like a request
+        would, without waiting on a load in progress; None while no model can be loaded."""
+        try:
+            return self.get()
+        except Exception:
+            return self._bundle
+
+    def status(self):
+        bundle = self.current()
+        if bundle is None:
+            return {"version": None, "loaded_at": None}
+        return {"version": bundle.version, "loaded_at": bundle.loaded_at, "created_at": bundle.metadata["created_at"]}
+
+def token_artifacts_path(token, path=artifacts_path):
+    return os.path.join(path, token)
+
+# One model per served token, each published under its own directory
+artifact_caches = {
+    token: ArtifactCache(token_artifacts_path(token), serving_pointer_path(token) if SHARED_SERVING else None)
+    for token in TOKENS
+}
@@ -0,0 +1,86 @@
+"""Microbenchmarks of kline decoding: kline_decode against the frame-per-cell code it replaced.
+
+Payloads are synthetic REST klines (bench.fake_exchange) and CoinGecko OHLC rows, at several
+row counts (the REST limit) and symbol counts. Times are the median of --repeat runs, in ms.
+
+    python -m bench.decode
+    python -m bench.decode --rows 500 1000 5000 --symbols 1 2 8
+"""
+import argparse
+import json
+import statistics
+import time
+import numpy as np
+import pandas as pd
+from bench.fake_exchange import BASE_PRICES, KLINE_INTERVAL_MS, _rows
+from kline_decode import decode_binance_klines, decode_coingecko_ohlc, klines_frame
+
+def legacy_binance(payload):
+    # download_binance_current_day_data before kline_decode
+    resp = str(payload, 'utf-8').rstrip()
+    columns = ['start_time','open','high','low','close','volume','end_time','volume_usd','n_trades','taker_volume','taker_volume_usd','ignore']
+    df = pd.DataFrame(json.loads(resp), columns=columns)
+    df['date'] = [pd.to_datetime(x+1, unit='ms') for x in df['end_time']]
+    df['date'] = df['date'].apply(pd.to_datetime)
+    df[["volume", "taker_volume", "open", "high", "low", "close"]] = df[["volume", "taker_volume", "open", "high", "low", "close"]].apply(pd.to_numeric)
+    return df.sort_index()
+
+def legacy_coingecko(payload):
+    # download_coingecko_current_day_data before kline_decode
+    resp = str(payload, 'utf-8').rstrip()
+    columns = ['timestamp','open','high','low','close']
+    df = pd.DataFrame(json.loads(resp), columns=columns)
+    df['date'] = [pd.to_datetime(x, unit='ms') for x in df['timestamp']]
+    df['date'] = df['date'].apply(pd.to_datetime)
+    df[["open", "high", "low", "close"]] = df[["open", "high", "low", "close"]].apply(pd.to_numeric)
+    return df.sort_index()
+
+def binance_payload(pair, n_rows):
+    end = int(time.time() * 1000) // KLINE_INTERVAL_MS * KLINE_INTERVAL_MS
+    return json.dumps(_rows(pair, np.arange(end - (n_rows - 1) * KLINE_INTERVAL_MS, end + 1, KLINE_INTERVAL_MS))).encode()
+
+def coingecko_payload(pair, n_rows):
+    # CoinGecko sends numbers, not strings, stamped with each candle's close time
+    return json.dumps([[int(row[6]) + 1] + [float(x) for x in row[1:5]] for row in json.loads(binance_payload(pair, n_rows))]).encode()
+
+def _median_ms(fn, repeat):
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+def run(rows=(500, 1000), symbols=(1, 2, 8), repeat=20):
+    pairs = list(BASE_PRICES)
+    results = {}
+    for n_rows in rows:
+        for n_symbols in symbols:
+            chosen = [pairs[i % len(pairs)] for i in range(n_symbols)]
+            binance = [binance_payload(pair, n_rows) for pair in chosen]
+            coingecko = [coingecko_payload(pair, n_rows) for pair in chosen]
+            timings = {
+                "binance_legacy": _median_ms(lambda: [legacy_binance(p) for p in binance], repeat),
+                "binance_columns": _median_ms(lambda: [decode_binance_klines(p) for p in binance], repeat),
+                "binance_frame": _median_ms(lambda: [klines_frame(decode_binance_klines(p)) for p in binance], repeat),
+                "coingecko_legacy": _median_ms(lambda: [legacy_coingecko(p) for p in coingecko], repeat),
+                "coingecko_columns": _median_ms(lambda: [decode_coingecko_ohlc(p) for p in coingecko], repeat),
+            }
+            results[f"{n_rows}x{n_symbols}"] = {"rows": n_rows, "symbols": n_symbols, "ms": timings}
+            print(
+                f"{n_rows} rows x {n_symbols} symbols: binance {timings['binance_legacy']:.2f} -> {timings['binance_columns']:.2f}ms "
+                f"({timings['binance_frame']:.2f}ms as a frame), coingecko {timings['coingecko_legacy']:.2f} -> {timings['coingecko_columns']:.2f}ms"
+            )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", nargs="+", type=int, default=[500, 1000])
+    parser.add_argument("--symbols", nargs="+", type=int, default=[1, 2, 8])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.rows, args.symbols, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Local stand-in for the Binance and CoinGecko endpoints the node talks to, serving synthetic 1m klines.
+
+Serves the REST klines endpoint, the combined kline websocket stream, and the daily kline
+zips with their .CHECKSUM files. Prices are a deterministic function of symbol and open
+time, so every endpoint agrees with every other one for any date. Point the node at it
+with BINANCE_API_URL / BINANCE_DATA_URL=http://host:port and BINANCE_WS_URL=ws://host:port.
+
+It also serves CoinGecko's /coins/{id}/ohlc under /coingecko (COINGECKO_API_URL=http://host:port/coingecko),
+with an ETag and Last-Modified that change only when a candle closes, answering 304 to a
+matching If-None-Match or If-Modified-Since.
+
+Rate limits are simulated like the real services: with --weight-limit the REST API counts
+request weight per clock minute, reports it in X-MBX-USED-WEIGHT-1M, answers 429 with a
+Retry-After once over, and bans with 418 a client that keeps going. --cg-calls-per-minute
+does the same for CoinGecko calls per API key (429 only). /stats counts what was throttled.
+
+Failed transfers are staged by appending to app["faults"], which the next daily zip
+downloads take up in order: "corrupt" serves wrong bytes, "ignore_range" answers a Range
+request with the whole file (200), "unsatisfiable_range" answers 416.
+
+    python -m bench.fake_exchange --port 8765
+    python -m bench.fake_exchange --port 8765 --weight-limit 300 --cg-calls-per-minute 10
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import time
+import zipfile
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import lru_cache
+import numpy as np
+from aiohttp import web
+
+KLINE_INTERVAL_MS = 60_000
+MS_PER_DAY = 86_400_000
+BASE_PRICES = {"BTCUSDT": 60_000.0, "ETHUSDT": 2_500.0, "SOLUSDT": 150.0, "BNBUSDT": 550.0, "ARBUSDT": 0.8}
+COINGECKO_PAIRS = {"bitcoin": "BTCUSDT", "ethereum": "ETHUSDT", "solana": "SOLUSDT", "binancecoin": "BNBUSDT", "arbitrum": "ARBUSDT"}
+KLINES_WEIGHT = 2
+# 429s within one minute after which a client is banned (418), and for how long
+BAN_AFTER_THROTTLED = 10
+BAN_SECONDS = 120
+
+def _noise(x):
+    # Cheap deterministic pseudo-random values in [0, 1)
+    return np.modf(np.abs(np.sin(x) * 43758.5453))[0]
+
+def synthetic_klines(pair, open_times):
+    """(rows x [open, high, low, close, volume]) bars of a symbol at the given open times (ms)."""
+    base = BASE_PRICES.get(pair, 100.0 + int(hashlib.sha1(pair.encode()).hexdigest()[:4], 16) % 1000)
+    seed = int(hashlib.sha1(pair.encode()).hexdigest()[:6], 16) % 1000
+    minutes = np.asarray(open_times, dtype=np.int64) // KLINE_INTERVAL_MS
+
+    def price(m):
+        m = m.astype(np.float64)
+        return base * (1 + 0.08 * np.sin(m / 20_000 + seed) + 0.02 * np.sin(m / 900 + seed) + 0.002 * (_noise(m + seed) - 0.5))
+
+    open_, close = price(minutes), price(minutes + 1)
+    spread = base * 0.001 * _noise(minutes * 1.7 + seed)
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = 10 + 90 * _noise(minutes * 3.1 + seed)
+    return np.column_stack([open_, high, low, close, volume])
+
+def _rows(pair, open_times):
+    """Klines in the layout of the REST API and of the daily CSVs."""
+    bars = synthetic_klines(pair, open_times)
+    return [
+        [int(t), f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", f"{v:.4f}", int(t) + KLINE_INTERVAL_MS - 1, f"{v * c:.4f}", 100, f"{v / 2:.4f}", f"{v * c / 2:.4f}", "0"]
+        for t, (o, h, l, c, v) in zip(open_times, bars)
+    ]
+
+@lru_cache(maxsize=4096)
+def daily_zip(pair, day):
+    """The daily kline zip of one symbol and date, as bytes."""
+    start = int(datetime.combine(date.fromisoformat(day), datetime.min.time(), tzinfo=timezone.utc).timestamp() * 1000)
+    open_times = np.arange(start, start + MS_PER_DAY, KLINE_INTERVAL_MS)
+    csv = "\n".join(",".join(str(x) for x in row) for row in _rows(pair, open_times)) + "\n"
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr(f"{pair}-1m-{day}.csv", csv)
+    return buffer.getvalue()
+
+def _current_open_time():
+    return int(time.time() * 1000) // KLINE_INTERVAL_MS * KLINE_INTERVAL_MS
+
+async def _delay(request):
+    if request.app["delay"]:
+        await asyncio.sleep(request.app["delay"])
+
+class MinuteCounter:
+    """Usage per key in the current clock minute, as Binance and CoinGecko count it."""
+
+    def __init__(self):
+        self.minute = None
+        self.used = {}
+
+    def add(self, key, amount):
+        minute = int(time.time() // 60)
+        if minute != self.minute:
+            self.minute, self.used = minute, {}
+        self.used[key] = self.used.get(key, 0) + amount
+        return self.used[key]
+
+    @staticmethod
+    def seconds_left():
+        return 60 - time.time() % 60
+
+def _throttled(request, status, retry_after, headers=None):
+    request.app["requests"]["throttled" if status == 429 else "banned"] += 1
+    return web.Response(status=status, headers={"Retry-After": str(int(retry_after) + 1), **(headers or {})})
+
+def _weigh(request, weight):
+    """Count a REST call's weight; a 429 or 418 response once the minute's budget is spent, else None."""
+    app = request.app
+    if not app["weight_limit"]:
+        return None
+    now = time.time()
+    if now < app["banned_until"]:
+        return _throttled(request, 418, app["banned_until"] - now)
+    used = app["weight"].add("ip", weight)
+    headers = {"X-MBX-USED-WEIGHT-1M": str(used)}
+    if used <= app["weight_limit"]:
+        request["headers"] = headers
+        return None
+    if app["strikes"].add("ip", 1) > BAN_AFTER_THROTTLED:
+        app["banned_until"] = now + BAN_SECONDS
+        return _throttled(request, 418, BAN_SECONDS, headers)
+    return _throttled(request, 429, MinuteCounter.seconds_left(), headers)
+
+async def klines(request):
+    await _delay(request)
+    request.app["requests"]["klines"] += 1
+    throttled = _weigh(request, KLINES_WEIGHT)
+    if throttled is not None:
+        return throttled
+    pair = request.query["symbol"]
+    limit = min(int(request.query.get("limit", 500)), 1000)
+    current = _current_open_time()
+    end = min(int(request.query.get("endTime", current)), current) // KLINE_INTERVAL_MS * KLINE_INTERVAL_MS
+    if "startTime" in request.query:
+        start = -(-int(request.query["startTime"]) // KLINE_INTERVAL_MS) * KLINE_INTERVAL_MS
+        open_times = np.arange(start, end + 1, KLINE_INTERVAL_MS)[:limit]
+    else:
+        open_times = np.arange(end - (limit - 1) * KLINE_INTERVAL_MS, end + 1, KLINE_INTERVAL_MS)
+    return web.json_response(_rows(pair, open_times), headers=request.get("headers"))
+
+def coingecko_ohlc_rows(pair, days, now_ms):
+    """CoinGecko OHLC rows [close time, open, high, low, close] of the closed candles in the last `days`,
+    at its automatic granularity: 30m up to 2 days, 4h up to 30 days, 4 days beyond."""
+    width = (30 if days <= 2 else 240 if days <= 30 else 5760) * KLINE_INTERVAL_MS
+    last_close = now_ms // width * width
+    closes = np.arange(last_close - (days * MS_PER_DAY // width - 1) * width, last_close + 1, width)
+    first, last = synthetic_klines(pair, closes - width), synthetic_klines(pair, closes - KLINE_INTERVAL_MS)
+    return [
+        [int(t), round(float(o), 2), round(float(max(h, h2)), 2), round(float(min(l, l2)), 2), round(float(c), 2)]
+        for t, (o, h, l, _, _), (_, h2, l2, c, _) in zip(closes, first, last)
+    ]
+
+async def coingecko_ohlc(request):
+    await _delay(request)
+    app = request.app
+    app["requests"]["coingecko"] += 1
+    if app["cg_calls_per_minute"]:
+        key = request.query.get("x_cg_demo_api_key") or request.query.get("api_key") or request.remote
+        if app["cg_calls"].add(key, 1) > app["cg_calls_per_minute"]:
+            return _throttled(request, 429, MinuteCounter.seconds_left())
+    pair = COINGECKO_PAIRS.get(request.match_info["coin_id"])
+    if pair is None:
+        return web.json_response({"error": "coin not found"}, status=404)
+    days = request.query.get("days", "1")
+    days = 365 * 4 if days == "max" else int(days)
+    rows = coingecko_ohlc_rows(pair, days, int(time.time() * 1000))
+    body = json.dumps(rows).encode()
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    last_modified = datetime.fromtimestamp(rows[-1][0] / 1000, timezone.utc)
+    headers = {"ETag": etag, "Last-Modified": format_datetime(last_modified, usegmt=True), "Cache-Control": "public, max-age=30"}
+    since = request.headers.get("If-Modified-Since")
+    if request.headers.get("If-None-Match") == etag or (
+            "If-None-Match" not in request.headers and since and last_modified <= parsedate_to_datetime(since)):
+        app["requests"]["not_modified"] += 1
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type="application/json", headers=headers)
+
+async def daily_file(request):
+    await _delay(request)
+    request.app["requests"]["daily"] += 1
+    pair, name = request.match_info["pair"], request.match_info["name"]
+    checksum = name.endswith(".CHECKSUM")
+    zip_name = name[:-len(".CHECKSUM")] if checksum else name
+    day = zip_name[len(f"{pair}-1m-"):-len(".zip")]
+    try:
+        if not zip_name.startswith(f"{pair}-1m-") or date.fromisoformat(day) >= datetime.now(timezone.utc).date():
+            raise ValueError(day)
+    except ValueError:
+        return web.Response(status=404)
+    data = daily_zip(pair, day)
+    if checksum:
+        return web.Response(text=f"{hashlib.sha256(data).hexdigest()}  {zip_name}\n")
+    fault = request.app["faults"].pop(0) if request.app["faults"] else None
+    if fault == "unsatisfiable_range":
+        return web.Response(status=416, headers={"Content-Range": f"bytes */{len(data)}"})
+    if fault == "corrupt":
+        data = bytes(b ^ 0xFF for b in data[:64]) + data[64:]
+    if fault != "ignore_range" and request.headers.get("Range", "").startswith("bytes="):
+        start = int(request.headers["Range"][len("bytes="):].split("-")[0])
+        return web.Response(status=206, body=data[start:], headers={"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"})
+    return web.Response(body=data)
+
+async def stream(request):
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    pairs = [name.split("@")[0].upper() for name in request.query.get("streams", "").split("/") if name]
+    request.app["streams"].add(ws)
+    try:
+        while not ws.closed:
+            # Every tick repeats the last closed bar of each symbol, like a stream that just closed it
+            last_closed = _current_open_time() - KLINE_INTERVAL_MS
+            for pair in pairs:
+                t, o, h, l, c, v = _rows(pair, [last_closed])[0][:6]
+                await ws.send_str(json.dumps({"stream": f"{pair.lower()}@kline_1m", "data": {"e": "kline", "s": pair, "k": {
+                    "t": t, "T": t + KLINE_INTERVAL_MS - 1, "s": pair, "i": "1m", "o": o, "h": h, "l": l, "c": c, "v": v, "x": True,
+                }}}))
+            try:
+                # Reading between ticks answers the client's close frame
+                await ws.receive(timeout=request.app["tick"])
+            except asyncio.TimeoutError:
+                pass
+    except ConnectionError:
+        pass
+    finally:
+        request.app["streams"].discard(ws)
+    return ws
+
+async def close_streams(app):
+    for ws in list(app["streams"]):
+        await ws.close(code=web.WSCloseCode.GOING_AWAY)
+
+async def stats(request):
+    return web.json_response(request.app["requests"])
+
+def make_app(delay=0.0, tick=1.0, weight_limit=None, cg_calls_per_minute=None):
+    app = web.Application()
+    app["delay"] = delay
+    app["tick"] = tick
+    app["weight_limit"] = weight_limit
+    app["cg_calls_per_minute"] = cg_calls_per_minute
+    app["weight"], app["strikes"], app["cg_calls"] = MinuteCounter(), MinuteCounter(), MinuteCounter()
+    app["banned_until"] = 0.0
+    app["requests"] = {"klines": 0, "daily": 0, "coingecko": 0, "not_modified": 0, "throttled": 0, "banned": 0}
+    app["streams"] = set()
+    app["faults"] = []
+    app.on_shutdown.append(close_streams)
+    app.router.add_get("/api/v3/klines", klines)
+    app.router.add_get("/coingecko/api/v3/coins/{coin_id}/ohlc", coingecko_ohlc)
+    app.router.add_get("/data/spot/daily/klines/{pair}/1m/{name}", daily_file)
+    app.router.add_get("/stream", stream)
+    app.router.add_get("/stats", stats)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every REST and download response")
+    parser.add_argument("--tick", type=float, default=1.0, help="seconds between websocket messages")
+    parser.add_argument("--weight-limit", type=int, help="REST request weight allowed per minute (default: unlimited)")
+    parser.add_argument("--cg-calls-per-minute", type=int, help="CoinGecko calls allowed per minute and API key (default: unlimited)")
+    args = parser.parse_args()
+    web.run_app(make_app(args.delay, args.tick, args.weight_limit, args.cg_calls_per_minute), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""Benchmarks of the node against a local fake exchange, written as machine-readable JSON.
+
+Suites:
+  update     end-to-end update_data (download, parse, featurize, fit, persist) per training
+             window, cold (empty data directory) and warm (files and caches in place)
+  memory     peak RSS of format_data and load_frame on one window's data
+  inference  /inference latency (p50/p90/p99) and throughput under concurrent load, served
+             by gunicorn with gunicorn_conf.py
+  decode     kline decoding of REST and CoinGecko payloads against the code it replaced (bench.decode)
+  ratelimit  live fetch latency and upstream 429s while a backfill competes for the request weight
+             budget of a second, rate-limited fake exchange; CoinGecko revalidations (304s)
+
+    python -m bench.run
+    python -m bench.run --suite inference --concurrency 32 --duration 30
+    python -m bench.run --suite update --days 30 90 365 --output bench/results
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import aiohttp
+import numpy as np
+import requests
+from bench.tasks import RESULT_PREFIX
+
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_for(url, timeout, process=None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode} before {url} came up")
+        try:
+            if requests.get(url, timeout=5).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} did not answer within {timeout}s")
+
+def node_env(app_base_path, exchange_url, training_days, token):
+    env = dict(os.environ)
+    env.update(
+        APP_BASE_PATH=app_base_path,
+        TOKEN=token,
+        TRAINING_DAYS=str(training_days),
+        TIMEFRAME="1m",
+        REGION="com",
+        DATA_PROVIDER="binance",
+        BINANCE_API_URL=exchange_url,
+        BINANCE_DATA_URL=exchange_url,
+        BINANCE_WS_URL=exchange_url.replace("http://", "ws://"),
+    )
+    env.setdefault("MODEL", "LinearRegression")
+    return env
+
+def run_task(task, env):
+    """Run one bench.tasks task in a fresh interpreter and return its result."""
+    process = subprocess.run([sys.executable, "-m", "bench.tasks", task], cwd=repo_path, env=env, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"bench task {task} failed:\n{process.stderr[-2000:]}")
+    for line in reversed(process.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"bench task {task} printed no result")
+
+def _window_env(args, exchange_url, days):
+    path = os.path.join(args.workdir, f"window-{days}d")
+    os.makedirs(path, exist_ok=True)
+    return node_env(path, exchange_url, days, args.token)
+
+def _ensure_trained(args, exchange_url, days):
+    env = _window_env(args, exchange_url, days)
+    if not os.path.exists(os.path.join(env["APP_BASE_PATH"], "data", "artifacts", args.token, "CURRENT")):
+        print(f"Preparing a {days}-day window...")
+        run_task("update", env)
+    return env
+
+def bench_update(args, exchange_url):
+    results = {}
+    for days in args.days:
+        env = _window_env(args, exchange_url, days)
+        shutil.rmtree(os.path.join(env["APP_BASE_PATH"], "data"), ignore_errors=True)
+        print(f"update_data, {days} days: cold...")
+        cold = run_task("update", env)
+        print(f"update_data, {days} days: warm...")
+        warm = run_task("update", env)
+        results[f"{days}d"] = {"cold": cold, "warm": warm}
+        print(f"  cold {cold['seconds']:.2f}s, warm {warm['seconds']:.2f}s")
+    return results
+
+def bench_memory(args, exchange_url):
+    env = _ensure_trained(args, exchange_url, args.memory_days)
+    print(f"format_data / load_frame peak RSS, {args.memory_days} days...")
+    results = {"days": args.memory_days, "format_data": run_task("format", env), "load_frame": run_task("load", env)}
+    print(f"  format_data {results['format_data']['peak_rss_mb']:.0f} MB, load_frame {results['load_frame']['peak_rss_mb']:.0f} MB")
+    return results
+
+async def _load(url, concurrency, duration):
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + duration
+
+    async def client(session):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    status = str(response.status)
+            except aiohttp.ClientError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return np.array(latencies), statuses, elapsed
+
+def bench_inference(args, exchange_url):
+    import gunicorn_conf
+    env = _ensure_trained(args, exchange_url, args.inference_days)
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/inference/{args.token}"
+    # --bind overrides the config's port; every other setting comes from gunicorn_conf.py
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--conf", os.path.join(repo_path, "gunicorn_conf.py"), "--bind", f"127.0.0.1:{port}", "app:app"],
+        cwd=repo_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for(url, 120, server)
+        time.sleep(args.warmup)
+        print(f"/inference load: {args.concurrency} clients for {args.duration}s...")
+        latencies, statuses, elapsed = asyncio.run(_load(url, args.concurrency, args.duration))
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    ms = latencies * 1000
+    results = {
+        "days": args.inference_days,
+        "concurrency": args.concurrency,
+        "duration": elapsed,
+        "gunicorn": {"workers": gunicorn_conf.workers, "threads": gunicorn_conf.threads, "worker_class": gunicorn_conf.worker_class},
+        "requests": len(latencies),
+        "statuses": statuses,
+        "throughput_rps": len(latencies) / elapsed,
+        "latency_ms": {
+            "mean": float(ms.mean()),
+            "p50": float(np.percentile(ms, 50)),
+            "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)),
+            "max": float(ms.max()),
+        },
+    }
+    print(f"  {results['throughput_rps']:.0f} req/s, p50 {results['latency_ms']['p50']:.2f}ms, p99 {results['latency_ms']['p99']:.2f}ms, statuses {statuses}")
+    return results
+
+def bench_decode(args, exchange_url):
+    from bench import decode
+    print("Kline decoding microbenchmarks...")
+    return decode.run(args.decode_rows, args.decode_symbols)
+
+def bench_ratelimit(args, exchange_url):
+    # The shared exchange is unlimited; this suite runs its own, with budgets tight enough to bind
+    port = _free_port()
+    limited_url = f"http://127.0.0.1:{port}"
+    exchange = subprocess.Popen(
+        [sys.executable, "-m", "bench.fake_exchange", "--port", str(port), "--weight-limit", str(args.weight_limit), "--cg-calls-per-minute", "10"],
+        cwd=repo_path,
+    )
+    try:
+        _wait_for(f"{limited_url}/stats", 30, exchange)
+        path = os.path.join(args.workdir, "ratelimit")
+        env = node_env(path, limited_url, 1, args.token)
+        env.update(
+            LIVE_FETCH_URLS=limited_url,
+            BINANCE_WEIGHT_PER_MINUTE=str(args.weight_limit),
+            COINGECKO_API_URL=f"{limited_url}/coingecko",
+            COINGECKO_CALLS_PER_MINUTE="10",
+            CG_API_KEY="bench",
+            SHARED_STATE_PATH=os.path.join(path, "state"),
+            BENCH_RATE_LIMIT_SECONDS=str(args.rate_limit_duration),
+        )
+        print(f"Live fetches against a backfill, {args.weight_limit} weight/minute, {args.rate_limit_duration:.0f}s...")
+        results = run_task("rate_limits", env)
+        results["exchange"] = requests.get(f"{limited_url}/stats", timeout=5).json()
+    finally:
+        exchange.terminate()
+        exchange.wait(timeout=30)
+    live, upstream = results["live"], results["exchange"]
+    print(f"  live p50 {live['latency_ms']['p50']:.1f}ms, max {live['latency_ms']['max']:.1f}ms, sources {live['sources']}; "
+          f"backfill {results['backfill']}; upstream 429s {upstream['throttled']}, 418s {upstream['banned']}, 304s {upstream['not_modified']}")
+    return results
+
+SUITES = {"update": bench_update, "memory": bench_memory, "inference": bench_inference, "decode": bench_decode, "ratelimit": bench_ratelimit}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_path, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the node against a local fake exchange")
+    parser.add_argument("--suite", nargs="+", choices=list(SUITES), default=list(SUITES))
+    parser.add_argument("--days", nargs="+", type=int, default=[30, 90, 365], help="training windows of the update suite")
+    parser.add_argument("--memory-days", type=int, default=90)
+    parser.add_argument("--inference-days", type=int, default=30)
+    parser.add_argument("--decode-rows", nargs="+", type=int, default=[500, 1000], help="klines per payload of the decode suite")
+    parser.add_argument("--decode-symbols", nargs="+", type=int, default=[1, 2, 8], help="payloads decoded together by the decode suite")
+    parser.add_argument("--weight-limit", type=int, default=600, help="request weight per minute of the ratelimit suite's exchange")
+    parser.add_argument("--rate-limit-duration", type=float, default=60.0, help="seconds of the ratelimit suite")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds between the server answering and the load")
+    parser.add_argument("--token", default="ETH")
+    parser.add_argument("--exchange-delay", type=float, default=0.0, help="seconds the fake exchange adds to every response")
+    parser.add_argument("--workdir", help="data directory to reuse between runs (default: a temporary one)")
+    parser.add_argument("--output", default=os.path.join(repo_path, "bench", "results"), help="directory for the JSON results")
+    args = parser.parse_args()
+
+    temporary = args.workdir is None
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="bench-")
+    exchange_port = _free_port()
+    exchange_url = f"http://127.0.0.1:{exchange_port}"
+    exchange = subprocess.Popen(
+        [sys.executable, "-m", "bench.fake_exchange", "--port", str(exchange_port), "--tick", "0.5", "--delay", str(args.exchange_delay)],
+        cwd=repo_path,
+    )
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "args": {key: value for key, value in vars(args).items() if key not in ["workdir", "output"]},
+        "results": {},
+    }
+    try:
+        _wait_for(f"{exchange_url}/stats", 30, exchange)
+        for suite in args.suite:
+            report["results"][suite] = SUITES[suite](args, exchange_url)
+    finally:
+        exchange.terminate()
+        exchange.wait(timeout=30)
+        if temporary:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+    os.makedirs(args.output, exist_ok=True)
+    output_file = os.path.join(args.output, f"bench-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json")
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output_file}")
+
+if __name__ == "__main__":
+    main()
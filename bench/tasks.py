@@ -0,0 +1,126 @@
+"""Benchmark tasks, each run by bench.run in a fresh interpreter.
+
+One task per process keeps timings and peak RSS free of earlier work. The node is
+configured through the environment as usual; the task prints one RESULT_PREFIX line of JSON.
+
+    python -m bench.tasks update|format|load|rate_limits
+"""
+import glob
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+RESULT_PREFIX = "BENCH_RESULT "
+
+def _rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    return resource.getrusage(who).ru_maxrss / 1024  # KiB on Linux
+
+def update():
+    from retrain import update_data
+    from metrics import update_stages
+    start = time.perf_counter()
+    result = update_data()
+    return {
+        "seconds": time.perf_counter() - start,
+        "stages": update_stages.durations,
+        "rows": {token: metadata["rows"] for token, metadata in result.items()},
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def format_data():
+    import model
+    from tokens import registry_pairs
+    files_by_pair = {pair: sorted(glob.glob(os.path.join(model.binance_data_path, f"{pair}-1m-*.zip"))) for pair in registry_pairs()}
+    # ru_maxrss is the peak over the process' life, so the baseline after imports is reported too
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    rows = model.format_data(files_by_pair, "binance")
+    return {
+        "seconds": time.perf_counter() - start,
+        "rows": rows,
+        "files": sum(len(files) for files in files_by_pair.values()),
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": _peak_rss_mb(),
+        "workers_peak_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+def load_frame():
+    import model
+    from config import TIMEFRAME
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    X_train, X_test, y_train, y_test, scaler = model.load_frame(model.training_store_path, TIMEFRAME)
+    return {
+        "seconds": time.perf_counter() - start,
+        "rows": len(X_train) + len(X_test),
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def rate_limits():
+    """Live fetches every BENCH_LIVE_INTERVAL seconds while a REST backfill pages klines as fast as the
+    budget lets it, for BENCH_RATE_LIMIT_SECONDS, then CoinGecko revalidations; all against a
+    rate-limited exchange. Live demand should fit OUTBOUND_LIVE_RESERVE of the budget."""
+    import numpy as np
+    import requests
+    from config import BINANCE_API_URL, CG_API_KEY
+    from live_fetch import kline_fetcher
+    from live_feed import REST_WEIGHT
+    from outbound import BACKFILL, scheduler
+    from tokens import registry_pairs
+    from updater import download_coingecko_data
+    duration = float(os.environ.get("BENCH_RATE_LIMIT_SECONDS", 60))
+    interval = float(os.environ.get("BENCH_LIVE_INTERVAL", 3))
+    pairs = registry_pairs()
+    stop = threading.Event()
+    backfill = Counter()
+    session = requests.Session()
+
+    def run_backfill():
+        while not stop.is_set():
+            response = scheduler.get(session, f"{BINANCE_API_URL}/api/v3/klines", BACKFILL, REST_WEIGHT,
+                                     params={"symbol": pairs[backfill.total() % len(pairs)], "interval": "1m", "limit": 1000})
+            backfill[response.status_code] += 1
+
+    thread = threading.Thread(target=run_backfill, daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    latencies, sources = [], Counter()
+    while time.perf_counter() - start < duration:
+        began = time.perf_counter()
+        try:
+            sources[kline_fetcher.fetch(pairs).source] += 1
+        except ConnectionError:
+            sources["failed"] += 1
+        latencies.append(time.perf_counter() - began)
+        time.sleep(max(0.0, interval - (time.perf_counter() - began)))
+    stop.set()
+    thread.join()
+    coingecko_start = time.perf_counter()
+    # The OHLC download of an update, revalidated: only the first is a full download
+    with tempfile.TemporaryDirectory() as download_path:
+        for _ in range(5):
+            download_coingecko_data(os.environ["TOKEN"], 7, download_path, CG_API_KEY)
+    ms = np.array(latencies) * 1000
+    return {
+        "seconds": time.perf_counter() - start,
+        "live": {"fetches": len(latencies), "sources": dict(sources), "latency_ms": {
+            "p50": float(np.percentile(ms, 50)), "p99": float(np.percentile(ms, 99)), "max": float(ms.max())}},
+        "backfill": {str(status): count for status, count in backfill.items()},
+        "coingecko_seconds": time.perf_counter() - coingecko_start,
+    }
+
+TASKS = {"update": update, "format": format_data, "load": load_frame, "rate_limits": rate_limits}
+
+if __name__ == "__main__":
+    result = TASKS[sys.argv[1]]()
+    print(RESULT_PREFIX + json.dumps(result))
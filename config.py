@@ -1,4 +1,6 @@
+import logging
 import os
+import zlib
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -6,16 +8,65 @@ load_dotenv()
 
 app_base_path = os.getenv("APP_BASE_PATH", default=os.getcwd())
 data_base_path = os.path.join(app_base_path, "data")
-model_file_path = os.path.join(data_base_path, "model.pkl")
+artifacts_path = os.path.join(data_base_path, "artifacts")
 
 TOKEN = os.getenv("TOKEN").upper()
+TOKENS = [t.strip().upper() for t in (os.getenv("TOKENS") or TOKEN).split(",") if t.strip()]
 TRAINING_DAYS = os.getenv("TRAINING_DAYS")
 TIMEFRAME = os.getenv("TIMEFRAME")
 MODEL = os.getenv("MODEL")
+PREDICTION_WINDOW = os.getenv("PREDICTION_WINDOW", default="6h").lower()
+PREDICTION_HORIZONS = [h.strip().lower() for h in (os.getenv("PREDICTION_HORIZONS") or PREDICTION_WINDOW).split(",") if h.strip()]
+TRAINING_MODE = os.getenv("TRAINING_MODE", default="full").lower()
+RIDGE_ALPHA = float(os.getenv("RIDGE_ALPHA", default=1.0))
+WALK_FORWARD_FOLDS = int(os.getenv("WALK_FORWARD_FOLDS", default=0))
+WALK_FORWARD_MODE = os.getenv("WALK_FORWARD_MODE", default="expanding").lower()
+WALK_FORWARD_WINDOW_DAYS = int(os.getenv("WALK_FORWARD_WINDOW_DAYS", default=0))
+MODEL_MAX_AGE_HOURS = float(os.getenv("MODEL_MAX_AGE_HOURS", default=24))
+KNN_NEIGHBORS = int(os.getenv("KNN_NEIGHBORS", default=10))
+KNN_INDEX = os.getenv("KNN_INDEX", default="exact").lower()
+KNN_PROBES = int(os.getenv("KNN_PROBES", default=8))
 REGION = os.getenv("REGION").lower()
 if REGION in ["us", "com", "usa"]:
     REGION = "us"
 else:
     REGION = "com"
+BINANCE_API_URL = os.getenv("BINANCE_API_URL", default=f"https://api.binance.{REGION}")
+BINANCE_WS_URL = os.getenv("BINANCE_WS_URL", default=f"wss://stream.binance.{REGION}:9443")
+BINANCE_DATA_URL = os.getenv("BINANCE_DATA_URL", default="https://data.binance.vision")
+# Live REST fetches race these endpoints under one deadline; the alternate Binance region
+# joins the primary unless BINANCE_API_URL points elsewhere
+LIVE_FETCH_URLS = [BINANCE_API_URL]
+if not os.getenv("BINANCE_API_URL"):
+    LIVE_FETCH_URLS.append(f"https://api.binance.{'com' if REGION == 'us' else 'us'}")
+if os.getenv("LIVE_FETCH_URLS"):
+    LIVE_FETCH_URLS = [url.strip() for url in os.getenv("LIVE_FETCH_URLS").split(",") if url.strip()]
+LIVE_FETCH_DEADLINE = float(os.getenv("LIVE_FETCH_DEADLINE", default=5))
+LIVE_FETCH_HEDGE_DELAY = float(os.getenv("LIVE_FETCH_HEDGE_DELAY", default=1))
+LIVE_DEGRADED_RETRY = float(os.getenv("LIVE_DEGRADED_RETRY", default=10))
+LIVE_MAX_STALENESS_MINUTES = float(os.getenv("LIVE_MAX_STALENESS_MINUTES", default=15))
+# Outbound budgets (see outbound.py): Binance request weight per minute (binance.com allows 6000 per
+# IP, binance.us 1200) and CoinGecko calls per minute (30 on the demo plan)
+BINANCE_WEIGHT_PER_MINUTE = int(os.getenv("BINANCE_WEIGHT_PER_MINUTE", default=1200 if REGION == "us" else 6000))
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", default="https://api.coingecko.com")
+COINGECKO_CALLS_PER_MINUTE = int(os.getenv("COINGECKO_CALLS_PER_MINUTE", default=30))
+OUTBOUND_LIVE_RESERVE = float(os.getenv("OUTBOUND_LIVE_RESERVE", default=0.2))
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", default=8))
+LIVE_FEED = os.getenv("LIVE_FEED", default="true").lower() in ["true", "1", "yes"]
 DATA_PROVIDER = os.getenv("DATA_PROVIDER").lower()
 CG_API_KEY = os.getenv("CG_API_KEY", default=None)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", default=os.cpu_count() or 1))
+# Production serving under gunicorn (gunicorn_conf.py turns it on): a sidecar process follows the
+# exchange into a shared kline ring and publishes model versions to every worker (see serving.py)
+SHARED_SERVING = os.getenv("SHARED_SERVING", default="false").lower() in ["true", "1", "yes"]
+SHARED_STATE_PATH = os.getenv(
+    "SHARED_STATE_PATH",
+    default=os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else data_base_path, f"prediction-node-{zlib.crc32(app_base_path.encode()):08x}"),
+)
+if SHARED_SERVING:
+    # Workers write their metrics to files that /metrics aggregates; set before prometheus_client is imported
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(SHARED_STATE_PATH, "metrics"))
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+LOG_LEVEL = os.getenv("LOG_LEVEL", default="INFO").upper()
+# DEBUG adds verbose dumps such as live frame samples and the files being formatted
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+PAIRS = ["ETHUSDT", "BTCUSDT"]
+EMA_PAIR = "ETHUSDT"
+OHLC = ["open", "high", "low", "close"]
+LAGS = 9
+EMA_SPAN = 20
+MA_WINDOW = 5
+HISTORY = 11  # current bar plus the 10 bars behind it (close_lag10)
+TARGET_PAIR = "ETHUSDT"
+HORIZON_MINUTES = {"m": 1, "h": 60, "d": 1440}
+
+def feature_columns(pairs=PAIRS, ema_pair=EMA_PAIR):
+    return (
+        [
+            f"{metric}_{pair}_lag{lag}"
+            for pair in pairs
+            for metric in OHLC
+            for lag in range(1, LAGS + 1)
+        ] + [f"close_{pair}_lag10" for pair in pairs] +
+        [f"close_{pair}_ma5" for pair in pairs] +
+        [f"volume_{pair}_lag1" for pair in pairs] +
+        [f"ema20_{ema_pair}", "hour_of_day"]
+    )  # 80 features: 72 (OHLC lags 1-9) + 2 (close_lag10) + 2 (ma5) + 2 (volume_lag1) + 1 (ema20) + 1 (hour)
+
+FEATURES = feature_columns()
+
+def horizon_minutes(horizon):
+    """Minutes ahead of a horizon such as "10m", "6h" or "1d" (one row per minute)."""
+    value, unit = horizon[:-1], horizon[-1:]
+    if unit not in HORIZON_MINUTES or not value.isdigit() or int(value) <= 0:
+        raise ValueError(f"Prediction horizon must look like 10m, 6h or 1d, got: {horizon}")
+    return int(value) * HORIZON_MINUTES[unit]
+
+def target_columns(horizons, pair=TARGET_PAIR):
+    return [f"target_{pair}_{horizon}" for horizon in horizons]
+
+def add_features(price_df, pairs=PAIRS, ema_pairs=(EMA_PAIR,)):
+    """Append the feature columns to a frame of "<metric>_<pair>" columns indexed by date.
+
+    Features are computed once per pair, so a frame holding several tokens' pairs gets the
+    union of their feature sets; ema_pairs lists the pairs that carry an EMA column.
+    """
+    feature_dict = {}
+    for pair in pairs:
+        for metric in OHLC:
+            for lag in range(1, LAGS + 1):  # 9 lags
+                feature_dict[f"{metric}_{pair}_lag{lag}"] = price_df[f"{metric}_{pair}"].shift(lag)
+        feature_dict[f"close_{pair}_lag10"] = price_df[f"close_{pair}"].shift(10)
+        feature_dict[f"close_{pair}_ma5"] = price_df[f"close_{pair}"].rolling(window=MA_WINDOW).mean()
+        feature_dict[f"volume_{pair}_lag1"] = price_df[f"volume_{pair}"].shift(1)
+    for ema_pair in ema_pairs:
+        feature_dict[f"ema20_{ema_pair}"] = price_df[f"close_{ema_pair}"].ewm(span=EMA_SPAN, adjust=False).mean()  # 20-min EMA
+
+    price_df = pd.concat([price_df, pd.DataFrame(feature_dict)], axis=1)
+    price_df["hour_of_day"] = price_df.index.hour
+    return price_df
+
+class FeatureEngine:
+    """Incremental version of add_features for the latest bar.
+
+    Each update takes one aligned bar per pair as (open, high, low, close, volume) and
+    costs O(1): the bars go into a ring buffer of the last 11 bars, the EMA is updated
+    recursively, and vector() gathers the 80 features of the newest bar in
+    feature_columns() order.
+    """
+
+    def __init__(self, pairs=PAIRS, ema_pair=EMA_PAIR):
+        self.pairs = list(pairs)
+        self.ema_index = self.pairs.index(ema_pair)
+        self.alpha = 2.0 / (EMA_SPAN + 1)
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros((HISTORY, len(self.pairs), 5), dtype=np.float64)
+        self._position = -1
+        self.count = 0
+        self.ema = None
+        self.last_timestamp = None
+
+    @property
+    def ready(self):
+        return self.count >= HISTORY
+
+    def update(self, timestamp_ms, bars):
+        """Add the next bar; timestamp_ms is its close time in epoch ms, the time training rows are indexed by (drives hour_of_day)."""
+        self._position = (self._position + 1) % HISTORY
+        self._history[self._position] = bars
+        close = self._history[self._position, self.ema_index, 3]
+        self.ema = close if self.ema is None else (1 - self.alpha) * self.ema + self.alpha * close
+        self.count += 1
+        self.last_timestamp = timestamp_ms
+
+    def vector(self):
+        if not self.ready:
+            raise ValueError(f"Feature engine needs {HISTORY} bars, has {self.count}")
+        rows = (self._position - np.arange(HISTORY)) % HISTORY  # rows[k] holds the bar k steps back
+        lags = self._history[rows[1:LAGS + 1]]  # (lag, pair, field)
+        ohlc_lags = lags[:, :, :4].transpose(1, 2, 0).reshape(-1)  # pair, metric, lag
+        closes = self._history[rows, :, 3]
+        hour = (self.last_timestamp // 3_600_000) % 24
+        return np.concatenate([
+            ohlc_lags,
+            closes[10],
+            closes[:MA_WINDOW].mean(axis=0),
+            self._history[rows[1], :, 4],
+            [self.ema, hour],
+        ])
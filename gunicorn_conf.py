@@ -1,3 +1,10 @@
+import os
+
+# Production serving (see serving.py): the app is imported once in the master and forked into
+# the workers, and a sidecar process follows the exchange and publishes model versions for all
+# of them. Set before the app is preloaded, which reads it through config.
+os.environ.setdefault("SHARED_SERVING", "true")
+
 # Gunicorn config variables
 loglevel = "info"
 errorlog = "-"  # stderr
@@ -6,7 +13,36 @@ worker_tmp_dir = "/dev/shm"
 graceful_timeout = 120
 timeout = 30
 keepalive = 5
+preload_app = True
 worker_class = "gthread"
-workers = 1
-threads = 8
-bind = "0.0.0.0:9000"
+# Prediction is CPU-bound Python, so throughput scales with worker processes rather than threads
+workers = int(os.getenv("GUNICORN_WORKERS", default=os.cpu_count() or 1))
+threads = int(os.getenv("GUNICORN_THREADS", default=4))
+bind = "0.0.0.0:8000"
+
+def on_starting(server):
+    from serving import reset_shared_state
+    reset_shared_state()
+
+def when_ready(server):
+    from retrain import warm_start
+    from serving import start_sidecar, wait_for_sidecar
+    start_sidecar()
+    # Load the persisted models before the workers are forked, so they start warm and share
+    # them. Workers follow the serving pointers while the sidecar runs, so the master loads
+    # through them too, once the sidecar has set them; otherwise each worker would reload
+    if not wait_for_sidecar():
+        print("Serving sidecar not up yet, workers will load the models themselves")
+    warm_start()
+
+def post_fork(server, worker):
+    from serving import worker_forked
+    worker_forked()
+
+def child_exit(server, worker):
+    from serving import worker_exited
+    worker_exited(worker.pid)
+
+def on_exit(server):
+    from serving import stop_sidecar
+    stop_sidecar()
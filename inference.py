@@ -0,0 +1,154 @@
+import threading
+from collections import namedtuple
+from functools import reduce
+import numpy as np
+from artifacts import artifact_caches
+from knn import KNNRegressor
+from features import FeatureEngine
+from tokens import TOKEN_REGISTRY, registry_pairs
+from prediction_cache import SingleFlightCache
+from metrics import inference_stage, record_last_bar
+from live_feed import KLINE_INTERVAL_MS, get_live_feed, last_closed_open_time
+from live_fetch import LiveKlines, kline_fetcher
+from serving import shared_kline_feed
+from config import LIVE_FEED, PREDICTION_WINDOW, SHARED_SERVING
+
+_feature_engines = {token: FeatureEngine(spec.pairs, spec.pair) for token, spec in TOKEN_REGISTRY.items()}
+_feature_engine_lock = threading.Lock()
+prediction_cache = SingleFlightCache()
+# REST klines of every registry pair up to the last closed bar, fetched once and shared by every token's model
+rest_kline_cache = SingleFlightCache(max_entries=4)
+_scorers = {}
+# stale marks a degraded answer from the last good snapshot
+Prediction = namedtuple("Prediction", ["values", "bar_open_time", "stale"])
+Inference = namedtuple("Inference", ["value", "bar_open_time", "stale"])
+
+def _aligned_klines(klines, pairs, after=None):
+    """Bars of all pairs at the open times they share (after the given open time), as (times, bars)."""
+    klines = [klines[pair] for pair in pairs]
+    if after is not None:
+        klines = [(open_time[np.searchsorted(open_time, after, side="right"):], values[np.searchsorted(open_time, after, side="right"):]) for open_time, values in klines]
+    common = reduce(np.intersect1d, [open_time for open_time, _ in klines])
+    bars = np.stack([values[np.searchsorted(open_time, common)] for open_time, values in klines], axis=1)
+    return common, bars
+
+def live_feature_vector(klines, token):
+    """Features and open time of the token's newest shared bar, advancing its serving engine by the new bars only.
+
+    klines maps each pair to (open_time, [open, high, low, close, volume]) arrays. The engine
+    is rebuilt from the whole window only on the first call or when the bars stop being
+    contiguous with what it has seen.
+    """
+    with _feature_engine_lock:
+        engine = _feature_engines[token]
+        last_open_time = None if engine.last_timestamp is None else engine.last_timestamp - (KLINE_INTERVAL_MS - 1)
+        open_times, bars = _aligned_klines(klines, engine.pairs, last_open_time)
+        if last_open_time is None or (len(open_times) and open_times[0] != last_open_time + KLINE_INTERVAL_MS):
+            engine.reset()
+            open_times, bars = _aligned_klines(klines, engine.pairs)
+        for open_time, bar in zip(open_times, bars):
+            # Stamped with the kline's close time (xx:59.999), as training rows are indexed
+            engine.update(int(open_time) + KLINE_INTERVAL_MS - 1, bar)
+        return engine.vector(), engine.last_timestamp - (KLINE_INTERVAL_MS - 1)
+
+def _rest_klines(last_closed):
+    with inference_stage("fetch"):
+        live = kline_fetcher.fetch(registry_pairs(), last_closed)
+    complete = not live.stale and all(open_time[-1] == last_closed for open_time, _ in live.klines.values())
+    return live, complete
+
+def get_live_klines():
+    """LiveKlines of every pair of the registry, from the live feed when it is caught up, else over REST.
+
+    Every token reads the same klines, so a batch shares one snapshot or one REST fetch; the
+    REST endpoints are those of the configured REGION (LIVE_FETCH_URLS).
+    """
+    if LIVE_FEED:
+        # One feed follows every pair of the registry: the serving sidecar's, read from shared
+        # memory, under shared serving, else one in this process
+        feed = shared_kline_feed() if SHARED_SERVING else get_live_feed(registry_pairs())
+        if feed.is_fresh():
+            with inference_stage("fetch"):
+                snapshot = feed.snapshot()
+            if snapshot is not None:
+                return LiveKlines(snapshot, "stream", False)
+        print("Live kline feed is not caught up yet, fetching over REST")
+
+    last_closed = last_closed_open_time()
+    return rest_kline_cache.get_or_compute(last_closed, lambda: _rest_klines(last_closed))
+
+def bundle_horizons(bundle):
+    return bundle.metadata["horizons"]
+
+def _scorer(token, bundle):
+    """(scale, score) functions turning one raw feature vector into one price per horizon, built once per model version."""
+    version, scorer = _scorers.get(token, (None, None))
+    if version == bundle.version:
+        return scorer
+    if bundle.metadata["features"] != TOKEN_REGISTRY[token].features:
+        raise ValueError(f"{token} model version {bundle.version} was trained on a different feature schema, waiting for a retrain")
+    if bundle.metadata["kind"] == "linear":
+        # Scaler, coefficients and bias correction are fused into weights and intercept
+        weights, intercept = bundle.arrays["weights"], np.asarray(bundle.metadata["intercept"])
+        scorer = (lambda x: x), (lambda x: np.atleast_1d(x @ weights + intercept))
+    else:
+        model = KNNRegressor.from_artifacts(bundle.metadata, bundle.arrays, bundle.objects)
+        mean, scale = bundle.arrays["scaler_mean"], bundle.arrays["scaler_scale"]
+        bias = np.asarray(bundle.metadata["bias_correction"])
+        scorer = (lambda x: (x - mean) / scale), (lambda z: np.atleast_1d(model.targets_[model.neighbors(z)].mean(axis=0) + bias))
+    _scorers[token] = (bundle.version, scorer)
+    return scorer
+
+def _predict(token, bundle, expected_open_time):
+    live = get_live_klines()
+    with inference_stage("features"):
+        x_new, bar_open_time = live_feature_vector(live.klines, token)
+    record_last_bar(token, bar_open_time + KLINE_INTERVAL_MS)
+    # Don't keep an answer computed before the exchange delivered the expected bar, or a degraded one
+    stale = live.stale
+    complete = not stale and bar_open_time >= expected_open_time
+
+    scale, score = _scorer(token, bundle)
+    with inference_stage("scale"):
+        z = scale(x_new)
+    with inference_stage("predict"):
+        predictions = dict(zip(bundle_horizons(bundle), score(z).tolist()))
+    for horizon, price_pred in predictions.items():
+        print(f"Predicted {horizon} {token}/USD Price: {price_pred:.2f}{' (stale data)' if stale else ''}")
+    return Prediction(predictions, bar_open_time, stale), complete
+
+def get_inference(token, timeframe, region, data_provider, horizon=None):
+    """Predict from the last closed bar; one computation per (token, bar, model version).
+
+    All horizons of the model are scored together and cached as one entry; horizon picks one
+    of them and defaults to PREDICTION_WINDOW (or the model's first horizon). Returns an
+    Inference whose stale flag is set when the exchange couldn't be reached in time and the
+    prediction was made from the last good snapshot instead.
+
+    Features come from Binance's 1m klines whatever data_provider is: models are only ever
+    trained on them, and CoinGecko's 30m-4d candles don't fit their lag, MA and EMA weights.
+    """
+    bundle = artifact_caches[token].get()
+    horizons = bundle_horizons(bundle)
+    if horizon is None:
+        horizon = PREDICTION_WINDOW if PREDICTION_WINDOW in horizons else horizons[0]
+    if horizon not in horizons:
+        raise ValueError(f"Horizon {horizon} is not served by model version {bundle.version}, available: {horizons}")
+    expected_open_time = last_closed_open_time()
+    key = (token, expected_open_time, bundle.version)
+    prediction = prediction_cache.get_or_compute(key, lambda: _predict(token, bundle, expected_open_time))
+    return Inference(prediction.values[horizon], prediction.bar_open_time, prediction.stale)
+
+def get_batch_inference(tokens, timeframe, region, data_provider, horizon=None):
+    """Predictions of several tokens as ({token: Inference}, {token: error}).
+
+    The tokens read the same live feed, or share one REST fetch of every pair per bar, so a
+    batch makes each exchange call once.
+    """
+    predictions, errors = {}, {}
+    for token in tokens:
+        try:
+            predictions[token] = get_inference(token, timeframe, region, data_provider, horizon)
+        except Exception as e:
+            errors[token] = str(e)
+    return predictions, errors
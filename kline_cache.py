@@ -0,0 +1,134 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from zipfile import ZipFile
+import numpy as np
+import pandas as pd
+from config import data_base_path, INGEST_WORKERS
+
+kline_cache_path = os.path.join(data_base_path, "kline_cache")
+CACHE_VERSION = 2  # bump to invalidate cached days when parsing changes
+
+# Only the kline fields the feature pipeline uses, by position in the Binance CSV layout
+KLINE_COLUMNS = ["open", "high", "low", "close", "volume"]
+KLINE_USECOLS = {1: "open", 2: "high", 3: "low", 4: "close", 5: "volume", 6: "end_time"}
+KLINE_DTYPES = {1: np.float64, 2: np.float64, 3: np.float64, 4: np.float64, 5: np.float64, 6: np.int64}
+
+def parse_kline_day(file_name):
+    # "ETHUSDT-1m-2024-01-01.zip" -> ("ETHUSDT", "2024-01-01")
+    stem = os.path.basename(file_name).rsplit(".", 1)[0]
+    pair, _, day = stem.partition("-1m-")
+    return pair, day
+
+def cache_file_path(pair, day):
+    return os.path.join(kline_cache_path, pair, f"{pair}-1m-{day}.npz")
+
+def _source_signature(zip_file_path):
+    stat = os.stat(zip_file_path)
+    return np.array([stat.st_size, stat.st_mtime_ns, CACHE_VERSION], dtype=np.int64)
+
+def read_daily_zip(zip_file_path):
+    with ZipFile(zip_file_path) as myzip, myzip.open(myzip.filelist[0]) as f:
+        skiprows = 1 if f.peek(9).startswith(b"open_time") else 0
+        df = pd.read_csv(f, header=None, skiprows=skiprows, usecols=list(KLINE_USECOLS), dtype=KLINE_DTYPES, engine="c")
+    df.columns = list(KLINE_USECOLS.values())
+    end_time = df.pop("end_time")
+    max_time = end_time.max()
+    # Epoch ms are ~1.7e12, so the thresholds sit between ms, us (~1.7e15) and ns (~1.7e18)
+    if max_time > 1e17:  # Nanoseconds
+        unit = "ns"
+    elif max_time > 1e14:  # Microseconds
+        unit = "us"
+    else:  # Milliseconds
+        unit = "ms"
+    df.index = pd.DatetimeIndex(pd.to_datetime(end_time, unit=unit), name="date")
+    return df
+
+def _write_cache(cache_file, df, signature):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        np.savez(
+            f,
+            signature=signature,
+            date=df.index.values.astype("datetime64[ns]").astype(np.int64),
+            **{column: df[column].to_numpy(dtype=np.float64) for column in KLINE_COLUMNS},
+        )
+    os.replace(tmp_file, cache_file)
+
+def _read_cache(cache_file, signature):
+    try:
+        with np.load(cache_file) as cached:
+            if not np.array_equal(cached["signature"], signature):
+                return None
+            index = pd.DatetimeIndex(cached["date"].view("datetime64[ns]"), name="date")
+            return pd.DataFrame({column: cached[column] for column in KLINE_COLUMNS}, index=index)
+    except (OSError, ValueError, KeyError):
+        return None
+
+def load_daily_klines(zip_file_path):
+    """Return the parsed klines of one daily zip and whether they came from the cache.
+
+    Parsed days are kept per pair and date under data/kline_cache and reused as long as
+    the size and mtime of the source zip are unchanged.
+    """
+    pair, day = parse_kline_day(zip_file_path)
+    cache_file = cache_file_path(pair, day)
+    signature = _source_signature(zip_file_path)
+    if os.path.exists(cache_file):
+        df = _read_cache(cache_file, signature)
+        if df is not None:
+            return df, True
+    df = read_daily_zip(zip_file_path)
+    _write_cache(cache_file, df, signature)
+    return df, False
+
+def _load_daily_klines_task(zip_file_path):
+    try:
+        df, from_cache = load_daily_klines(zip_file_path)
+        return zip_file_path, df, from_cache, None
+    except Exception as e:
+        return zip_file_path, None, False, str(e)
+
+def prune_kline_cache(pair, first_day):
+    """Delete the pair's cached days before first_day (YYYY-MM-DD), which left the training window."""
+    pair_path = os.path.join(kline_cache_path, pair)
+    if not os.path.isdir(pair_path):
+        return
+    for name in os.listdir(pair_path):
+        _, day = parse_kline_day(name)
+        if day < first_day:
+            os.remove(os.path.join(pair_path, name))
+
+def load_klines(files_by_pair, workers=INGEST_WORKERS):
+    """Load the daily zips of any number of pairs into one frame per pair.
+
+    Days are parsed (or read from the cache) across a process pool and each pair's
+    frame is assembled with a single concat in date order. Cached days older than a
+    pair's first requested day are deleted.
+    """
+    tasks = [(pair, file) for pair, files in files_by_pair.items() for file in sorted(files)]
+    paths = [file for _, file in tasks]
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+            results = list(executor.map(_load_daily_klines_task, paths, chunksize=max(1, len(paths) // (workers * 4))))
+    else:
+        results = [_load_daily_klines_task(path) for path in paths]
+
+    frames = {pair: [] for pair in files_by_pair}
+    cached = {pair: 0 for pair in files_by_pair}
+    for (pair, file), (_, df, from_cache, error) in zip(tasks, results):
+        if error is not None:
+            print(f"Error processing {file}: {error}")
+            continue
+        frames[pair].append(df)
+        cached[pair] += from_cache
+
+    for pair, files in files_by_pair.items():
+        if files:
+            prune_kline_cache(pair, min(parse_kline_day(file)[1] for file in files))
+
+    price_dfs = {}
+    for pair, pair_frames in frames.items():
+        print(f"Loaded {len(pair_frames)} days for {pair}: {cached[pair]} from cache, {len(pair_frames) - cached[pair]} parsed")
+        price_dfs[pair] = pd.concat(pair_frames) if pair_frames else pd.DataFrame()
+    return price_dfs
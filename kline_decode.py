@@ -0,0 +1,64 @@
+import json
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+KLINE_INTERVAL_MS = 60_000
+KLINE_FIELDS = ["open", "high", "low", "close", "volume"]
+
+# open_time and close_time are int64 epoch ms; values is a C-contiguous float64 (rows x KLINE_FIELDS) array
+Klines = namedtuple("Klines", ["open_time", "close_time", "values"])
+
+def _rows(payload):
+    return json.loads(payload) if isinstance(payload, (bytes, bytearray, str)) else payload
+
+def _empty():
+    return Klines(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, len(KLINE_FIELDS)), dtype=np.float64))
+
+def decode_binance_klines(payload, until_open_time=None):
+    """Klines of a Binance /api/v3/klines response (bytes, str or already parsed rows).
+
+    The rows are transposed once and each column converted by NumPy, including the
+    string-typed prices, instead of building a frame of objects and converting it per cell.
+    Rows opening after until_open_time (such as the kline still forming) are dropped.
+    """
+    rows = _rows(payload)
+    if not rows:
+        return _empty()
+    columns = list(zip(*rows))
+    open_time = np.array(columns[0], dtype=np.int64)
+    close_time = np.array(columns[6], dtype=np.int64)
+    values = np.array(columns[1:6], dtype=np.float64).T
+    if until_open_time is not None:
+        keep = int(np.searchsorted(open_time, until_open_time, side="right"))
+        open_time, close_time, values = open_time[:keep], close_time[:keep], values[:keep]
+    return Klines(open_time, close_time, np.ascontiguousarray(values))
+
+def decode_coingecko_ohlc(payload):
+    """Klines of a CoinGecko /coins/{id}/ohlc response or saved file.
+
+    CoinGecko stamps each candle with its close time and picks the candle width from the
+    requested range, so open times are the close times less the most common width. It
+    reports no volume; the column is zero so the feature layout stays the same.
+    """
+    rows = _rows(payload)
+    if not rows:
+        return _empty()
+    ohlc = np.array(rows, dtype=np.float64).reshape(-1, 5)
+    close_time = ohlc[:, 0].astype(np.int64)
+    order = np.argsort(close_time, kind="stable")
+    close_time, ohlc = close_time[order], ohlc[order]
+    widths = np.diff(close_time)
+    width = int(np.median(widths)) if len(widths) else KLINE_INTERVAL_MS
+    values = np.zeros((len(ohlc), len(KLINE_FIELDS)), dtype=np.float64)
+    values[:, :4] = ohlc[:, 1:]
+    return Klines(close_time - width, close_time, values)
+
+def klines_frame(klines):
+    """One row per kline: start_time, KLINE_FIELDS, end_time and date, the close time + 1ms as
+    the live rows are indexed."""
+    df = pd.DataFrame(klines.values, columns=KLINE_FIELDS)
+    df.insert(0, "start_time", klines.open_time)
+    df["end_time"] = klines.close_time
+    df["date"] = pd.to_datetime(klines.close_time + 1, unit="ms")
+    return df
@@ -0,0 +1,84 @@
+import time
+import numpy as np
+
+# The KD-tree's arrays, in the order KDTree.get_arrays() and its pickled state give them
+TREE_ARRAYS = ["tree_data", "tree_idx_array", "tree_node_data", "tree_node_bounds"]
+
+class KNNRegressor:
+    """k-nearest-neighbour regressor over a persisted neighbour index.
+
+    The exact index is a KD-tree. It is published as its arrays and rebuilt over them, so
+    processes that memory-map the same artifacts share the tree rather than each unpickling
+    a copy of the training matrix. The approximate index is an inverted file: points are
+    bucketed by their nearest k-means centroid and a query only scans the `n_probe`
+    buckets closest to it, which keeps queries fast on long training windows.
+    """
+
+    def __init__(self, n_neighbors=10, index="exact", n_lists=None, n_probe=8, leaf_size=40):
+        if index not in ["exact", "approximate"]:
+            raise ValueError(f"KNN index must be 'exact' or 'approximate', got: {index}")
+        self.n_neighbors = n_neighbors
+        self.index = index
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.leaf_size = leaf_size
+        self.build_seconds = None
+
+    def fit(self, X, y):
+        start = time.perf_counter()
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        self.targets_ = np.asarray(y, dtype=np.float64)
+        if self.index == "exact":
+            from sklearn.neighbors import KDTree
+            self.tree_ = KDTree(X, leaf_size=self.leaf_size)
+        else:
+            from sklearn.cluster import MiniBatchKMeans
+            n_lists = self.n_lists or max(1, int(np.sqrt(len(X))))
+            kmeans = MiniBatchKMeans(n_clusters=n_lists, n_init=3, random_state=0).fit(X)
+            order = np.argsort(kmeans.labels_, kind="stable")
+            self.centroids_ = kmeans.cluster_centers_
+            self.points_ = X[order]
+            self.targets_ = self.targets_[order]
+            self.offsets_ = np.searchsorted(kmeans.labels_[order], np.arange(n_lists + 1))
+        self.build_seconds = time.perf_counter() - start
+        return self
+
+    def neighbors(self, x):
+        """Indices of the nearest training rows of one query vector."""
+        if self.index == "exact":
+            return self.tree_.query(x[None, :], k=self.n_neighbors, return_distance=False)[0]
+        probes = np.argsort(((self.centroids_ - x) ** 2).sum(axis=1))[:self.n_probe]
+        candidates = np.concatenate([np.arange(self.offsets_[c], self.offsets_[c + 1]) for c in probes])
+        distances = ((self.points_[candidates] - x) ** 2).sum(axis=1)
+        k = min(self.n_neighbors, len(candidates))
+        return candidates[np.argpartition(distances, k - 1)[:k]]
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.index == "exact":
+            indices = self.tree_.query(X, k=self.n_neighbors, return_distance=False)
+            return self.targets_[indices].mean(axis=1)
+        return np.array([self.targets_[self.neighbors(x)].mean(axis=0) for x in X])
+
+    def artifacts(self):
+        """Arrays and picklable objects to publish; the index is stored built."""
+        if self.index == "exact":
+            state = self.tree_.__getstate__()
+            # Only the tree's counters and distance metric, a few bytes, are pickled
+            return {"targets": self.targets_, **dict(zip(TREE_ARRAYS, state))}, {"tree_state": state[len(TREE_ARRAYS):]}
+        return {"targets": self.targets_, "centroids": self.centroids_, "points": self.points_, "offsets": self.offsets_}, {}
+
+    @classmethod
+    def from_artifacts(cls, metadata, arrays, objects):
+        params = metadata["knn"]
+        model = cls(n_neighbors=params["n_neighbors"], index=params["index"], n_probe=params["n_probe"])
+        model.targets_ = arrays["targets"]
+        if model.index == "exact":
+            from sklearn.neighbors import KDTree
+            model.tree_ = KDTree.__new__(KDTree)
+            model.tree_.__setstate__(tuple(arrays[name] for name in TREE_ARRAYS) + tuple(objects["tree_state"]))
+        else:
+            model.centroids_ = arrays["centroids"]
+            model.points_ = arrays["points"]
+            model.offsets_ = arrays["offsets"]
+        return model
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from training_store import store_columns
+from config import data_base_path
+
+linear_stats_path = os.path.join(data_base_path, "linear_stats")
+
+NS_PER_DAY = 86_400 * 10**9
+STAT_FIELDS = ["n", "sum_x", "xtx", "sum_y", "xty", "yty"]
+
+def day_statistics(X, y):
+    """Sufficient statistics of a least-squares fit over one block of rows; y is (rows x targets)."""
+    return {
+        "n": np.array(len(y), dtype=np.float64),
+        "sum_x": X.sum(axis=0),
+        "xtx": X.T @ X,
+        "sum_y": y.sum(axis=0),
+        "xty": X.T @ y,
+        "yty": (y * y).sum(axis=0),
+    }
+
+def combine_statistics(blocks):
+    return {field: sum(block[field] for block in blocks) for field in STAT_FIELDS}
+
+def _schema_key(features, targets):
+    return hashlib.sha1(json.dumps([features, targets]).encode()).hexdigest()[:16]
+
+def prune_statistics(schemas, path=linear_stats_path):
+    """Delete the statistics of every (features, targets) schema but the given ones, such as
+    those of a token that was dropped or of a feature set that changed."""
+    keep = {_schema_key(features, targets) for features, targets in schemas}
+    if not os.path.isdir(path):
+        return
+    for name in os.listdir(path):
+        if name not in keep:
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+def _fingerprint(index, X, y):
+    # Cheap identity of a day's rows: count, time span, and the sums of two columns
+    return np.array([len(y), index[0], index[-1], y.sum(), X[:, 0].sum()], dtype=np.float64)
+
+def daily_statistics(store, features, targets, path=linear_stats_path):
+    """Per-day statistics of the store's rows, computing only days that are new or changed.
+
+    Each day's statistics are kept in <path>/<schema>/<day>.npz with a fingerprint of the
+    rows they came from. The first and last day of the window always change (EMA seed,
+    target horizon), so they are recomputed. Days that are no longer in the store (they
+    fell out of the training window) are deleted. All target columns share one pass.
+    Returns (list of (day, stats) in date order, number of days recomputed).
+    """
+    stats_dir = os.path.join(path, _schema_key(features, targets))
+    os.makedirs(stats_dir, exist_ok=True)
+
+    days = store.index // NS_PER_DAY
+    boundaries = np.flatnonzero(np.diff(days)) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(days)]])
+
+    result = []
+    computed = 0
+    kept = set()
+    for start, end in zip(starts, ends):
+        day = str(np.datetime64(int(days[start]), "D"))
+        stats_file = os.path.join(stats_dir, f"{day}.npz")
+        kept.add(f"{day}.npz")
+        X = store_columns(store, features, slice(start, end))
+        y = store_columns(store, targets, slice(start, end))
+        fingerprint = _fingerprint(store.index[start:end], X, y)
+
+        stats = None
+        if os.path.exists(stats_file) and start != 0 and end != len(days):
+            with np.load(stats_file) as cached:
+                if np.array_equal(cached["fingerprint"], fingerprint):
+                    stats = {field: cached[field] for field in STAT_FIELDS}
+        if stats is None:
+            stats = day_statistics(X, y)
+            tmp_file = f"{stats_file}.tmp"
+            with open(tmp_file, "wb") as f:
+                np.savez(f, fingerprint=fingerprint, **stats)
+            os.replace(tmp_file, stats_file)
+            computed += 1
+        result.append((day, stats))
+
+    for name in os.listdir(stats_dir):
+        if name not in kept:
+            os.remove(os.path.join(stats_dir, name))
+    return result, computed
+
+def statistics_errors(stats, weights, intercept):
+    """RMSE, R² and mean residual per target of the fit y ≈ X @ weights + intercept over the rows
+    the statistics came from, without the rows: SSE = yᵀy − 2wᵀXᵀy + wᵀXᵀXw plus intercept terms."""
+    n = float(stats["n"])
+    fitted_sum = stats["sum_x"] @ weights + n * intercept  # Σ(Xw + b)
+    sse = (
+        stats["yty"]
+        - 2 * (weights * stats["xty"]).sum(axis=0) - 2 * intercept * stats["sum_y"]
+        + (weights * (stats["xtx"] @ weights)).sum(axis=0) + 2 * intercept * (stats["sum_x"] @ weights) + n * intercept ** 2
+    )
+    sse = np.clip(sse, 0, None)
+    sst = stats["yty"] - stats["sum_y"] ** 2 / n
+    return {"rmse": np.sqrt(sse / n), "r2": 1 - sse / sst, "bias": (stats["sum_y"] - fitted_sum) / n}
+
+def solve_statistics(stats, alpha=0.0):
+    """Standardised (ridge) least squares from combined statistics.
+
+    Equivalent to StandardScaler followed by LinearRegression (alpha=0) or Ridge(alpha),
+    returned fused into raw-feature weights (features x targets) and one intercept per target,
+    plus the scaler's mean and scale. Every target is solved against the same factorised gram.
+    """
+    n = float(stats["n"])
+    mean = stats["sum_x"] / n
+    y_mean = stats["sum_y"] / n
+    covariance = stats["xtx"] / n - np.outer(mean, mean)
+    scale = np.sqrt(np.clip(np.diag(covariance), 0, None))
+    scale[scale == 0] = 1.0  # constant features, as StandardScaler does
+    cross = stats["xty"] / n - np.outer(mean, y_mean)
+
+    gram = n * covariance / np.outer(scale, scale)
+    rhs = n * cross / scale[:, None]
+    if alpha > 0:
+        beta = np.linalg.solve(gram + alpha * np.eye(len(gram)), rhs)
+    else:
+        beta = np.linalg.lstsq(gram, rhs, rcond=None)[0]
+    weights = beta / scale[:, None]
+    intercept = y_mean - mean @ weights
+    return weights, intercept, mean, scale
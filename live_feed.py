@@ -0,0 +1,208 @@
+import asyncio
+import json
+import threading
+import time
+import aiohttp
+import numpy as np
+from kline_decode import KLINE_FIELDS, KLINE_INTERVAL_MS, decode_binance_klines
+from outbound import LIVE, scheduler
+from config import BINANCE_API_URL, BINANCE_WS_URL
+
+WINDOW_SIZE = 1000
+REST_LIMIT = 1000
+# Request weight of one /api/v3/klines call against the IP's per-minute budget
+REST_WEIGHT = 2
+
+def last_closed_open_time(now_ms=None):
+    """Open time of the most recent 1m kline that has fully closed."""
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    return (now_ms // KLINE_INTERVAL_MS - 1) * KLINE_INTERVAL_MS
+
+class KlineWindow:
+    """Rolling window of the most recent closed 1m klines of one symbol.
+
+    Bars are kept in preallocated arrays twice the window size and only ever appended
+    in open-time order, so appends are amortised O(1) and a snapshot is one slice copy.
+    """
+
+    def __init__(self, size=WINDOW_SIZE):
+        self.size = size
+        self._open_time = np.zeros(2 * size, dtype=np.int64)
+        self._values = np.zeros((2 * size, len(KLINE_FIELDS)), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def last_open_time(self):
+        return int(self._open_time[self._end - 1]) if len(self) else None
+
+    def append(self, open_time, values):
+        last = self.last_open_time
+        if last is not None and open_time < last:
+            return False
+        if last is not None and open_time == last:
+            self._values[self._end - 1] = values
+            return True
+        if self._end == len(self._open_time):
+            keep = len(self)
+            self._open_time[:keep] = self._open_time[self._end - keep:self._end]
+            self._values[:keep] = self._values[self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        self._open_time[self._end] = open_time
+        self._values[self._end] = values
+        self._end += 1
+        if len(self) > self.size:
+            self._start += 1
+        return True
+
+    def clear(self):
+        self._start = self._end = 0
+
+    def arrays(self, until_open_time=None):
+        end = self._end
+        if until_open_time is not None:
+            end = self._start + int(np.searchsorted(self._open_time[self._start:self._end], until_open_time, side="right"))
+        return self._open_time[self._start:end].copy(), self._values[self._start:end].copy()
+
+class LiveKlineFeed:
+    """Background ingestion of 1m klines into one rolling window per symbol.
+
+    The feed backfills each window over REST, then follows the exchange's kline stream.
+    Gaps (a closed kline that does not directly follow the last one, or a reconnect)
+    are repaired with another REST backfill before the new kline is appended. windows can
+    replace the in-process KlineWindows with other stores of the same interface, such as the
+    shared ring of shared_klines.
+    """
+
+    def __init__(self, pairs, rest_url=BINANCE_API_URL, ws_url=BINANCE_WS_URL, window_size=WINDOW_SIZE, reconnect_delay=1.0, windows=None):
+        self.pairs = list(pairs)
+        self.rest_url = rest_url.rstrip("/")
+        self.ws_url = ws_url.rstrip("/")
+        self.windows = windows or {pair: KlineWindow(window_size) for pair in self.pairs}
+        self.reconnect_delay = reconnect_delay
+        self.last_message_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loop = None
+        self._stopping = False
+        self._ready = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="live-kline-feed", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(lambda: None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def is_fresh(self, now_ms=None, max_lag_bars=1):
+        """True once every window holds the latest closed kline (within max_lag_bars)."""
+        if not self._ready.is_set():
+            return False
+        expected = last_closed_open_time(now_ms) - max_lag_bars * KLINE_INTERVAL_MS
+        with self._lock:
+            return all(window.last_open_time is not None and window.last_open_time >= expected for window in self.windows.values())
+
+    def snapshot(self):
+        """Consistent copy of every window, cut at the last kline all symbols have closed."""
+        with self._lock:
+            lasts = [window.last_open_time for window in self.windows.values()]
+            if any(last is None for last in lasts):
+                return None
+            until = min(lasts)
+            return {pair: window.arrays(until) for pair, window in self.windows.items()}
+
+    def _append(self, pair, open_time, values):
+        with self._lock:
+            self.windows[pair].append(open_time, values)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+
+    async def _main(self):
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+            while not self._stopping:
+                try:
+                    await asyncio.gather(*(self._backfill(session, pair) for pair in self.pairs))
+                    self._ready.set()
+                    await self._follow_stream(session)
+                except Exception as e:
+                    print(f"Live kline feed error: {str(e)}, reconnecting in {self.reconnect_delay}s")
+                    await asyncio.sleep(self.reconnect_delay)
+
+    async def _backfill(self, session, pair):
+        """Fetch the closed klines of one symbol after the window's last bar, or the latest REST_LIMIT."""
+        start_time = self.windows[pair].last_open_time
+        start_time = None if start_time is None else start_time + KLINE_INTERVAL_MS
+        last_closed = last_closed_open_time()
+        if start_time is not None and last_closed - start_time >= self.windows[pair].size * KLINE_INTERVAL_MS:
+            # The gap is wider than the window: refill it from the latest klines instead
+            with self._lock:
+                self.windows[pair].clear()
+            start_time = None
+        while start_time is None or start_time <= last_closed:
+            params = {"symbol": pair, "interval": "1m", "limit": REST_LIMIT}
+            if start_time is not None:
+                params["startTime"] = start_time
+            # The feed serves inference, so its REST calls go ahead of backfill
+            async with await scheduler.get_async(session, f"{self.rest_url}/api/v3/klines", LIVE, REST_WEIGHT, params=params) as response:
+                response.raise_for_status()
+                klines = decode_binance_klines(await response.read(), last_closed)
+            with self._lock:
+                for open_time, values in zip(klines.open_time.tolist(), klines.values):
+                    self.windows[pair].append(open_time, values)
+            if len(klines.open_time) < REST_LIMIT - 1:
+                break
+            start_time = int(klines.open_time[-1]) + KLINE_INTERVAL_MS
+
+    async def _follow_stream(self, session):
+        streams = "/".join(f"{pair.lower()}@kline_1m" for pair in self.pairs)
+        async with session.ws_connect(f"{self.ws_url}/stream?streams={streams}", heartbeat=30, timeout=aiohttp.ClientWSTimeout(ws_close=10)) as ws:
+            while not self._stopping:
+                try:
+                    message = await ws.receive(timeout=1)
+                except asyncio.TimeoutError:
+                    continue
+                if message.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    raise ConnectionError(f"Kline stream closed: {message.data}")
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                self.last_message_at = time.time()
+                kline = json.loads(message.data).get("data", {}).get("k")
+                if not kline or not kline.get("x"):
+                    continue
+                pair = kline["s"]
+                if pair not in self.windows:
+                    continue
+                open_time = int(kline["t"])
+                last = self.windows[pair].last_open_time
+                if last is not None and open_time > last + KLINE_INTERVAL_MS:
+                    print(f"Gap in {pair} klines after {last}, backfilling over REST")
+                    await self._backfill(session, pair)
+                self._append(pair, open_time, [float(kline[field]) for field in ("o", "h", "l", "c", "v")])
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def get_live_feed(pairs):
+    """Process-wide feed for the given pairs, started on first use."""
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = LiveKlineFeed(pairs).start()
+        return _feed
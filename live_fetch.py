@@ -0,0 +1,160 @@
+import asyncio
+import atexit
+import os
+import threading
+import time
+from collections import namedtuple
+import aiohttp
+from kline_decode import KLINE_INTERVAL_MS, decode_binance_klines
+from live_feed import REST_LIMIT, REST_WEIGHT, last_closed_open_time
+from metrics import LIVE_FETCHES, inference_stage
+from outbound import LIVE, scheduler
+from config import LIVE_FETCH_URLS, LIVE_FETCH_DEADLINE, LIVE_FETCH_HEDGE_DELAY, LIVE_DEGRADED_RETRY, LIVE_MAX_STALENESS_MINUTES
+
+# klines maps each pair to (open_time, [open, high, low, close, volume]) arrays
+LiveKlines = namedtuple("LiveKlines", ["klines", "source", "stale"])
+
+class HedgedKlineFetcher:
+    """Latest closed 1m klines of several pairs over REST, hedged across endpoints under one deadline.
+
+    Every pair is fetched concurrently from the first endpoint. When it hasn't produced a
+    complete answer after hedge_delay (or failed sooner), the next endpoint is raced against
+    it, and so on. An answer counts when every pair came back from the same endpoint and ends
+    on the same bar; the first one ending on the last closed bar wins, otherwise the best one
+    seen by the deadline.
+
+    When nothing usable arrives in time the fetcher degrades: it serves the last good snapshot
+    of each pair, flagged stale, for up to max_staleness_minutes of bar age, and skips the
+    network for retry_after seconds so a dead upstream doesn't cost every request the deadline.
+    """
+
+    def __init__(self, urls=LIVE_FETCH_URLS, deadline=LIVE_FETCH_DEADLINE, hedge_delay=LIVE_FETCH_HEDGE_DELAY,
+                 retry_after=LIVE_DEGRADED_RETRY, max_staleness_minutes=LIVE_MAX_STALENESS_MINUTES):
+        self.urls = [url.rstrip("/") for url in urls]
+        self.deadline = deadline
+        self.hedge_delay = hedge_delay
+        self.retry_after = retry_after
+        self.max_staleness_minutes = max_staleness_minutes
+        self._last_good = {}
+        self._degraded_until = 0.0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._loop_pid = None
+        self._session = None
+
+    def _event_loop(self):
+        # One loop thread per process keeps its connections alive between fetches; a forked
+        # worker inherits the loop object but not its thread, so it starts its own
+        with self._lock:
+            if self._loop is None or self._loop_pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._loop_pid = os.getpid()
+                self._session = None
+                threading.Thread(target=self._loop.run_forever, name="live-fetch", daemon=True).start()
+            return self._loop
+
+    def close(self):
+        with self._lock:
+            loop, session = self._loop, self._session
+        if loop is not None and session is not None and self._loop_pid == os.getpid():
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result(timeout=5)
+
+    async def _fetch_pair(self, url, pair, last_closed):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.deadline))
+        params = {"symbol": pair, "interval": "1m", "limit": REST_LIMIT}
+        # Rather than wait out a spent budget, fail so the next endpoint is raced
+        async with await scheduler.get_async(self._session, f"{url}/api/v3/klines", LIVE, REST_WEIGHT, params=params, max_wait=self.hedge_delay) as response:
+            response.raise_for_status()
+            payload = await response.read()
+        # Only closed klines, matching the training rows and the live feed
+        with inference_stage("decode"):
+            klines = decode_binance_klines(payload, last_closed)
+        return klines.open_time, klines.values
+
+    async def _fetch_source(self, url, pairs, last_closed):
+        results = await asyncio.gather(*(self._fetch_pair(url, pair, last_closed) for pair in pairs))
+        lasts = {int(open_time[-1]) if len(open_time) else None for open_time, _ in results}
+        if None in lasts or len(lasts) != 1:
+            raise ValueError(f"inconsistent klines, last bars {sorted(last for last in lasts if last is not None)}")
+        return dict(zip(pairs, results))
+
+    async def _hedged(self, pairs, last_closed):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        urls, pending, errors, fallback = list(self.urls), {}, [], None
+
+        def hedge():
+            url = urls.pop(0)
+            task = asyncio.ensure_future(self._fetch_source(url, pairs, last_closed))
+            # Losers are cancelled; one failing as it is cancelled shouldn't log an unretrieved exception
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            pending[task] = url
+            return loop.time() + self.hedge_delay
+
+        next_hedge = hedge()
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                if urls and now >= next_hedge:
+                    next_hedge = hedge()
+                    continue
+                timeout = min(deadline, next_hedge) - now if urls else deadline - now
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url = pending.pop(task)
+                    try:
+                        klines = task.result()
+                    except Exception as e:
+                        errors.append(f"{url}: {str(e) or type(e).__name__}")
+                        continue
+                    if all(open_time[-1] == last_closed for open_time, _ in klines.values()):
+                        return klines, url
+                    fallback = fallback or (klines, url)
+                if not pending and urls:
+                    # Everything in flight failed or lags the last closed bar: hedge at once
+                    next_hedge = hedge()
+        finally:
+            for task in pending:
+                task.cancel()
+        if fallback is not None:
+            return fallback
+        raise TimeoutError(f"No live klines within {self.deadline}s ({'; '.join(errors) or 'no endpoint answered'})")
+
+    def fetch(self, pairs, last_closed=None):
+        """LiveKlines of the given pairs, fresh or, when every endpoint fails, from the last good snapshot."""
+        pairs = list(pairs)
+        last_closed = last_closed_open_time() if last_closed is None else last_closed
+        if time.monotonic() < self._degraded_until:
+            degraded = self._degraded(pairs)
+            if degraded is not None:
+                return degraded
+        future = asyncio.run_coroutine_threadsafe(self._hedged(pairs, last_closed), self._event_loop())
+        try:
+            klines, source = future.result(timeout=self.deadline + 1)
+        except Exception as e:
+            future.cancel()
+            self._degraded_until = time.monotonic() + self.retry_after
+            degraded = self._degraded(pairs)
+            if degraded is None:
+                raise ConnectionError(f"Live klines unavailable and no recent snapshot to serve: {str(e)}") from e
+            print(f"Live kline fetch failed ({str(e)}), serving the last good snapshot for {self.retry_after}s")
+            return degraded
+        with self._lock:
+            self._last_good.update(klines)
+        LIVE_FETCHES.labels(source).inc()
+        return LiveKlines(klines, source, False)
+
+    def _degraded(self, pairs):
+        oldest = last_closed_open_time() - self.max_staleness_minutes * KLINE_INTERVAL_MS
+        with self._lock:
+            klines = {pair: self._last_good.get(pair) for pair in pairs}
+        if any(k is None or k[0][-1] < oldest for k in klines.values()):
+            return None
+        LIVE_FETCHES.labels("snapshot").inc()
+        return LiveKlines(klines, "snapshot", True)
+
+kline_fetcher = HedgedKlineFetcher()
+atexit.register(kline_fetcher.close)
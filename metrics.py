@@ -0,0 +1,103 @@
+import os
+import time
+from contextlib import contextmanager
+import config  # noqa: F401 -- sets PROMETHEUS_MULTIPROC_DIR for shared serving before prometheus_client loads
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# Request buckets reach past the worker's timeoutHTTPConnection (10s), so latency closing in
+# on it is visible before requests start failing
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 7.5, 10, 15, 30)
+UPDATE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+INFERENCE_REQUESTS = Counter("inference_requests_total", "Inference requests by token and outcome", ["token", "outcome"])
+INFERENCE_SECONDS = Histogram("inference_request_seconds", "End-to-end latency of an inference request", ["token"], buckets=LATENCY_BUCKETS)
+INFERENCE_STAGE_SECONDS = Histogram("inference_stage_seconds", "Latency of each inference stage", ["stage"], buckets=LATENCY_BUCKETS)
+UPDATE_STAGE_SECONDS = Histogram("update_stage_seconds", "Duration of each stage of a data update", ["stage"], buckets=UPDATE_BUCKETS)
+LIVE_FETCHES = Counter("live_fetch_total", "Live REST kline fetches by the endpoint that answered (snapshot when degraded)", ["source"])
+OUTBOUND_REQUESTS = Counter("outbound_requests_total", "Outbound HTTP requests by upstream, priority and response status", ["upstream", "priority", "status"])
+OUTBOUND_WAIT_SECONDS = Histogram("outbound_wait_seconds", "Time outbound requests waited for their upstream's budget", ["priority"], buckets=LATENCY_BUCKETS)
+UPDATES = Counter("updates_total", "Finished data updates by outcome", ["outcome"])
+
+_last_bar_close = {}
+
+class StageTimer:
+    """Times named stages into a histogram and keeps the total duration of each stage."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.durations[name] = self.durations.get(name, 0.0) + elapsed
+            self.histogram.labels(name).observe(elapsed)
+
+def inference_stage(name):
+    return INFERENCE_STAGE_SECONDS.labels(name).time()
+
+# Stages of the update running in this process; a retrain job reports them in its status
+update_stages = StageTimer(UPDATE_STAGE_SECONDS)
+
+def record_last_bar(token, close_time_ms):
+    _last_bar_close[token] = close_time_ms / 1000
+
+def record_update_status(status):
+    """Count a finished retrain job and its stage durations; status comes from retrain.claim_finished_status, which hands each job out once."""
+    if not status:
+        return
+    UPDATES.labels(status["state"]).inc()
+    for stage, seconds in status.get("stages", {}).items():
+        UPDATE_STAGE_SECONDS.labels(stage).observe(seconds)
+
+class _ScrapeGauges:
+    """Gauges computed from the scraping process' state at scrape time, outside the shared registry."""
+
+    def __init__(self, families):
+        self.families = families
+
+    def collect(self):
+        return self.families
+
+def _scrape_gauges(artifact_caches, cache_stats):
+    now = time.time()
+    model_info = GaugeMetricFamily("model_info", "The model version being served (always 1)", labels=["token", "version", "model"])
+    model_age = GaugeMetricFamily("model_age_seconds", "Seconds since the served model was trained", labels=["token"])
+    training_rows = GaugeMetricFamily("model_training_rows", "Rows the served model was trained on", labels=["token"])
+    test_mae = GaugeMetricFamily("model_test_mae", "Test MAE of the served model", labels=["token", "horizon"])
+    test_rmse = GaugeMetricFamily("model_test_rmse", "Test RMSE of the served model", labels=["token", "horizon"])
+    last_bar_age = GaugeMetricFamily("data_last_bar_age_seconds", "Seconds since the close of the last bar a prediction was made from", labels=["token"])
+    prediction_cache = GaugeMetricFamily("prediction_cache_events", "Prediction cache hits, misses and coalesced requests", labels=["event"])
+    for token, cache in artifact_caches.items():
+        bundle = cache.current()
+        if bundle is None:
+            continue
+        metadata = bundle.metadata
+        model_info.add_metric([token, bundle.version, metadata["model"]], 1)
+        model_age.add_metric([token], now - metadata["created_at"])
+        training_rows.add_metric([token], metadata["rows"])
+        for horizon, metrics in metadata["metrics"].items():
+            test_mae.add_metric([token, horizon], metrics["test_mae"])
+            test_rmse.add_metric([token, horizon], metrics["test_rmse"])
+    for token, close_time in _last_bar_close.items():
+        last_bar_age.add_metric([token], now - close_time)
+    for event in ["hits", "misses", "coalesced"]:
+        prediction_cache.add_metric([event], cache_stats[event])
+    return _ScrapeGauges([model_info, model_age, training_rows, test_mae, test_rmse, last_bar_age, prediction_cache])
+
+def render(artifact_caches, cache_stats):
+    """Counters and histograms (of every worker under shared serving) plus the scrape-time gauges, as (body, content type).
+
+    The gauges describe the models, last bar and prediction cache of the process answering the scrape.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(_scrape_gauges(artifact_caches, cache_stats)), CONTENT_TYPE_LATEST
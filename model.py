@@ -1,20 +1,32 @@
-import json
+import logging
 import os
-import pickle
-from zipfile import ZipFile
+import time
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import TimeSeriesSplit
+from sklearn.linear_model import LinearRegression, Ridge, BayesianRidge
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from updater import download_binance_daily_data, download_binance_current_day_data, download_coingecko_data, download_coingecko_current_day_data
-from config import data_base_path, model_file_path, TOKEN, TIMEFRAME, TRAINING_DAYS, REGION, DATA_PROVIDER, MODEL, CG_API_KEY
+from sklearn.multioutput import MultiOutputRegressor
+from knn import KNNRegressor
+from linear_stats import daily_statistics, combine_statistics, prune_statistics, solve_statistics, statistics_errors
+from walk_forward import walk_forward_evaluate
+from features import add_features, horizon_minutes
+from tokens import TOKEN_REGISTRY, registry_pairs
+from kline_cache import load_klines
+from training_store import training_store_path, training_store_exists, write_training_store, open_training_store, store_columns, store_datetime_index
+from updater import download_binance_daily_data, download_coingecko_data
+from artifacts import publish_artifacts, token_artifacts_path
+from metrics import update_stages
+from config import data_base_path, TOKEN, TIMEFRAME, TRAINING_DAYS, REGION, DATA_PROVIDER, MODEL, CG_API_KEY, KNN_NEIGHBORS, KNN_INDEX, KNN_PROBES, TRAINING_MODE, RIDGE_ALPHA, PREDICTION_HORIZONS, WALK_FORWARD_FOLDS, WALK_FORWARD_MODE, WALK_FORWARD_WINDOW_DAYS
 
 binance_data_path = os.path.join(data_base_path, "binance")
 coingecko_data_path = os.path.join(data_base_path, "coingecko")
-training_price_data_path = os.path.join(data_base_path, "price_data.csv")
-scaler_file_path = os.path.join(data_base_path, "scaler.pkl")
+logger = logging.getLogger(__name__)
+
+# Features and horizons are counted in 1-minute rows, and CoinGecko's OHLC granularity is
+# chosen by the API (30m candles up to 2 days, 4h up to 30, 4d beyond), so its candles
+# can't be turned into training rows
+COINGECKO_TRAINING_ERROR = "CoinGecko OHLC candles are 30m to 4d wide and training needs 1-minute klines, train with DATA_PROVIDER=binance"
 
 def download_data_binance(token, training_days, region):
     print(f"Calling download_binance_daily_data for {token}USDT, days={training_days}, region={region}")
@@ -39,139 +51,89 @@ def download_data(token, training_days, region, data_provider):
     print(f"Download result for {token}: {len(result)} files")
     return result
 
-def format_data(files_btc, files_eth, data_provider):
-    print(f"Raw files for BTCUSDT: {files_btc[:5]}")
-    print(f"Raw files for ETHUSDT: {files_eth[:5]}")
-    print(f"Files for BTCUSDT: {len(files_btc)}, Files for ETHUSDT: {len(files_eth)}")
-    if not files_btc or not files_eth:
-        print("No files provided for BTCUSDT or ETHUSDT, exiting format_data")
+def format_data(files_by_pair, data_provider, registry=TOKEN_REGISTRY):
+    """Build the training store shared by every token's model from the klines of each pair.
+
+    Each pair is parsed once and featurized once; the store holds the union of the tokens'
+    feature columns and one target column per token and horizon. Only Binance klines can
+    be formatted: CoinGecko raises ValueError.
+    """
+    if data_provider == "coingecko":
+        raise ValueError(COINGECKO_TRAINING_ERROR)
+    for pair, files in files_by_pair.items():
+        logger.debug("Files for %s: %d, raw files: %s", pair, len(files), files[:5])
+    if not all(files_by_pair.values()):
+        print(f"No files provided for one of {list(files_by_pair)}, exiting format_data")
         return
-    
+
     if data_provider == "binance":
-        files_btc = sorted([f for f in files_btc if "BTCUSDT" in os.path.basename(f) and f.endswith(".zip")])
-        files_eth = sorted([f for f in files_eth if "ETHUSDT" in os.path.basename(f) and f.endswith(".zip")])
-        print(f"Filtered BTCUSDT files: {files_btc[:5]}")
-        print(f"Filtered ETHUSDT files: {files_eth[:5]}")
-    elif data_provider == "coingecko":
-        files_btc = sorted([x for x in files_btc if x.endswith(".json")])
-        files_eth = sorted([x for x in files_eth if x.endswith(".json")])
-
-    if len(files_btc) == 0 or len(files_eth) == 0:
-        print("No valid files to process for BTCUSDT or ETHUSDT after filtering")
+        files_by_pair = {
+            pair: sorted([f for f in files if pair in os.path.basename(f) and f.endswith(".zip")])
+            for pair, files in files_by_pair.items()
+        }
+
+    if not all(files_by_pair.values()):
+        print(f"No valid files to process for one of {list(files_by_pair)} after filtering")
         return
 
-    price_df_btc = pd.DataFrame()
-    price_df_eth = pd.DataFrame()
+    price_dfs = {pair: pd.DataFrame() for pair in files_by_pair}
 
     if data_provider == "binance":
-        for file in files_btc:
-            zip_file_path = os.path.join(binance_data_path, os.path.basename(file))
-            if not os.path.exists(zip_file_path):
-                print(f"File not found: {zip_file_path}")
-                continue
-            try:
-                myzip = ZipFile(zip_file_path)
-                with myzip.open(myzip.filelist[0]) as f:
-                    line = f.readline()
-                    header = 0 if line.decode("utf-8").startswith("open_time") else None
-                df = pd.read_csv(myzip.open(myzip.filelist[0]), header=header).iloc[:, :11]
-                df.columns = ["start_time", "open", "high", "low", "close", "volume", "end_time", "volume_usd", "n_trades", "taker_volume", "taker_volume_usd"]
-                max_time = df["end_time"].max()
-                print(f"Sample end_time values from {file}: {df['end_time'].head().tolist()}")
-                if max_time > 1e15:  # Nanoseconds
-                    df["date"] = pd.to_datetime(df["end_time"], unit="ns")
-                elif max_time > 1e12:  # Microseconds
-                    df["date"] = pd.to_datetime(df["end_time"], unit="us")
-                else:  # Milliseconds
-                    df["date"] = pd.to_datetime(df["end_time"], unit="ms")
-                df.set_index("date", inplace=True)
-                print(f"Processed {file} with {len(df)} rows")
-                price_df_btc = pd.concat([price_df_btc, df])
-            except Exception as e:
-                print(f"Error processing {file}: {str(e)}")
-                continue
-
-        for file in files_eth:
-            zip_file_path = os.path.join(binance_data_path, os.path.basename(file))
-            if not os.path.exists(zip_file_path):
-                print(f"File not found: {zip_file_path}")
-                continue
-            try:
-                myzip = ZipFile(zip_file_path)
-                with myzip.open(myzip.filelist[0]) as f:
-                    line = f.readline()
-                    header = 0 if line.decode("utf-8").startswith("open_time") else None
-                df = pd.read_csv(myzip.open(myzip.filelist[0]), header=header).iloc[:, :11]
-                df.columns = ["start_time", "open", "high", "low", "close", "volume", "end_time", "volume_usd", "n_trades", "taker_volume", "taker_volume_usd"]
-                max_time = df["end_time"].max()
-                print(f"Sample end_time values from {file}: {df['end_time'].head().tolist()}")
-                if max_time > 1e15:  # Nanoseconds
-                    df["date"] = pd.to_datetime(df["end_time"], unit="ns")
-                elif max_time > 1e12:  # Microseconds
-                    df["date"] = pd.to_datetime(df["end_time"], unit="us")
-                else:  # Milliseconds
-                    df["date"] = pd.to_datetime(df["end_time"], unit="ms")
-                df.set_index("date", inplace=True)
-                print(f"Processed {file} with {len(df)} rows")
-                price_df_eth = pd.concat([price_df_eth, df])
-            except Exception as e:
-                print(f"Error processing {file}: {str(e)}")
-                continue
-
-    if price_df_btc.empty or price_df_eth.empty:
-        print("No data processed for BTCUSDT or ETHUSDT")
+        zip_files_by_pair = {}
+        for pair, files in files_by_pair.items():
+            zip_files_by_pair[pair] = []
+            for file in files:
+                zip_file_path = os.path.join(binance_data_path, os.path.basename(file))
+                if not os.path.exists(zip_file_path):
+                    print(f"File not found: {zip_file_path}")
+                    continue
+                zip_files_by_pair[pair].append(zip_file_path)
+        with update_stages.stage("parse"):
+            price_dfs = load_klines(zip_files_by_pair)
+
+    if any(df.empty for df in price_dfs.values()):
+        print(f"No data processed for one of {list(price_dfs)}")
         return
 
-    price_df_btc = price_df_btc.rename(columns=lambda x: f"{x}_BTCUSDT")
-    price_df_eth = price_df_eth.rename(columns=lambda x: f"{x}_ETHUSDT")
-    price_df = pd.concat([price_df_btc, price_df_eth], axis=1)
-
-    # Feature engineering (exactly 80 features)
-    feature_dict = {}
-    for pair in ["ETHUSDT", "BTCUSDT"]:
-        for metric in ["open", "high", "low", "close"]:
-            for lag in range(1, 10):  # 9 lags
-                feature_dict[f"{metric}_{pair}_lag{lag}"] = price_df[f"{metric}_{pair}"].shift(lag)
-        feature_dict[f"close_{pair}_lag10"] = price_df[f"close_{pair}"].shift(10)
-        feature_dict[f"close_{pair}_ma5"] = price_df[f"close_{pair}"].rolling(window=5).mean()
-        feature_dict[f"volume_{pair}_lag1"] = price_df[f"volume_{pair}"].shift(1)
-    feature_dict["ema20_ETHUSDT"] = price_df["close_ETHUSDT"].ewm(span=20, adjust=False).mean()  # 20-min EMA
-
-    price_df = pd.concat([price_df, pd.DataFrame(feature_dict)], axis=1)
-    price_df["hour_of_day"] = price_df.index.hour
-    price_df["target_ETHUSDT"] = price_df["close_ETHUSDT"].shift(-360)  # 6 hours ahead
-
-    price_df = price_df.dropna()
+    with update_stages.stage("featurize"):
+        price_df = pd.concat([df.rename(columns=lambda x, pair=pair: f"{x}_{pair}") for pair, df in price_dfs.items()], axis=1)
+        price_columns = list(price_df.columns)
+
+        # Feature engineering (exactly 80 features per token)
+        price_df = add_features(price_df, registry_pairs(registry), [spec.pair for spec in registry.values()])
+        # One target column per token and horizon; a token's horizons are fitted against the same features
+        for spec in registry.values():
+            for horizon, target in zip(PREDICTION_HORIZONS, spec.targets):
+                price_df[target] = price_df[f"close_{spec.pair}"].shift(-horizon_minutes(horizon))
+
+        # Each token's features (in feature_columns() order) and targets are stored as one
+        # contiguous block, so store_columns maps them without a copy; columns several tokens
+        # share are repeated in each token's block
+        price_df = price_df[price_columns + [column for spec in registry.values() for column in spec.features + spec.targets]]
+        price_df = price_df.dropna()
     print(f"Total rows in price_df after preprocessing: {len(price_df)}")
-    print(f"First few dates in price_df: {price_df.index[:5].tolist()}")
+    if price_df.empty:
+        # Keep the last good store rather than replace it with an empty one
+        print(f"No rows left after preprocessing, {training_store_path} was not updated")
+        return 0
+    logger.debug("First few dates in price_df: %s", price_df.index[:5].tolist())
 
-    price_df.to_csv(training_price_data_path, date_format='%Y-%m-%d %H:%M:%S')
-    print(f"Data saved to {training_price_data_path}")
+    with update_stages.stage("persist"):
+        write_training_store(price_df, training_store_path)
+    print(f"Data saved to {training_store_path}")
+    return len(price_df)
 
-def load_frame(file_path, timeframe):
-    print(f"Loading data from {file_path}...")
-    df = pd.read_csv(file_path, index_col='date', parse_dates=True)
-    df.ffill(inplace=True)
-    df.bfill(inplace=True)
+def load_frame(file_path, timeframe, token=TOKEN):
+    print(f"Loading {token} data from {file_path}...")
+    spec = TOKEN_REGISTRY[token]
+    store = open_training_store(file_path)
     
-    features = (
-        [
-            f"{metric}_{pair}_lag{lag}" 
-            for pair in ["ETHUSDT", "BTCUSDT"]
-            for metric in ["open", "high", "low", "close"]
-            for lag in range(1, 10)
-        ] + [f"close_{pair}_lag10" for pair in ["ETHUSDT", "BTCUSDT"]] + 
-        [f"close_{pair}_ma5" for pair in ["ETHUSDT", "BTCUSDT"]] + 
-        [f"volume_{pair}_lag1" for pair in ["ETHUSDT", "BTCUSDT"]] + 
-        ["ema20_ETHUSDT", "hour_of_day"]
-    )  # 80 features: 72 (OHLC lags 1-9) + 2 (close_lag10) + 2 (ma5) + 2 (volume_lag1) + 1 (ema20) + 1 (hour)
-    
-    missing_features = [f for f in features if f not in df.columns]
+    missing_features = [f for f in spec.features + spec.targets if f not in store.columns]
     if missing_features:
         raise ValueError(f"Missing features in data: {missing_features}")
     
-    X = df[features]
-    y = df["target_ETHUSDT"]
+    X = store_columns(store, spec.features)
+    y = pd.DataFrame(store_columns(store, spec.targets), index=store_datetime_index(store), columns=spec.targets)
     
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
@@ -180,108 +142,215 @@ def load_frame(file_path, timeframe):
     X_train, X_test = X_scaled[:split_idx], X_scaled[split_idx:]
     y_train, y_test = y.iloc[:split_idx], y.iloc[split_idx:]
     
-    print(f"Loaded {len(df)} rows, resampled to {timeframe}")
+    print(f"Loaded {len(y)} rows, resampled to {timeframe}")
     return X_train, X_test, y_train, y_test, scaler
 
-def preprocess_live_data(df_btc, df_eth):
-    if "date" in df_btc.columns:
-        df_btc.set_index("date", inplace=True)
-    if "date" in df_eth.columns:
-        df_eth.set_index("date", inplace=True)
-    
-    df_btc = df_btc.rename(columns=lambda x: f"{x}_BTCUSDT" if x != "date" else x)
-    df_eth = df_eth.rename(columns=lambda x: f"{x}_ETHUSDT" if x != "date" else x)
-    
-    df = pd.concat([df_btc, df_eth], axis=1)
-    print(f"Live data sample (raw):\n{df.tail()}")
-    
-    feature_dict = {}
-    for pair in ["ETHUSDT", "BTCUSDT"]:
-        for metric in ["open", "high", "low", "close"]:
-            for lag in range(1, 10):
-                feature_dict[f"{metric}_{pair}_lag{lag}"] = df[f"{metric}_{pair}"].shift(lag)
-        feature_dict[f"close_{pair}_lag10"] = df[f"close_{pair}"].shift(10)
-        feature_dict[f"close_{pair}_ma5"] = df[f"close_{pair}"].rolling(window=5).mean()
-        feature_dict[f"volume_{pair}_lag1"] = df[f"volume_{pair}"].shift(1)
-    feature_dict["ema20_ETHUSDT"] = df["close_ETHUSDT"].ewm(span=20, adjust=False).mean()
-
-    df = pd.concat([df, pd.DataFrame(feature_dict)], axis=1)
-    df["hour_of_day"] = df.index.hour
-    
-    df = df.dropna()
-    print(f"Live data after preprocessing:\n{df.tail()}")
-    
-    features = (
-        [
-            f"{metric}_{pair}_lag{lag}" 
-            for pair in ["ETHUSDT", "BTCUSDT"]
-            for metric in ["open", "high", "low", "close"]
-            for lag in range(1, 10)
-        ] + [f"close_{pair}_lag10" for pair in ["ETHUSDT", "BTCUSDT"]] + 
-        [f"close_{pair}_ma5" for pair in ["ETHUSDT", "BTCUSDT"]] + 
-        [f"volume_{pair}_lag1" for pair in ["ETHUSDT", "BTCUSDT"]] + 
-        ["ema20_ETHUSDT", "hour_of_day"]
-    )  # 80 features
-    
-    X = df[features]
-    
-    with open(scaler_file_path, "rb") as f:
-        scaler = pickle.load(f)
-    X_scaled = scaler.transform(X)
-    
-    return X_scaled
+# Linear models are exported as fused weights; "knn" models as their neighbour index.
+# Every model predicts all horizons at once; BayesianRidge has no multi-output fit of its own.
+MODEL_REGISTRY = {
+    "LinearRegression": {"kind": "linear", "build": lambda: LinearRegression()},
+    "Ridge": {"kind": "linear", "build": lambda: Ridge(alpha=RIDGE_ALPHA)},
+    "BayesianRidge": {"kind": "linear", "build": lambda: MultiOutputRegressor(BayesianRidge())},
+    "KNN": {"kind": "knn", "build": lambda: KNNRegressor(n_neighbors=KNN_NEIGHBORS, index=KNN_INDEX, n_probe=KNN_PROBES)},
+}
+MAX_KNN_EVAL_ROWS = 5000
 
-def train_model(timeframe, file_path=training_price_data_path):
-    if not os.path.exists(file_path):
+def _evaluation_rows(n_rows, kind):
+    # Scoring every row through a neighbour index is far slower than a fit; sample evenly
+    if kind == "knn" and n_rows > MAX_KNN_EVAL_ROWS:
+        return np.linspace(0, n_rows - 1, MAX_KNN_EVAL_ROWS).astype(int)
+    return slice(None)
+
+def _knn_query_latency(model, X, n_queries=200):
+    timings = []
+    for x in X[np.linspace(0, len(X) - 1, min(n_queries, len(X))).astype(int)]:
+        start = time.perf_counter()
+        model.neighbors(x)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+def _linear_coefficients(model):
+    """Coefficients (targets x features) and intercepts (targets) of a fitted multi-output linear model."""
+    if hasattr(model, "estimators_"):
+        return np.stack([e.coef_ for e in model.estimators_]), np.array([e.intercept_ for e in model.estimators_])
+    return np.atleast_2d(model.coef_), np.atleast_1d(model.intercept_)
+
+def _report_metrics(prefix, y_true, y_pred):
+    mae = mean_absolute_error(y_true, y_pred)
+    rmse = np.sqrt(mean_squared_error(y_true, y_pred))
+    r2 = r2_score(y_true, y_pred)
+    print(f"{prefix} MAE: {mae:.6f}")
+    print(f"{prefix} RMSE: {rmse:.6f}")
+    print(f"{prefix} R²: {r2:.6f}")
+    return mae, rmse, r2
+
+def _horizon_metrics(y_train, train_pred, y_test, predictions):
+    """Train/test metrics per horizon, from (rows x horizons) targets and predictions."""
+    metrics = {}
+    for i, horizon in enumerate(PREDICTION_HORIZONS):
+        train_mae, train_rmse, train_r2 = _report_metrics(f"Training {horizon}", y_train[:, i], train_pred[:, i])
+        mae, rmse, r2 = _report_metrics(f"Test {horizon}", y_test[:, i], predictions[:, i])
+        metrics[horizon] = {"train_mae": train_mae, "train_rmse": train_rmse, "train_r2": train_r2, "test_mae": mae, "test_rmse": rmse, "test_r2": r2}
+    return metrics
+
+def _statistics_metrics(train_stats, test_stats, weights, intercept, test_mae):
+    """Train/test metrics per horizon of a fit from sufficient statistics; only the test MAE was scored on rows."""
+    train, test = statistics_errors(train_stats, weights, intercept), statistics_errors(test_stats, weights, intercept)
+    metrics = {}
+    for i, horizon in enumerate(PREDICTION_HORIZONS):
+        print(f"Training {horizon} RMSE: {train['rmse'][i]:.6f}")
+        print(f"Training {horizon} R²: {train['r2'][i]:.6f}")
+        print(f"Test {horizon} MAE: {test_mae[i]:.6f}")
+        print(f"Test {horizon} RMSE: {test['rmse'][i]:.6f}")
+        print(f"Test {horizon} R²: {test['r2'][i]:.6f}")
+        # A training MAE would need every training row scored again
+        metrics[horizon] = {"train_mae": None, "train_rmse": float(train["rmse"][i]), "train_r2": float(train["r2"][i]),
+                            "test_mae": float(test_mae[i]), "test_rmse": float(test["rmse"][i]), "test_r2": float(test["r2"][i])}
+    return metrics, test["bias"]
+
+def _walk_forward_bias(model_name, token, bias_correction):
+    """The walk-forward bias estimate and report when WALK_FORWARD_FOLDS is set, else the holdout's bias."""
+    if WALK_FORWARD_FOLDS <= 0:
+        return bias_correction, None
+    print(f"Walk-forward evaluation: {WALK_FORWARD_FOLDS} {WALK_FORWARD_MODE} folds")
+    with update_stages.stage("evaluate"):
+        report = walk_forward_evaluate(model_name, token, WALK_FORWARD_FOLDS, WALK_FORWARD_MODE, WALK_FORWARD_WINDOW_DAYS or None)
+    for horizon, summary in report["summary"].items():
+        print(f"Walk-forward {horizon} MAE: {summary['mae']:.6f} ± {summary['mae_std']:.6f}, bias: {summary['bias']:.6f}")
+    return np.array(report["bias_correction"]), {key: report[key] for key in ["mode", "window_days", "gap", "summary", "folds"]}
+
+def train_incremental(timeframe, file_path=training_store_path, token=TOKEN):
+    """Fit the linear model from per-day sufficient statistics (TRAINING_MODE=incremental).
+
+    Only days that are new or changed since the last retrain are read from the store; the
+    fit itself is a solve over the 80x80 normal equations. Metrics and the bias correction
+    come from a fit on the first 80% of days, evaluated from the statistics of both splits;
+    only the test MAE scores rows, those of the test days. The published model is then
+    fitted on every day in the window.
+    """
+    model_name = MODEL or "LinearRegression"
+    if model_name not in ["LinearRegression", "Ridge"]:
+        raise ValueError(f"TRAINING_MODE=incremental supports LinearRegression and Ridge, got: {model_name}")
+    alpha = RIDGE_ALPHA if model_name == "Ridge" else 0.0
+
+    spec = TOKEN_REGISTRY[token]
+    store = open_training_store(file_path)
+    prune_statistics([(spec.features, spec.targets) for spec in TOKEN_REGISTRY.values()])
+    with update_stages.stage("fit"):
+        blocks, computed = daily_statistics(store, spec.features, spec.targets)
+    print(f"Loaded statistics for {len(blocks)} days: {computed} computed, {len(blocks) - computed} reused")
+    if len(blocks) < 2:
+        raise ValueError("TRAINING_MODE=incremental needs at least 2 days of training data")
+
+    split_day = min(max(1, int(len(blocks) * 0.8)), len(blocks) - 1)
+    train_stats = combine_statistics([stats for _, stats in blocks[:split_day]])
+    test_stats = combine_statistics([stats for _, stats in blocks[split_day:]])
+    split_idx = int(train_stats["n"])
+    print(f"Training days: {split_day}, test days: {len(blocks) - split_day}, test rows: {store.schema['rows'] - split_idx}")
+
+    print(f"\n🚀 Solving {model_name} from sufficient statistics (alpha={alpha})...")
+    with update_stages.stage("fit"):
+        weights, intercept, _, _ = solve_statistics(train_stats, alpha)
+    test_rows = slice(split_idx, None)
+    predictions = store_columns(store, spec.features, test_rows) @ weights + intercept
+    test_mae = np.abs(store_columns(store, spec.targets, test_rows) - predictions).mean(axis=0)
+    metrics, bias_correction = _statistics_metrics(train_stats, test_stats, weights, intercept, test_mae)
+
+    bias_correction, walk_forward = _walk_forward_bias(model_name, token, bias_correction)
+    print(f"Bias correction: {dict(zip(PREDICTION_HORIZONS, bias_correction.round(6).tolist()))}")
+
+    with update_stages.stage("fit"):
+        weights, intercept, _, _ = solve_statistics(combine_statistics([stats for _, stats in blocks]), alpha)
+    print(f"\n✅ Solved {model_name} over all {len(blocks)} days")
+    metadata = {
+        "kind": "linear",
+        "token": token,
+        "model": model_name,
+        "training_mode": "incremental",
+        "features": spec.features,
+        "horizons": PREDICTION_HORIZONS,
+        "intercept": (intercept + bias_correction).tolist(),
+        "bias_correction": bias_correction.tolist(),
+        "rows": int(store.schema["rows"]),
+        "days": len(blocks),
+        "metrics": metrics,
+    }
+    if walk_forward:
+        metadata["walk_forward"] = walk_forward
+    with update_stages.stage("persist"):
+        version = publish_artifacts({"weights": weights}, metadata, path=token_artifacts_path(token))
+    print(f"Trained {token} model published as version {version}")
+
+    return {**metadata, "version": version}
+
+def train_model(timeframe, file_path=training_store_path, token=TOKEN):
+    if not training_store_exists(file_path):
         raise FileNotFoundError(f"Training data file not found at {file_path}. Ensure data is downloaded and formatted.")
+    if token not in TOKEN_REGISTRY:
+        raise ValueError(f"Token must be one of {list(TOKEN_REGISTRY)}, got: {token}")
+    if TRAINING_MODE == "incremental":
+        return train_incremental(timeframe, file_path, token)
+    model_name = MODEL or "LinearRegression"
+    if model_name not in MODEL_REGISTRY:
+        raise ValueError(f"MODEL must be one of {list(MODEL_REGISTRY)}, got: {model_name}")
+    kind = MODEL_REGISTRY[model_name]["kind"]
     
-    X_train, X_test, y_train, y_test, scaler = load_frame(file_path, timeframe)
+    X_train, X_test, y_train, y_test, scaler = load_frame(file_path, timeframe, token)
     print(f"Training data shape: {X_train.shape}, Test data shape: {X_test.shape}")
     
-    print("\n🚀 Training LinearRegression Model...")
-    model = LinearRegression()
-    model.fit(X_train, y_train)
-    print("\n✅ Trained LinearRegression model")
-    
-    train_pred = model.predict(X_train)
-    train_mae = mean_absolute_error(y_train, train_pred)
-    train_rmse = np.sqrt(mean_squared_error(y_train, train_pred))
-    train_r2 = r2_score(y_train, train_pred)
-    print(f"Training MAE: {train_mae:.6f}")
-    print(f"Training RMSE: {train_rmse:.6f}")
-    print(f"Training R²: {train_r2:.6f}")
-
-    predictions = model.predict(X_test)
-    mae = mean_absolute_error(y_test, predictions)
-    rmse = np.sqrt(mean_squared_error(y_test, predictions))
-    r2 = r2_score(y_test, predictions)
-    print(f"Test MAE: {mae:.6f}")
-    print(f"Test RMSE: {rmse:.6f}")
-    print(f"Test R²: {r2:.6f}")
+    print(f"\n🚀 Training {token} {model_name} Model...")
+    model = MODEL_REGISTRY[model_name]["build"]()
+    with update_stages.stage("fit"):
+        model.fit(X_train, y_train)
+    print(f"\n✅ Trained {model_name} model")
     
-    os.makedirs(os.path.dirname(model_file_path), exist_ok=True)
-    with open(model_file_path, "wb") as f:
-        pickle.dump(model, f)
-    with open(scaler_file_path, "wb") as f:
-        pickle.dump(scaler, f)
-    print(f"Trained model saved to {model_file_path}")
-    print(f"Scaler saved to {scaler_file_path}")
+    train_rows = _evaluation_rows(len(y_train), kind)
+    y_train_eval = y_train.to_numpy()[train_rows]
+    train_pred = model.predict(X_train[train_rows]).reshape(y_train_eval.shape)
+    test_rows = _evaluation_rows(len(y_test), kind)
+    y_test_eval = y_test.to_numpy()[test_rows]
+    predictions = model.predict(X_test[test_rows]).reshape(y_test_eval.shape)
+    metrics = _horizon_metrics(y_train_eval, train_pred, y_test_eval, predictions)
     
-    return model, scaler
+    # Mean signed test residual: a systematic offset the fit leaves on unseen data
+    bias_correction = np.mean(y_test_eval - predictions, axis=0)
+    bias_correction, walk_forward = _walk_forward_bias(model_name, token, bias_correction)
+    print(f"Bias correction: {dict(zip(PREDICTION_HORIZONS, bias_correction.round(6).tolist()))}")
 
-def get_inference(token, timeframe, region, data_provider):
-    with open(model_file_path, "rb") as f:
-        loaded_model = pickle.load(f)
-    
-    if data_provider == "coingecko":
-        df_btc = download_coingecko_current_day_data("BTC", CG_API_KEY)
-        df_eth = download_coingecko_current_day_data("ETH", CG_API_KEY)
+    metadata = {
+        "kind": kind,
+        "token": token,
+        "model": model_name,
+        "training_mode": "full",
+        "features": TOKEN_REGISTRY[token].features,
+        "horizons": PREDICTION_HORIZONS,
+        "bias_correction": bias_correction.tolist(),
+        "rows": len(y_train) + len(y_test),
+        "metrics": metrics,
+    }
+    if walk_forward:
+        metadata["walk_forward"] = walk_forward
+    if kind == "linear":
+        # Fold the scaler and the bias into one (features x horizons) weight matrix over the raw features
+        coef, intercept = _linear_coefficients(model)
+        weights = (coef / scaler.scale_).T
+        metadata["intercept"] = (intercept - scaler.mean_ @ weights + bias_correction).tolist()
+        arrays, objects = {"weights": weights}, {}
     else:
-        df_btc = download_binance_current_day_data("BTCUSDT", region)
-        df_eth = download_binance_current_day_data("ETHUSDT", region)
+        query_p50, query_p99 = _knn_query_latency(model, X_test)
+        print(f"KNN {model.index} index built in {model.build_seconds:.3f}s, query latency p50={query_p50:.3f}ms p99={query_p99:.3f}ms")
+        metadata["knn"] = {
+            "n_neighbors": model.n_neighbors,
+            "index": model.index,
+            "n_probe": model.n_probe,
+            "build_seconds": model.build_seconds,
+            "query_ms_p50": query_p50,
+            "query_ms_p99": query_p99,
+        }
+        arrays, objects = model.artifacts()
+        arrays.update(scaler_mean=scaler.mean_, scaler_scale=scaler.scale_)
+    with update_stages.stage("persist"):
+        version = publish_artifacts(arrays, metadata, objects, path=token_artifacts_path(token))
+    print(f"Trained {token} model published as version {version}")
     
-    X_new = preprocess_live_data(df_btc, df_eth)
-    print("Inference input data shape:", X_new.shape)
-    price_pred = loaded_model.predict(X_new)[-1] + 54.60  # Bias correction with test MAE
-    print(f"Predicted 6h ETH/USD Price: {price_pred:.2f}")
-    return price_pred
+    return {**metadata, "version": version}
@@ -0,0 +1,223 @@
+"""One scheduler for every outbound HTTP call: token buckets per upstream and API key.
+
+Each upstream (the Binance REST API of either region, CoinGecko, ...) has a budget of request
+weight or calls per period, drawn from one token bucket per API key. Buckets are small files
+under SHARED_STATE_PATH, locked for each update, so the gunicorn workers, the serving sidecar
+and retrain jobs share one budget instead of each assuming all of it.
+
+Responses keep the buckets honest. Binance reports the weight its whole IP used in the
+current minute (X-MBX-USED-WEIGHT-1M), which caps what is left of that minute; a 429 or 418
+blocks the bucket for its Retry-After, for every process.
+
+Live inference comes first: backfill leaves OUTBOUND_LIVE_RESERVE of each budget to it and
+stands aside while a live request waits.
+"""
+import asyncio
+import fcntl
+import hashlib
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qsl, urlsplit
+from metrics import OUTBOUND_REQUESTS, OUTBOUND_WAIT_SECONDS
+from config import (BINANCE_API_URL, BINANCE_DATA_URL, BINANCE_WEIGHT_PER_MINUTE, COINGECKO_API_URL, COINGECKO_CALLS_PER_MINUTE,
+                    LIVE_FETCH_URLS, OUTBOUND_LIVE_RESERVE, SHARED_STATE_PATH)
+
+LIVE, BACKFILL = "live", "backfill"
+# 429: over the limit; 418: Binance's IP ban for carrying on after 429s
+THROTTLED = (418, 429)
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+# Binance's per-IP budgets; BINANCE_WEIGHT_PER_MINUTE sets BINANCE_API_URL's and any other endpoint's
+BINANCE_WEIGHTS = {"https://api.binance.com": 6000, "https://api.binance.us": 1200}
+API_KEY_FIELDS = ("api_key", "x_cg_demo_api_key", "x_cg_pro_api_key", "x-cg-demo-api-key", "x-cg-pro-api-key", "X-MBX-APIKEY")
+DEFAULT_RETRY_AFTER = 10.0
+MAX_SLEEP = 1.0
+THROTTLE_RETRIES = 3
+
+# capacity tokens refill over period seconds; a capacity of None is no budget, though Retry-After
+# still holds. With used_weight_header the upstream also counts a fixed window of period seconds.
+RateLimit = namedtuple("RateLimit", ["capacity", "period", "used_weight_header"])
+UNLIMITED = RateLimit(None, 60, None)
+
+# tokens, updated_at, blocked_until, live_waiting_until, window_end, window_used (epoch seconds)
+_STATE = struct.Struct("6d")
+TOKENS, UPDATED, BLOCKED, LIVE_WAITING, WINDOW_END, WINDOW_USED = range(6)
+
+class RateLimited(Exception):
+    """The upstream throttled a request, or its budget would keep it waiting longer than allowed."""
+
+def default_limits():
+    """{base url: RateLimit} of the upstreams the node calls."""
+    limits = {BINANCE_DATA_URL: UNLIMITED}
+    for url in LIVE_FETCH_URLS:
+        limits[url] = RateLimit(BINANCE_WEIGHTS.get(url.rstrip("/"), BINANCE_WEIGHT_PER_MINUTE), 60, USED_WEIGHT_HEADER)
+    limits[BINANCE_API_URL] = RateLimit(BINANCE_WEIGHT_PER_MINUTE, 60, USED_WEIGHT_HEADER)
+    limits[COINGECKO_API_URL] = RateLimit(COINGECKO_CALLS_PER_MINUTE, 60, None)
+    return {base.rstrip("/"): limit for base, limit in limits.items()}
+
+def _retry_after(value):
+    """Seconds of a Retry-After header, in seconds or as an HTTP date."""
+    if value is None:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+class OutboundScheduler:
+    """Admits outbound requests against their upstream's budget, shared through files in state_path."""
+
+    def __init__(self, limits=None, state_path=os.path.join(SHARED_STATE_PATH, "outbound"), live_reserve=OUTBOUND_LIVE_RESERVE):
+        # Longest base first, so a path under a host can have a budget of its own
+        self.limits = sorted((limits if limits is not None else default_limits()).items(), key=lambda item: -len(item[0]))
+        self.state_path = state_path
+        self.live_reserve = live_reserve
+        self._fds = {}
+        self._fds_pid = None
+        self._lock = threading.Lock()
+
+    def _bucket(self, url, params=None, headers=None):
+        """(bucket file name, upstream base url, RateLimit) of a request."""
+        base, limit = next(((b, l) for b, l in self.limits if url.startswith(b) and url[len(b):len(b) + 1] in ("", "/", "?")), (None, UNLIMITED))
+        parts = urlsplit(url)
+        if base is None:
+            base = f"{parts.scheme}://{parts.netloc}"
+        fields = dict(parse_qsl(parts.query))
+        fields.update(params or {})
+        fields.update(headers or {})
+        api_key = next((str(fields[field]) for field in API_KEY_FIELDS if fields.get(field)), "")
+        # Hashed, so no API key ends up in a file name
+        return hashlib.sha1(f"{base} {api_key}".encode()).hexdigest()[:16], base, limit
+
+    def _fd(self, bucket):
+        # flock belongs to the open file, which a forked worker shares with its parent: reopen after a fork
+        with self._lock:
+            if self._fds_pid != os.getpid():
+                self._fds, self._fds_pid = {}, os.getpid()
+                os.makedirs(self.state_path, exist_ok=True)
+            if bucket not in self._fds:
+                self._fds[bucket] = os.open(os.path.join(self.state_path, bucket), os.O_RDWR | os.O_CREAT, 0o600)
+            return self._fds[bucket]
+
+    @contextmanager
+    def _state(self, bucket, limit):
+        """The bucket's state, refilled to now and locked against every other process, written back on exit."""
+        fd = self._fd(bucket)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            raw = os.pread(fd, _STATE.size, 0)
+            now = time.time()
+            state = list(_STATE.unpack(raw)) if len(raw) == _STATE.size else [limit.capacity or 0.0, now, 0.0, 0.0, 0.0, 0.0]
+            if limit.capacity is not None:
+                state[TOKENS] = min(limit.capacity, state[TOKENS] + (now - state[UPDATED]) * limit.capacity / limit.period)
+                if limit.used_weight_header and now >= state[WINDOW_END]:
+                    state[WINDOW_END], state[WINDOW_USED] = (now // limit.period + 1) * limit.period, 0.0
+            state[UPDATED] = now
+            yield state, now
+            os.pwrite(fd, _STATE.pack(*state), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _take(self, url, weight, priority, params, headers):
+        """Seconds to wait before the request may go, or 0 once its weight is taken."""
+        bucket, _, limit = self._bucket(url, params, headers)
+        with self._state(bucket, limit) as (state, now):
+            if now < state[BLOCKED]:
+                wait = state[BLOCKED] - now
+            elif priority == BACKFILL and now < state[LIVE_WAITING]:
+                wait = state[LIVE_WAITING] - now
+            elif limit.capacity is None:
+                return 0
+            else:
+                floor = self.live_reserve * limit.capacity if priority == BACKFILL else 0
+                need = min(weight + floor, limit.capacity)
+                window_left = limit.capacity - state[WINDOW_USED] if limit.used_weight_header else limit.capacity
+                if min(state[TOKENS], window_left) >= need:
+                    state[TOKENS] -= weight
+                    state[WINDOW_USED] += weight
+                    return 0
+                wait = max(0.0, (need - state[TOKENS]) * limit.period / limit.capacity)
+                if window_left < need:
+                    wait = max(wait, state[WINDOW_END] - now)
+            if priority == LIVE:
+                state[LIVE_WAITING] = max(state[LIVE_WAITING], now + min(wait, MAX_SLEEP) + MAX_SLEEP)
+            return wait
+
+    def _waits(self, url, weight, priority, params, headers, max_wait):
+        """Sleeps until the request is admitted; raises RateLimited rather than exceed max_wait."""
+        start = time.monotonic()
+        while True:
+            wait = self._take(url, weight, priority, params, headers)
+            if not wait:
+                OUTBOUND_WAIT_SECONDS.labels(priority).observe(time.monotonic() - start)
+                return
+            if max_wait is not None and time.monotonic() - start + wait > max_wait:
+                raise RateLimited(f"{self._bucket(url, params, headers)[1]} budget needs another {wait:.1f}s, over the {max_wait}s allowed")
+            # Short sleeps: other processes' responses and releases change the answer
+            yield min(wait, MAX_SLEEP)
+
+    def acquire(self, url, weight=1, priority=BACKFILL, params=None, headers=None, max_wait=None):
+        for delay in self._waits(url, weight, priority, params, headers, max_wait):
+            time.sleep(delay)
+
+    async def acquire_async(self, url, weight=1, priority=BACKFILL, params=None, headers=None, max_wait=None):
+        for delay in self._waits(url, weight, priority, params, headers, max_wait):
+            await asyncio.sleep(delay)
+
+    def observe(self, url, status, response_headers, priority=BACKFILL, params=None, headers=None):
+        """Account a response: the upstream's own count of used weight, and any Retry-After."""
+        bucket, base, limit = self._bucket(url, params, headers)
+        OUTBOUND_REQUESTS.labels(base, priority, str(status)).inc()
+        used = response_headers.get(limit.used_weight_header) if limit.used_weight_header else None
+        if used is None and status not in THROTTLED:
+            return
+        with self._state(bucket, limit) as (state, now):
+            if used is not None and limit.capacity is not None:
+                state[WINDOW_USED] = max(state[WINDOW_USED], float(used))
+            if status in THROTTLED:
+                state[BLOCKED] = max(state[BLOCKED], now + _retry_after(response_headers.get("Retry-After")))
+                print(f"{base} answered {status}, holding its requests for {state[BLOCKED] - now:.0f}s")
+
+    def get(self, session, url, priority=BACKFILL, weight=1, params=None, headers=None, max_wait=None, **kwargs):
+        """GET with a requests session once admitted; a throttled response is retried after its Retry-After."""
+        for _ in range(THROTTLE_RETRIES + 1):
+            self.acquire(url, weight, priority, params, headers, max_wait)
+            response = session.get(url, params=params, headers=headers, **kwargs)
+            self.observe(url, response.status_code, response.headers, priority, params, headers)
+            if response.status_code not in THROTTLED:
+                break
+        return response
+
+    async def get_async(self, session, url, priority=BACKFILL, weight=1, params=None, headers=None, max_wait=None):
+        """GET with an aiohttp session once admitted, for `async with`; a throttled response raises RateLimited."""
+        await self.acquire_async(url, weight, priority, params, headers, max_wait)
+        response = await session.get(url, params=params, headers=headers)
+        self.observe(url, response.status, response.headers, priority, params, headers)
+        if response.status in THROTTLED:
+            response.release()
+            raise RateLimited(f"{self._bucket(url, params, headers)[1]} answered {response.status}")
+        return response
+
+def conditional_headers(validators):
+    """If-None-Match / If-Modified-Since headers revalidating a response saved with response_validators."""
+    headers = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+def response_validators(response_headers):
+    """ETag and Last-Modified of a response, or None when it has neither."""
+    validators = {"etag": response_headers.get("ETag"), "last_modified": response_headers.get("Last-Modified")}
+    return validators if any(validators.values()) else None
+
+scheduler = OutboundScheduler()
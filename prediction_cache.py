@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+class SingleFlightCache:
+    """Small LRU cache where concurrent misses on one key share a single computation.
+
+    The first caller of a missing key runs compute(); callers arriving while it runs wait
+    for its result instead of starting their own. compute() returns (value, cacheable),
+    so a result can be shared with the waiters without being kept for later calls.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._values = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                self._values.move_to_end(key)
+                return self._values[key]
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                self.misses += 1
+                call = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return call.result()
+
+        try:
+            value, cacheable = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            call.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            if cacheable:
+                self._values[key] = value
+                while len(self._values) > self.max_entries:
+                    self._values.popitem(last=False)
+        call.set_result(value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": len(self._values)}
@@ -0,0 +1,261 @@
+import fcntl
+import json
+import multiprocessing
+import os
+import time
+from config import TOKENS, TIMEFRAME, TRAINING_DAYS, REGION, DATA_PROVIDER, data_base_path, CG_API_KEY, MODEL, TRAINING_MODE, PREDICTION_HORIZONS, MODEL_MAX_AGE_HOURS
+
+retrain_status_path = os.path.join(data_base_path, "retrain_status.json")
+retrain_lock_path = os.path.join(data_base_path, "retrain.lock")
+
+RUNNING_STATES = ["queued", "downloading", "formatting", "training"]
+FINISHED_STATES = ["succeeded", "failed"]
+
+def train_models():
+    from model import train_model
+    from tokens import TOKEN_REGISTRY
+    return {token: train_model(TIMEFRAME, token=token) for token in TOKEN_REGISTRY}
+
+def update_data(progress=None):
+    """Download, format and train every token's model; progress(stage, **fields) is called as the update advances.
+
+    Each pair is downloaded and formatted once, however many tokens use it as a feature.
+    Returns {token: model metadata}.
+    """
+    from model import download_data, format_data, COINGECKO_TRAINING_ERROR
+    from metrics import update_stages
+    from tokens import registry_pairs, pair_token
+    from training_store import training_store_path, training_store_exists
+
+    progress = progress or (lambda stage, **fields: None)
+    print("Starting data update process...")
+    # Log config values
+    print(f"Config: TOKENS={TOKENS}, TRAINING_DAYS={TRAINING_DAYS}, TIMEFRAME={TIMEFRAME}, MODEL={MODEL}, REGION={REGION}, DATA_PROVIDER={DATA_PROVIDER}, CG_API_KEY={CG_API_KEY}")
+
+    # Validate critical config values
+    if not TRAINING_DAYS or not TRAINING_DAYS.isdigit():
+        raise ValueError(f"TRAINING_DAYS must be a number, got: {TRAINING_DAYS}")
+    training_days = int(TRAINING_DAYS)  # Convert to integer
+    if training_days <= 0:
+        raise ValueError(f"TRAINING_DAYS must be positive, got: {training_days}")
+    if DATA_PROVIDER not in ["binance", "coingecko"]:
+        raise ValueError(f"DATA_PROVIDER must be 'binance' or 'coingecko', got: {DATA_PROVIDER}")
+    if DATA_PROVIDER == "coingecko":
+        # Before anything is downloaded: the candles couldn't be formatted
+        raise ValueError(COINGECKO_TRAINING_ERROR)
+
+    # The training store is replaced atomically by format_data, so the previous one stays
+    # usable until new data has been formatted successfully
+    try:
+        progress("downloading")
+        files_by_pair = {}
+        for pair in registry_pairs():
+            print(f"Downloading {pair_token(pair)} data with TRAINING_DAYS={training_days}, REGION={REGION}, DATA_PROVIDER={DATA_PROVIDER}")
+            with update_stages.stage("download"):
+                files_by_pair[pair] = download_data(pair_token(pair), training_days, REGION, DATA_PROVIDER)
+
+        if not all(files_by_pair.values()):
+            missing = [pair for pair, files in files_by_pair.items() if not files]
+            print(f"Warning: No new data files downloaded for {missing}")
+            if training_store_exists():
+                print(f"Using existing {training_store_path} for training")
+                progress("training")
+                return train_models()
+            else:
+                raise ValueError(f"No data files downloaded for {missing}, and no existing training store")
+
+        progress("formatting", files=sum(len(files) for files in files_by_pair.values()))
+        print("Formatting data...")
+        rows = format_data(files_by_pair, DATA_PROVIDER)
+
+        if not rows:
+            raise ValueError(f"format_data produced no rows, {training_store_path} was not updated")
+
+        progress("training", rows=rows)
+        print("Training models...")
+        return train_models()
+    except Exception as e:
+        print(f"Error in update_data: {str(e)}")
+        raise
+
+def read_status(path=retrain_status_path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _write_status(status, path=retrain_status_path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)
+
+class _StatusLock:
+    """Exclusive flock that serialises status updates across processes and gunicorn workers."""
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(retrain_lock_path), exist_ok=True)
+        self._file = open(retrain_lock_path, "w")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+def update_status(job_id, **fields):
+    """Merge fields into the status of job_id, unless a newer job has taken over the file."""
+    with _StatusLock():
+        status = read_status() or {}
+        if status.get("job_id") not in (None, job_id):
+            return
+        status.update(fields, job_id=job_id, updated_at=time.time())
+        _write_status(status)
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def process_identity(pid):
+    """Boot id and start time of a running process, which a later process reusing its pid won't share; None without /proc."""
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            boot_id = f.read().strip()
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Field 22 (start time in clock ticks since boot); the command name before it may hold spaces
+    return f"{boot_id}:{stat.rsplit(')', 1)[1].split()[19]}"
+
+def _job_alive(status):
+    """Whether the process of a job's status still runs. The status file outlives containers, whose
+    pids start over, so a pid alone could name an unrelated process such as a gunicorn worker."""
+    pid = status["pid"]
+    if not _pid_alive(pid):
+        return False
+    return status["pid_identity"] is None or process_identity(pid) == status["pid_identity"]
+
+def run_retrain_job(job_id):
+    # The job reports its stage timings through its status; it must not add its own metrics
+    # files to those of the server's workers
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    started_at = time.time()
+    update_status(job_id, state="downloading", pid=os.getpid(), pid_identity=process_identity(os.getpid()), started_at=started_at)
+
+    def progress(stage, **fields):
+        update_status(job_id, state=stage, **fields)
+
+    from metrics import update_stages
+    try:
+        result = update_data(progress)
+    except Exception as e:
+        update_status(job_id, state="failed", error=str(e), stages=update_stages.durations, finished_at=time.time(), duration=time.time() - started_at)
+        raise
+    # The job's own histograms die with its process; the server records these stage timings
+    update_status(
+        job_id,
+        state="succeeded",
+        stages=update_stages.durations,
+        models={token: {"version": r["version"], "rows": r["rows"], "metrics": r["metrics"]} for token, r in result.items()},
+        finished_at=time.time(),
+        duration=time.time() - started_at,
+    )
+
+def trigger_retrain():
+    """Start a retrain in a separate process, or return the job that is already running.
+
+    Returns (status, started).
+    """
+    multiprocessing.active_children()  # reap finished jobs
+    with _StatusLock():
+        status = read_status()
+        if status and status.get("state") in RUNNING_STATES and _job_alive(status):
+            return status, False
+
+        job_id = f"{int(time.time() * 1000)}"
+        # spawn, not fork: the server process runs the live feed and request threads
+        process = multiprocessing.get_context("spawn").Process(target=run_retrain_job, args=(job_id,), name=f"retrain-{job_id}", daemon=False)
+        process.start()
+        status = {"job_id": job_id, "state": "queued", "pid": process.pid, "pid_identity": process_identity(process.pid), "queued_at": time.time(), "updated_at": time.time()}
+        _write_status(status)
+        return status, True
+
+def stale_models():
+    """Why each token's persisted model can't simply be served as it is, as {token: reason}.
+
+    A model is stale when it or the training store is missing, when it was trained with
+    other features, horizons, model or training mode than configured, or when it is older
+    than MODEL_MAX_AGE_HOURS. Tokens whose model is fine are left out.
+    """
+    from artifacts import artifact_caches
+    from tokens import TOKEN_REGISTRY
+    from training_store import training_store_exists, open_training_store
+
+    reasons = {}
+    store_columns = set(open_training_store().columns) if training_store_exists() else set()
+    for token, spec in TOKEN_REGISTRY.items():
+        try:
+            metadata = artifact_caches[token].get().metadata
+        except Exception as e:
+            reasons[token] = f"no usable model: {str(e)}"
+            continue
+        if metadata["features"] != spec.features:
+            reasons[token] = "trained on a different feature schema"
+        elif metadata["horizons"] != PREDICTION_HORIZONS:
+            reasons[token] = f"trained for horizons {metadata['horizons']}, configured {PREDICTION_HORIZONS}"
+        elif metadata["model"] != (MODEL or "LinearRegression") or metadata["training_mode"] != TRAINING_MODE:
+            reasons[token] = f"trained as {metadata['model']} ({metadata['training_mode']}), configured {MODEL} ({TRAINING_MODE})"
+        elif time.time() - metadata["created_at"] > MODEL_MAX_AGE_HOURS * 3600:
+            reasons[token] = f"older than {MODEL_MAX_AGE_HOURS:g}h"
+        elif not set(spec.features + spec.targets) <= store_columns:
+            reasons[token] = "training store is missing or lacks its columns"
+    return reasons
+
+def warm_start():
+    """Serve the persisted models right away and refresh them in the background if any is stale.
+
+    Loads every token's last published model (so the first request doesn't pay for it) and
+    starts a retrain job when stale_models() finds a reason to. Returns those reasons.
+    """
+    reasons = stale_models()
+    for token, reason in reasons.items():
+        print(f"{token} model needs a refresh: {reason}")
+    if reasons:
+        status, started = trigger_retrain()
+        print(f"Background refresh job {status['job_id']} {'started' if started else 'already running'}")
+    else:
+        print("Persisted models match the configuration, serving them")
+    return reasons
+
+def retrain_status():
+    multiprocessing.active_children()
+    status = read_status()
+    if status and status.get("state") in RUNNING_STATES and not _job_alive(status):
+        # The job process is gone without reporting a result
+        update_status(status["job_id"], state="failed", error="retrain process exited unexpectedly")
+        status = read_status()
+    return status
+
+def claim_finished_status():
+    """The status of the last job if it has finished and isn't in the metrics yet, else None.
+
+    The status is marked as recorded under the status lock, so however many workers serve
+    /metrics, exactly one of them counts each finished job.
+    """
+    retrain_status()
+    with _StatusLock():
+        status = read_status()
+        if not status or status.get("state") not in FINISHED_STATES or status.get("metrics_recorded"):
+            return None
+        status["metrics_recorded"] = True
+        _write_status(status)
+    return status
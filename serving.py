@@ -0,0 +1,160 @@
+"""Production serving under gunicorn: one sidecar process shared by every worker.
+
+The gunicorn master (see gunicorn_conf.py) preloads the app, starts the sidecar and forks
+the workers. The sidecar:
+
+- runs the only LiveKlineFeed, writing into a SharedKlineRing that every worker maps;
+- coordinates model reloads: when a retrain publishes a new version, it loads and warms it
+  once, then moves the serving pointer each worker's ArtifactCache follows, so the workers
+  switch together and never to a version that fails to load;
+- touches a heartbeat, without which workers fall back to CURRENT and fetch klines over REST.
+"""
+import glob
+import multiprocessing
+import os
+import threading
+import time
+import numpy as np
+from artifacts import SIDECAR_HEARTBEAT, SIDECAR_TIMEOUT, current_version, load_bundle, serving_pointer_path, sidecar_alive, token_artifacts_path, write_pointer
+from live_feed import LiveKlineFeed
+from shared_klines import SharedKlineFeed, SharedKlineRing
+from tokens import TOKEN_REGISTRY, registry_pairs
+from config import LIVE_FEED, SHARED_STATE_PATH
+
+POLL_INTERVAL = 1.0
+# How long the master waits for the sidecar's first pass, which loads every token's model
+SIDECAR_START_TIMEOUT = 60
+kline_ring_path = os.path.join(SHARED_STATE_PATH, "klines.ring")
+_sidecar = None
+_stopping = threading.Event()
+_shared_feed = None
+
+def shared_kline_feed():
+    """This worker's reader of the sidecar's kline ring."""
+    global _shared_feed
+    if _shared_feed is None:
+        _shared_feed = SharedKlineFeed(kline_ring_path, registry_pairs())
+    return _shared_feed
+
+class ModelCoordinator:
+    """Moves each token's serving pointer to its CURRENT version once that version has loaded here."""
+
+    def __init__(self, tokens):
+        self.tokens = list(tokens)
+        self.serving = {}
+        self.failed = {}
+        for token in self.tokens:
+            try:
+                with open(serving_pointer_path(token)) as f:
+                    self.serving[token] = f.read().strip()
+            except FileNotFoundError:
+                pass
+
+    def poll(self):
+        for token in self.tokens:
+            try:
+                version = current_version(token_artifacts_path(token))
+            except FileNotFoundError:
+                continue
+            if version in (self.serving.get(token), self.failed.get(token)):
+                continue
+            try:
+                bundle = load_bundle(token_artifacts_path(token), version)
+                # Read every page once so the workers' first requests on it don't fault them in from disk
+                for array in bundle.arrays.values():
+                    np.asarray(array).sum()
+            except Exception as e:
+                print(f"Not publishing {token} model version {version} to the workers: {str(e)}")
+                self.failed[token] = version
+                continue
+            write_pointer(serving_pointer_path(token), version)
+            self.serving[token] = version
+            print(f"Workers now serve {token} model version {version}")
+
+def _heartbeat():
+    path = os.path.join(SHARED_STATE_PATH, SIDECAR_HEARTBEAT)
+    with open(path, "a"):
+        os.utime(path)
+
+def run_sidecar(parent_pid):
+    os.makedirs(SHARED_STATE_PATH, exist_ok=True)
+    ring, feed = None, None
+    if LIVE_FEED:
+        ring = SharedKlineRing.create(kline_ring_path, registry_pairs())
+        feed = LiveKlineFeed(ring.pairs, windows=ring.windows()).start()
+    coordinator = ModelCoordinator(TOKEN_REGISTRY)
+    # Exit with the gunicorn master, however it went away
+    while os.getppid() == parent_pid:
+        try:
+            coordinator.poll()
+            if feed is not None:
+                ring.set_ready(feed.wait_ready(0))
+            _heartbeat()
+        except Exception as e:
+            print(f"Serving sidecar error: {str(e)}")
+        time.sleep(POLL_INTERVAL)
+    if feed is not None:
+        feed.stop()
+
+def reset_shared_state():
+    """Drop what a previous server left behind: worker metrics and the sidecar heartbeat."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        for file in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+            os.remove(file)
+    try:
+        os.remove(os.path.join(SHARED_STATE_PATH, SIDECAR_HEARTBEAT))
+    except FileNotFoundError:
+        pass
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+def _watch_sidecar():
+    # The master reaps every child itself, so the sidecar's exit is seen by its pid disappearing
+    while not _stopping.wait(SIDECAR_TIMEOUT):
+        if not _pid_alive(_sidecar.pid):
+            print(f"Serving sidecar (pid {_sidecar.pid}) exited, restarting it")
+            _spawn_sidecar()
+
+def _spawn_sidecar():
+    global _sidecar
+    # spawn, not fork: the sidecar runs its own event loop and threads
+    _sidecar = multiprocessing.get_context("spawn").Process(target=run_sidecar, args=(os.getpid(),), name="serving-sidecar", daemon=True)
+    _sidecar.start()
+
+def start_sidecar():
+    """Start the sidecar from the gunicorn master, and a watchdog that restarts it should it die."""
+    _spawn_sidecar()
+    threading.Thread(target=_watch_sidecar, name="serving-sidecar-watchdog", daemon=True).start()
+    return _sidecar
+
+def wait_for_sidecar(timeout=SIDECAR_START_TIMEOUT):
+    """Wait for the sidecar's first heartbeat, by which it has moved the serving pointers; False on timeout.
+
+    The master preloads the models after this, through the same serving pointers the
+    workers follow, so the bundles the workers inherit are the ones they would load.
+    """
+    deadline = time.monotonic() + timeout
+    while not sidecar_alive():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+def stop_sidecar():
+    _stopping.set()
+    if _sidecar is not None and _pid_alive(_sidecar.pid):
+        _sidecar.terminate()
+
+def worker_forked():
+    # A worker inherits the master's registry of multiprocessing children (the sidecar, a
+    # warm-start retrain job) and would try to join them on exit; they are not its children
+    multiprocessing.process._children.clear()
+
+def worker_exited(pid):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(pid)
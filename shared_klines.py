@@ -0,0 +1,197 @@
+import fcntl
+import mmap
+import os
+import zlib
+from contextlib import contextmanager
+import numpy as np
+from kline_decode import KLINE_FIELDS, KLINE_INTERVAL_MS
+from live_feed import WINDOW_SIZE, last_closed_open_time
+
+LAYOUT_VERSION = 2
+# int64 header fields
+MAGIC, READY = 0, 1
+HEADER_FIELDS = 4
+
+def _layout_id(pairs, size):
+    return zlib.crc32(f"{LAYOUT_VERSION}:{size}:{','.join(pairs)}".encode())
+
+class SharedKlineRing:
+    """Rolling windows of the latest closed 1m klines of several pairs, in one memory-mapped file.
+
+    One process (the serving sidecar's feed) writes; every gunicorn worker maps the file and
+    reads it without copying it into its own heap. Each pair's window is a ring indexed by
+    monotonically increasing (start, end) bar counters.
+
+    Writer and readers serialise on a flock of the ring's file: each update holds it
+    exclusively and each copy shared. Taking and releasing it are system calls, which order
+    the stores into shared memory on every architecture, where plain stores bracketed by a
+    sequence counter would only be seen in order on x86-64.
+    """
+
+    def __init__(self, mm, fd, pairs, size):
+        self.pairs = list(pairs)
+        self.size = size
+        self._mm = mm
+        self._fd = fd
+        n = len(self.pairs)
+        offset = 0
+        self._header = np.ndarray(HEADER_FIELDS, np.int64, mm, offset)
+        offset += self._header.nbytes
+        self._bounds = np.ndarray((n, 2), np.int64, mm, offset)
+        offset += self._bounds.nbytes
+        self._open_time = np.ndarray((n, size), np.int64, mm, offset)
+        offset += self._open_time.nbytes
+        self._values = np.ndarray((n, size, len(KLINE_FIELDS)), np.float64, mm, offset)
+
+    @staticmethod
+    def nbytes(n_pairs, size):
+        return 8 * (HEADER_FIELDS + 2 * n_pairs + n_pairs * size * (1 + len(KLINE_FIELDS)))
+
+    @classmethod
+    def create(cls, path, pairs, size=WINDOW_SIZE):
+        """Writer side: a new, empty ring, swapped in for any previous file at path."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(fd, cls.nbytes(len(pairs), size))
+        ring = cls(mmap.mmap(fd, 0), fd, pairs, size)
+        ring._header[MAGIC] = _layout_id(ring.pairs, size)
+        os.replace(tmp_path, path)
+        return ring
+
+    @classmethod
+    def open(cls, path, pairs, size=WINDOW_SIZE):
+        """Reader side: the ring at path, or None while there is none of this layout."""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        if os.fstat(fd).st_size != cls.nbytes(len(pairs), size):
+            os.close(fd)
+            return None
+        ring = cls(mmap.mmap(fd, 0, access=mmap.ACCESS_READ), fd, pairs, size)
+        if ring._header[MAGIC] != _layout_id(ring.pairs, size):
+            ring.close()
+            return None
+        return ring
+
+    def close(self):
+        """Release the file; the mapping goes with the last view of it."""
+        os.close(self._fd)
+
+    @contextmanager
+    def _locked(self, operation):
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def writing(self):
+        return self._locked(fcntl.LOCK_EX)
+
+    def set_ready(self, ready=True):
+        with self.writing():
+            self._header[READY] = int(ready)
+
+    def windows(self):
+        """{pair: window} views for LiveKlineFeed to write through."""
+        return {pair: SharedKlineWindow(self, i) for i, pair in enumerate(self.pairs)}
+
+    def read(self):
+        """Consistent copy of (ready, bounds, open times, values)."""
+        with self._locked(fcntl.LOCK_SH):
+            return bool(self._header[READY]), self._bounds.copy(), self._open_time.copy(), self._values.copy()
+
+def _window(bounds, open_time, values, i, size, until_open_time=None):
+    start, end = bounds[i]
+    slots = np.arange(max(start, end - size), end) % size
+    open_times, bars = open_time[i, slots], values[i, slots]
+    if until_open_time is not None:
+        keep = int(np.searchsorted(open_times, until_open_time, side="right"))
+        open_times, bars = open_times[:keep], bars[:keep]
+    return open_times, bars
+
+class SharedKlineWindow:
+    """One pair of a SharedKlineRing behind the KlineWindow interface, for the writing process."""
+
+    def __init__(self, ring, index):
+        self.ring = ring
+        self.index = index
+        self.size = ring.size
+
+    def __len__(self):
+        start, end = self.ring._bounds[self.index]
+        return int(end - max(start, end - self.size))
+
+    @property
+    def last_open_time(self):
+        return int(self.ring._open_time[self.index, (self.ring._bounds[self.index, 1] - 1) % self.size]) if len(self) else None
+
+    def append(self, open_time, values):
+        last = self.last_open_time
+        if last is not None and open_time < last:
+            return False
+        bounds = self.ring._bounds[self.index]
+        with self.ring.writing():
+            if last is not None and open_time == last:
+                self.ring._values[self.index, (bounds[1] - 1) % self.size] = values
+                return True
+            slot = bounds[1] % self.size
+            self.ring._open_time[self.index, slot] = open_time
+            self.ring._values[self.index, slot] = values
+            bounds[1] += 1
+        return True
+
+    def clear(self):
+        bounds = self.ring._bounds[self.index]
+        with self.ring.writing():
+            bounds[0] = bounds[1]
+
+    def arrays(self, until_open_time=None):
+        return _window(self.ring._bounds, self.ring._open_time, self.ring._values, self.index, self.size, until_open_time)
+
+class SharedKlineFeed:
+    """Read side of the ring the serving sidecar's feed writes, with the LiveKlineFeed methods inference uses.
+
+    The ring is (re)mapped whenever its file is replaced, such as by a restarted sidecar, and
+    reopened in a forked process, since a flock belongs to the open file its parent shares.
+    """
+
+    def __init__(self, path, pairs, size=WINDOW_SIZE):
+        self.path = path
+        self.pairs = list(pairs)
+        self.size = size
+        self._ring = None
+        self._opened = None
+
+    def _read(self):
+        try:
+            opened = os.stat(self.path).st_ino, os.getpid()
+        except FileNotFoundError:
+            return None
+        if opened != self._opened:
+            if self._ring is not None:
+                self._ring.close()
+            self._ring, self._opened = SharedKlineRing.open(self.path, self.pairs, self.size), opened
+        return self._ring.read() if self._ring is not None else None
+
+    def is_fresh(self, now_ms=None, max_lag_bars=1):
+        """True once the sidecar's feed holds the latest closed kline of every pair (within max_lag_bars)."""
+        copy = self._read()
+        if copy is None or not copy[0]:
+            return False
+        expected = last_closed_open_time(now_ms) - max_lag_bars * KLINE_INTERVAL_MS
+        lasts = [_window(*copy[1:], i, self.size)[0] for i in range(len(self.pairs))]
+        return all(len(open_times) and open_times[-1] >= expected for open_times in lasts)
+
+    def snapshot(self):
+        """Consistent copy of every window, cut at the last kline all pairs have closed; None when unavailable."""
+        copy = self._read()
+        if copy is None:
+            return None
+        windows = [_window(*copy[1:], i, self.size) for i in range(len(self.pairs))]
+        if any(not len(open_times) for open_times, _ in windows):
+            return None
+        until = min(int(open_times[-1]) for open_times, _ in windows)
+        return {pair: _window(*copy[1:], i, self.size, until) for i, pair in enumerate(self.pairs)}
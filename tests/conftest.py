@@ -0,0 +1,113 @@
+"""Tests run against a throwaway data directory and synthetic klines from bench.fake_exchange.
+
+config is read once, at import, so the environment is set here before any node module loads.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import pytest
+
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_path)
+
+app_base_path = tempfile.mkdtemp(prefix="node-tests-")
+os.environ.update(
+    APP_BASE_PATH=app_base_path,
+    SHARED_STATE_PATH=os.path.join(app_base_path, "state"),
+    TOKEN="ETH",
+    TOKENS="ETH",
+    REGION="com",
+    DATA_PROVIDER="binance",
+    TRAINING_DAYS="2",
+    TIMEFRAME="1m",
+    PREDICTION_HORIZONS="6h",
+    LIVE_FEED="false",
+    SHARED_SERVING="false",
+    INGEST_WORKERS="1",
+)
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+DAYS = ["2026-03-01", "2026-03-02"]
+
+def write_daily_zips(pairs, days=DAYS):
+    """Synthetic daily kline zips of the given pairs, where format_data looks for them; {pair: files}."""
+    from bench.fake_exchange import daily_zip
+    from model import binance_data_path
+    os.makedirs(binance_data_path, exist_ok=True)
+    files = {}
+    for pair in pairs:
+        files[pair] = []
+        for day in days:
+            path = os.path.join(binance_data_path, f"{pair}-1m-{day}.zip")
+            with open(path, "wb") as f:
+                f.write(daily_zip(pair, day))
+            files[pair].append(path)
+    return files
+
+@pytest.fixture
+def daily_zips():
+    return write_daily_zips
+
+@pytest.fixture(scope="session")
+def training_files():
+    from tokens import registry_pairs
+    return write_daily_zips(registry_pairs())
+
+class FakeExchange:
+    """bench.fake_exchange served from a thread of the test process, so tests can stop and
+    restart it on the same port and read its request counts."""
+
+    def __init__(self, **options):
+        from bench.run import _free_port
+        self.options = options
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.ws_url = f"ws://127.0.0.1:{self.port}"
+        self.runner = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self.start()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(10)
+
+    def start(self):
+        from aiohttp import web
+        from bench.fake_exchange import make_app
+        self.app = make_app(**self.options)
+
+        async def serve():
+            runner = web.AppRunner(self.app)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", self.port).start()
+            return runner
+        self.runner = self._run(serve())
+
+    def stop(self):
+        if self.runner is not None:
+            self._run(self.runner.cleanup())
+            self.runner = None
+
+    def close(self):
+        self.stop()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+    @property
+    def requests(self):
+        return self.app["requests"]
+
+@pytest.fixture
+def fake_exchange():
+    """Starts FakeExchanges with bench.fake_exchange.make_app options; closed after the test."""
+    exchanges = []
+
+    def start(**options):
+        exchanges.append(FakeExchange(**options))
+        return exchanges[-1]
+    yield start
+    for exchange in exchanges:
+        exchange.close()
@@ -0,0 +1,13 @@
+"""Model bundles: what an ArtifactCache reports follows the published version."""
+import numpy as np
+from artifacts import ArtifactCache, publish_artifacts
+
+def test_status_reports_a_newly_published_version(tmp_path):
+    path = str(tmp_path)
+    cache = ArtifactCache(path)
+    assert cache.status()["version"] is None
+    first = publish_artifacts({"weights": np.zeros(3)}, {"model": "LinearRegression"}, path=path)
+    assert cache.get().version == first
+    # No request has asked for the model since the retrain published a new one
+    second = publish_artifacts({"weights": np.ones(3)}, {"model": "LinearRegression"}, path=path)
+    assert cache.status()["version"] == second
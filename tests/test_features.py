@@ -0,0 +1,69 @@
+"""Parity of the serving FeatureEngine with the features training uses."""
+import numpy as np
+import pandas as pd
+import pytest
+from features import HISTORY, add_features
+from kline_cache import load_klines
+from kline_decode import KLINE_INTERVAL_MS
+from tokens import TOKEN_REGISTRY
+
+SPEC = TOKEN_REGISTRY["ETH"]
+
+@pytest.fixture(scope="module")
+def price_dfs(training_files):
+    return load_klines(training_files)
+
+def _replay(price_dfs):
+    """(close times, feature vectors) of every bar, fed one at a time to live_feature_vector."""
+    from inference import _feature_engines, live_feature_vector
+    _feature_engines["ETH"].reset()
+    # Training rows are indexed by close time; live klines are keyed by open time
+    close_times = price_dfs[SPEC.pair].index.values.astype("datetime64[ms]").astype(np.int64)
+    open_times = close_times - (KLINE_INTERVAL_MS - 1)
+    values = {pair: price_dfs[pair].to_numpy(dtype=np.float64) for pair in SPEC.pairs}
+    vectors = [None] * (HISTORY - 1)  # the engine needs HISTORY bars
+    for i in range(HISTORY - 1, len(open_times)):
+        # The whole history on the first call, as after a restart, then short overlapping windows
+        start = 0 if i == HISTORY - 1 else max(0, i - 30)
+        klines = {pair: (open_times[start:i + 1], values[pair][start:i + 1]) for pair in SPEC.pairs}
+        vector, bar_open_time = live_feature_vector(klines, "ETH")
+        assert bar_open_time == open_times[i]
+        vectors.append(vector)
+    return close_times, vectors
+
+@pytest.fixture(scope="module")
+def replayed(price_dfs):
+    return _replay(price_dfs)
+
+def test_engine_matches_training_store(training_files, replayed):
+    from model import format_data
+    from training_store import open_training_store, store_columns
+    assert format_data(training_files, "binance")
+    store = open_training_store()
+    X = store_columns(store, SPEC.features)
+    close_times, vectors = replayed
+    rows = {int(t): i for i, t in enumerate(close_times)}
+    store_times = store.index // 1_000_000
+    assert len(store_times) > 0
+    for j, t in enumerate(store_times):
+        np.testing.assert_allclose(vectors[rows[int(t)]], X[j], rtol=1e-12, atol=1e-9, err_msg=f"row at {pd.Timestamp(int(t), unit='ms')}")
+
+def test_engine_matches_add_features(price_dfs, replayed):
+    frame = pd.concat([df.rename(columns=lambda x, pair=pair: f"{x}_{pair}") for pair, df in price_dfs.items()], axis=1)
+    expected = add_features(frame, SPEC.pairs, [SPEC.pair])[SPEC.features].to_numpy()
+    _, vectors = replayed
+    checked = 0
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            continue
+        np.testing.assert_allclose(vector, expected[i], rtol=1e-12, atol=1e-9, err_msg=f"bar {i}")
+        checked += 1
+    assert checked == len(vectors) - (HISTORY - 1)
+
+def test_hour_of_day_follows_close_time(replayed):
+    # The bar opening at 00:59 closes at 00:59:59.999: still hour 0, as in training
+    close_times, vectors = replayed
+    hour = SPEC.features.index("hour_of_day")
+    for t, vector in zip(close_times, vectors):
+        if vector is not None and (t // KLINE_INTERVAL_MS) % 60 == 59:
+            assert vector[hour] == (t // 3_600_000) % 24
@@ -0,0 +1,47 @@
+"""Parsed daily klines are reused while their zip is unchanged and dropped once out of the window."""
+import os
+from bench.fake_exchange import daily_zip
+from kline_cache import cache_file_path, load_daily_klines, load_klines
+
+def _write_zip(directory, pair, day, content_pair=None):
+    path = os.path.join(directory, f"{pair}-1m-{day}.zip")
+    with open(path, "wb") as f:
+        f.write(daily_zip(content_pair or pair, day))
+    return path
+
+def test_unchanged_zip_comes_from_cache(tmp_path):
+    path = _write_zip(tmp_path, "ETHUSDT", "2026-01-10")
+    parsed, from_cache = load_daily_klines(path)
+    assert not from_cache
+    cached, from_cache = load_daily_klines(path)
+    assert from_cache
+    assert cached.equals(parsed)
+
+def test_touched_zip_is_parsed_again(tmp_path):
+    path = _write_zip(tmp_path, "ETHUSDT", "2026-01-11")
+    load_daily_klines(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert not load_daily_klines(path)[1]
+
+def test_resized_zip_is_parsed_again(tmp_path):
+    path = _write_zip(tmp_path, "ETHUSDT", "2026-01-12")
+    parsed, _ = load_daily_klines(path)
+    stat = os.stat(path)
+    # Other klines under the same name and mtime: only the size tells them apart
+    _write_zip(tmp_path, "ETHUSDT", "2026-01-12", content_pair="BTCUSDT")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(path).st_size != stat.st_size
+    reparsed, from_cache = load_daily_klines(path)
+    assert not from_cache
+    assert not reparsed.equals(parsed)
+
+def test_days_out_of_the_window_are_pruned(tmp_path):
+    days = ["2026-01-20", "2026-01-21", "2026-01-22"]
+    files = [_write_zip(tmp_path, "ETHUSDT", day) for day in days]
+    load_klines({"ETHUSDT": files}, workers=1)
+    # The window moves on by a day
+    files.append(_write_zip(tmp_path, "ETHUSDT", "2026-01-23"))
+    load_klines({"ETHUSDT": files[1:]}, workers=1)
+    assert not os.path.exists(cache_file_path("ETHUSDT", "2026-01-20"))
+    assert all(os.path.exists(cache_file_path("ETHUSDT", day)) for day in ["2026-01-21", "2026-01-22", "2026-01-23"])
@@ -0,0 +1,19 @@
+"""The exact KNN index is published as arrays and served straight from their memory maps."""
+import numpy as np
+from artifacts import load_bundle, publish_artifacts
+from knn import TREE_ARRAYS, KNNRegressor
+
+def test_exact_index_is_served_from_mapped_arrays(tmp_path):
+    rng = np.random.default_rng(3)
+    X, y = rng.normal(size=(2000, 8)), rng.normal(size=(2000, 2))
+    model = KNNRegressor(n_neighbors=5).fit(X, y)
+    arrays, objects = model.artifacts()
+    publish_artifacts(arrays, {"knn": {"n_neighbors": 5, "index": "exact", "n_probe": 8}}, objects, path=str(tmp_path))
+    bundle = load_bundle(str(tmp_path))
+    served = KNNRegressor.from_artifacts(bundle.metadata, bundle.arrays, bundle.objects)
+    # No copy of the training matrix: the tree searches the mapped file itself
+    for name, array in zip(TREE_ARRAYS, served.tree_.get_arrays()):
+        assert np.shares_memory(np.asarray(array), bundle.arrays[name])
+    queries = rng.normal(size=(20, 8))
+    np.testing.assert_array_equal(served.predict(queries), model.predict(queries))
+    assert all(np.array_equal(np.sort(served.neighbors(q)), np.sort(model.neighbors(q))) for q in queries)
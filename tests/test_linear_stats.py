@@ -0,0 +1,27 @@
+"""Per-day sufficient statistics: closed-form fit errors, and pruning of unused schemas."""
+import os
+import numpy as np
+from linear_stats import _schema_key, combine_statistics, day_statistics, prune_statistics, solve_statistics, statistics_errors
+
+def test_statistics_errors_match_scored_rows():
+    rng = np.random.default_rng(7)
+    X = rng.normal(2500, 40, size=(600, 5))
+    y = X @ rng.normal(size=(5, 2)) + rng.normal(0, 3, size=(600, 2))
+    blocks = [day_statistics(X[i:i + 200], y[i:i + 200]) for i in range(0, 600, 200)]
+    weights, intercept, _, _ = solve_statistics(combine_statistics(blocks[:2]))
+    # Evaluated on the held-out block as well as the one the fit saw
+    for rows, stats in [(slice(0, 400), combine_statistics(blocks[:2])), (slice(400, None), blocks[2])]:
+        residuals = y[rows] - (X[rows] @ weights + intercept)
+        errors = statistics_errors(stats, weights, intercept)
+        np.testing.assert_allclose(errors["rmse"], np.sqrt(np.mean(residuals ** 2, axis=0)), rtol=1e-6)
+        np.testing.assert_allclose(errors["bias"], residuals.mean(axis=0), atol=1e-6)
+        sst = ((y[rows] - y[rows].mean(axis=0)) ** 2).sum(axis=0)
+        np.testing.assert_allclose(errors["r2"], 1 - (residuals ** 2).sum(axis=0) / sst, rtol=1e-6)
+
+def test_statistics_of_other_schemas_are_pruned(tmp_path):
+    kept, dropped = (["a", "b"], ["target_6h"]), (["a"], ["target_6h"])
+    for features, targets in [kept, dropped]:
+        (tmp_path / _schema_key(features, targets)).mkdir()
+        (tmp_path / _schema_key(features, targets) / "2026-01-01.npz").write_bytes(b"")
+    prune_statistics([kept], path=str(tmp_path))
+    assert os.listdir(tmp_path) == [_schema_key(*kept)]
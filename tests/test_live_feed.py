@@ -0,0 +1,81 @@
+"""LiveKlineFeed following bench.fake_exchange's kline stream."""
+import time
+import numpy as np
+import pytest
+from kline_decode import KLINE_INTERVAL_MS
+from live_feed import REST_LIMIT, KlineWindow, LiveKlineFeed, last_closed_open_time
+
+PAIRS = ["ETHUSDT", "BTCUSDT"]
+
+@pytest.fixture
+def feed_on(fake_exchange):
+    feeds = []
+
+    def start(exchange):
+        feeds.append(LiveKlineFeed(PAIRS, rest_url=exchange.url, ws_url=exchange.ws_url, reconnect_delay=0.1).start())
+        assert feeds[-1].wait_ready(10)
+        return feeds[-1]
+    yield start
+    for feed in feeds:
+        feed.stop()
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+def _complete(feed, bars):
+    """Every window holds at least bars consecutive klines up to the last closed one."""
+    snapshot = feed.snapshot()
+    if snapshot is None:
+        return False
+    last_closed = last_closed_open_time()
+    for open_time, _ in snapshot.values():
+        if len(open_time) < bars or open_time[-1] < last_closed - KLINE_INTERVAL_MS:
+            return False
+        if not np.all(np.diff(open_time) == KLINE_INTERVAL_MS):
+            return False
+    return True
+
+def _drop_last_bars(feed, pair, count):
+    with feed._lock:
+        open_time, values = feed.windows[pair].arrays()
+        window = KlineWindow(feed.windows[pair].size)
+        for t, row in zip(open_time[:-count].tolist(), values[:-count]):
+            window.append(t, row)
+        feed.windows[pair] = window
+
+def test_backfill_fills_every_window(fake_exchange, feed_on):
+    exchange = fake_exchange(tick=0.1)
+    feed = feed_on(exchange)
+    # One REST call per symbol; the exchange's latest bar is still open
+    assert _complete(feed, REST_LIMIT - 1)
+    assert feed.is_fresh()
+    assert exchange.requests["klines"] == len(PAIRS)
+    _wait_for(lambda: feed.last_message_at is not None)
+
+def test_gap_is_backfilled_over_rest(fake_exchange, feed_on, capsys):
+    exchange = fake_exchange(tick=0.1)
+    feed = feed_on(exchange)
+    calls = exchange.requests["klines"]
+    _drop_last_bars(feed, "ETHUSDT", 5)
+    assert not _complete(feed, REST_LIMIT - 1)
+    # The next streamed bar no longer follows the window's last one
+    _wait_for(lambda: _complete(feed, REST_LIMIT - 1))
+    assert exchange.requests["klines"] == calls + 1
+    assert "Gap in ETHUSDT klines" in capsys.readouterr().out
+
+def test_reconnect_backfills_what_was_missed(fake_exchange, feed_on):
+    exchange = fake_exchange(tick=0.1)
+    feed = feed_on(exchange)
+    exchange.stop()
+    time.sleep(0.5)
+    # Bars that closed while the stream was down
+    for pair in PAIRS:
+        _drop_last_bars(feed, pair, 3)
+    restarted_at = time.time()
+    exchange.start()
+    _wait_for(lambda: (feed.last_message_at or 0) > restarted_at)
+    assert _complete(feed, REST_LIMIT - 1)
+    assert exchange.requests["klines"] == len(PAIRS)
@@ -0,0 +1,72 @@
+"""HedgedKlineFetcher racing bench.fake_exchange instances, some of them down or slow."""
+import time
+import pytest
+from kline_decode import KLINE_INTERVAL_MS
+from live_fetch import HedgedKlineFetcher
+from live_feed import last_closed_open_time
+
+PAIRS = ["ETHUSDT", "BTCUSDT"]
+
+@pytest.fixture
+def fetcher_for():
+    fetchers = []
+
+    def start(*exchanges, deadline=2, hedge_delay=0.3, retry_after=30, max_staleness_minutes=15):
+        fetchers.append(HedgedKlineFetcher([exchange.url for exchange in exchanges], deadline, hedge_delay, retry_after, max_staleness_minutes))
+        return fetchers[-1]
+    yield start
+    for fetcher in fetchers:
+        fetcher.close()
+
+def _ends_on(live, last_closed):
+    return all(open_time[-1] == last_closed for open_time, _ in live.klines.values())
+
+def test_dead_primary_falls_over_to_the_secondary(fake_exchange, fetcher_for):
+    primary, secondary = fake_exchange(), fake_exchange()
+    primary.stop()
+    fetcher = fetcher_for(primary, secondary)
+    last_closed = last_closed_open_time()
+    start = time.monotonic()
+    live = fetcher.fetch(PAIRS, last_closed)
+    # A refused connection hedges at once, without waiting out hedge_delay
+    assert time.monotonic() - start < fetcher.hedge_delay
+    assert (live.source, live.stale) == (secondary.url, False)
+    assert sorted(live.klines) == sorted(PAIRS) and _ends_on(live, last_closed)
+
+def test_slow_primary_is_hedged(fake_exchange, fetcher_for):
+    primary, secondary = fake_exchange(delay=3), fake_exchange()
+    fetcher = fetcher_for(primary, secondary)
+    start = time.monotonic()
+    live = fetcher.fetch(PAIRS)
+    assert fetcher.hedge_delay <= time.monotonic() - start < fetcher.deadline
+    assert live.source == secondary.url
+
+def test_deadline_without_an_answer(fake_exchange, fetcher_for):
+    fetcher = fetcher_for(fake_exchange(delay=2), fake_exchange(delay=2), deadline=0.8)
+    start = time.monotonic()
+    # Nothing to degrade to either
+    with pytest.raises(ConnectionError, match="no endpoint answered"):
+        fetcher.fetch(PAIRS)
+    assert time.monotonic() - start < fetcher.deadline + 0.5
+
+def test_degraded_serves_the_last_snapshot(fake_exchange, fetcher_for):
+    exchange = fake_exchange()
+    fetcher = fetcher_for(exchange)
+    # A snapshot five bars old, well within max_staleness_minutes
+    good = fetcher.fetch(PAIRS, last_closed_open_time() - 5 * KLINE_INTERVAL_MS)
+    exchange.stop()
+    live = fetcher.fetch(PAIRS)
+    assert (live.source, live.stale) == ("snapshot", True)
+    assert live.klines == good.klines
+    # For retry_after the network is skipped, even once the exchange is back
+    exchange.start()
+    assert fetcher.fetch(PAIRS).stale
+    assert exchange.requests["klines"] == 0
+
+def test_snapshot_too_old_to_serve(fake_exchange, fetcher_for):
+    exchange = fake_exchange()
+    fetcher = fetcher_for(exchange, max_staleness_minutes=15)
+    fetcher.fetch(PAIRS, last_closed_open_time() - 20 * KLINE_INTERVAL_MS)
+    exchange.stop()
+    with pytest.raises(ConnectionError, match="no recent snapshot"):
+        fetcher.fetch(PAIRS)
@@ -0,0 +1,117 @@
+"""The outbound scheduler against bench.fake_exchange enforcing Binance's weight limits."""
+import multiprocessing
+import threading
+import time
+import pytest
+import requests
+from outbound import BACKFILL, LIVE, UNLIMITED, USED_WEIGHT_HEADER, OutboundScheduler, RateLimit, RateLimited
+
+WEIGHT = 2  # of one /api/v3/klines call, as the fake exchange counts it
+PARAMS = {"symbol": "ETHUSDT", "interval": "1m", "limit": 1}
+
+def _klines_url(exchange):
+    return f"{exchange.url}/api/v3/klines"
+
+def _scheduler(exchange, state_path, limit, live_reserve=0.2):
+    return OutboundScheduler({exchange.url: limit}, state_path=str(state_path), live_reserve=live_reserve)
+
+def _get(scheduler, exchange, priority=LIVE, max_wait=None):
+    return scheduler.get(requests.Session(), _klines_url(exchange), priority, WEIGHT, params=PARAMS, timeout=5, max_wait=max_wait)
+
+def _fresh_minute():
+    # The exchange and the scheduler both count weight per clock minute; don't straddle one
+    if time.time() % 60 > 50:
+        time.sleep(60.5 - time.time() % 60)
+
+def test_bucket_refills(fake_exchange, tmp_path):
+    exchange = fake_exchange(weight_limit=10_000)
+    # 10 weight per second: five calls empty the bucket, the sixth waits for 2 tokens
+    scheduler = _scheduler(exchange, tmp_path, RateLimit(10, 1, None))
+    start = time.monotonic()
+    for _ in range(5):
+        assert _get(scheduler, exchange).status_code == 200
+    assert time.monotonic() - start < 0.15
+    assert _get(scheduler, exchange).status_code == 200
+    assert 0.1 < time.monotonic() - start < 1.0
+
+def test_used_weight_header_caps_the_minute(fake_exchange, tmp_path):
+    _fresh_minute()
+    exchange = fake_exchange(weight_limit=20)
+    # Another client on the same IP spends most of the minute's weight
+    for _ in range(8):
+        requests.get(_klines_url(exchange), params=PARAMS, timeout=5).raise_for_status()
+    scheduler = _scheduler(exchange, tmp_path, RateLimit(20, 60, USED_WEIGHT_HEADER))
+    response = _get(scheduler, exchange)
+    assert response.headers[USED_WEIGHT_HEADER] == "18"
+    assert _get(scheduler, exchange).status_code == 200
+    # The bucket still holds tokens, but the exchange says the minute is spent
+    with pytest.raises(RateLimited):
+        _get(scheduler, exchange, max_wait=1)
+    assert exchange.requests["throttled"] == 0
+
+def _acquire_in_another_process(url, state_path):
+    scheduler = OutboundScheduler({url: UNLIMITED}, state_path=state_path)
+    try:
+        scheduler.acquire(f"{url}/api/v3/klines", WEIGHT, LIVE, max_wait=1)
+    except RateLimited:
+        return "blocked"
+    return "admitted"
+
+@pytest.mark.parametrize("status", [429, 418])
+def test_throttled_response_blocks_every_process(fake_exchange, tmp_path, status):
+    _fresh_minute()
+    exchange = fake_exchange(weight_limit=4)
+    # Another client spends the minute's weight, and with 418 carries on until it is banned
+    for _ in range(2 if status == 429 else 13):
+        requests.get(_klines_url(exchange), params=PARAMS, timeout=5)
+    # No budget of its own: only the exchange's answer can hold the scheduler back
+    scheduler = _scheduler(exchange, tmp_path, UNLIMITED)
+    with pytest.raises(RateLimited):
+        _get(scheduler, exchange, max_wait=1)
+    calls = exchange.requests["klines"]
+    with multiprocessing.get_context("fork").Pool(1) as pool:
+        assert pool.apply(_acquire_in_another_process, (exchange.url, str(tmp_path))) == "blocked"
+    assert exchange.requests["klines"] == calls
+
+def test_backfill_leaves_the_live_reserve(fake_exchange, tmp_path):
+    exchange = fake_exchange(weight_limit=10_000)
+    # 10 weight a minute, 2 of them reserved for live requests
+    scheduler = _scheduler(exchange, tmp_path, RateLimit(10, 60, None), live_reserve=0.2)
+    admitted = 0
+    with pytest.raises(RateLimited):
+        while True:
+            _get(scheduler, exchange, BACKFILL, max_wait=0.2)
+            admitted += 1
+    assert admitted == 4
+    start = time.monotonic()
+    assert _get(scheduler, exchange, LIVE, max_wait=0.2).status_code == 200
+    assert time.monotonic() - start < 0.2
+
+def test_backfill_stands_aside_while_live_waits(fake_exchange, tmp_path):
+    exchange = fake_exchange(weight_limit=10_000)
+    # 1 weight a second and no reserve: a backfill call (weight 1) could go after 1s, the live one (weight 2) after 2s
+    scheduler = _scheduler(exchange, tmp_path, RateLimit(10, 10, None), live_reserve=0)
+    scheduler.acquire(_klines_url(exchange), 10, LIVE)
+    finished = {}
+
+    def live():
+        _get(scheduler, exchange, LIVE)
+        finished[LIVE] = time.monotonic()
+    thread = threading.Thread(target=live)
+    thread.start()
+    time.sleep(0.1)
+    scheduler.get(requests.Session(), _klines_url(exchange), BACKFILL, 1, params=PARAMS, timeout=5)
+    finished[BACKFILL] = time.monotonic()
+    thread.join()
+    assert finished[LIVE] <= finished[BACKFILL]
+
+def test_max_wait_raises_rate_limited(fake_exchange, tmp_path):
+    exchange = fake_exchange(weight_limit=10_000)
+    scheduler = _scheduler(exchange, tmp_path, RateLimit(2, 60, None))
+    assert _get(scheduler, exchange).status_code == 200
+    start = time.monotonic()
+    with pytest.raises(RateLimited):
+        _get(scheduler, exchange, max_wait=0.5)
+    # Raised as soon as the wait is known to be too long, without calling the exchange
+    assert time.monotonic() - start < 0.5
+    assert exchange.requests["klines"] == 1
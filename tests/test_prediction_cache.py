@@ -0,0 +1,76 @@
+"""SingleFlightCache under concurrent callers."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from prediction_cache import SingleFlightCache
+
+CALLERS = 8
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def _concurrent_calls(cache, key, result):
+    """CALLERS concurrent get_or_compute calls whose one computation returns result() once
+    every other caller waits on it; the futures of the calls and the computation count."""
+    release = threading.Event()
+    computed = []
+
+    def compute():
+        computed.append(key)
+        release.wait(5)
+        return result()
+    pool = ThreadPoolExecutor(CALLERS)
+    futures = [pool.submit(cache.get_or_compute, key, compute) for _ in range(CALLERS)]
+    _wait_for(lambda: cache.stats()["misses"] + cache.stats()["coalesced"] == CALLERS)
+    release.set()
+    pool.shutdown(wait=True)
+    return futures, computed
+
+def test_concurrent_misses_share_one_computation():
+    cache = SingleFlightCache()
+    futures, computed = _concurrent_calls(cache, "eth", lambda: (42.0, True))
+    assert [future.result() for future in futures] == [42.0] * CALLERS
+    assert computed == ["eth"]
+    assert cache.stats() == {"hits": 0, "misses": 1, "coalesced": CALLERS - 1, "entries": 1}
+    assert cache.get_or_compute("eth", lambda: (0.0, True)) == 42.0
+    assert cache.stats()["hits"] == 1
+
+def test_uncacheable_result_is_shared_but_not_kept():
+    cache = SingleFlightCache()
+    futures, computed = _concurrent_calls(cache, "eth", lambda: (42.0, False))
+    assert [future.result() for future in futures] == [42.0] * CALLERS
+    assert computed == ["eth"]
+    assert cache.stats()["entries"] == 0
+    # The next call computes again
+    assert cache.get_or_compute("eth", lambda: (43.0, True)) == 43.0
+    assert cache.stats()["misses"] == 2
+
+def test_exception_reaches_every_waiter():
+    cache = SingleFlightCache()
+
+    def fail():
+        raise ConnectionError("exchange unreachable")
+    futures, computed = _concurrent_calls(cache, "eth", fail)
+    for future in futures:
+        with pytest.raises(ConnectionError, match="exchange unreachable"):
+            future.result()
+    assert computed == ["eth"]
+    # Nothing is left in flight: the next call computes instead of waiting on the failure
+    assert cache._in_flight == {}
+    assert cache.get_or_compute("eth", lambda: (42.0, True)) == 42.0
+    assert cache.stats() == {"hits": 0, "misses": 2, "coalesced": CALLERS - 1, "entries": 1}
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SingleFlightCache(max_entries=2)
+    cache.get_or_compute("a", lambda: (1, True))
+    cache.get_or_compute("b", lambda: (2, True))
+    # Reading a makes b the least recently used
+    assert cache.get_or_compute("a", lambda: (0, True)) == 1
+    cache.get_or_compute("c", lambda: (3, True))
+    assert list(cache._values) == ["a", "c"]
+    assert cache.get_or_compute("b", lambda: (4, True)) == 4
+    assert list(cache._values) == ["c", "b"]
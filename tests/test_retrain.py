@@ -0,0 +1,35 @@
+"""Retrain job status: a job counts as running only while its own process does, and a finished one is recorded once."""
+import multiprocessing
+import os
+import time
+import pytest
+import retrain
+
+@pytest.fixture(autouse=True)
+def status_file():
+    # The status lives in the tests' temporary data directory
+    os.makedirs(os.path.dirname(retrain.retrain_status_path), exist_ok=True)
+    yield retrain.retrain_status_path
+    if os.path.exists(retrain.retrain_status_path):
+        os.remove(retrain.retrain_status_path)
+
+def _running(**fields):
+    retrain._write_status({"job_id": "1", "state": "training", "updated_at": time.time(), **fields})
+    return retrain.retrain_status()["state"]
+
+def test_job_of_a_live_process_is_running():
+    assert _running(pid=os.getpid(), pid_identity=retrain.process_identity(os.getpid())) == "training"
+
+def test_reused_pid_is_not_the_job():
+    # After a restart another process (here: this one) can hold the crashed job's pid
+    assert _running(pid=os.getpid(), pid_identity="another-boot:12345") == "failed"
+
+def _claimed(_):
+    return retrain.claim_finished_status() is not None
+
+def test_finished_job_is_claimed_by_one_worker():
+    retrain._write_status({"job_id": "1", "state": "succeeded", "stages": {"parse": 1.0}, "updated_at": time.time()})
+    # As the server's workers would, each serving /metrics
+    with multiprocessing.get_context("fork").Pool(3) as pool:
+        assert sum(pool.map(_claimed, range(6))) == 1
+    assert retrain.claim_finished_status() is None
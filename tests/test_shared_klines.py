@@ -0,0 +1,141 @@
+"""The serving sidecar's shared state: the kline ring the workers read and the model coordinator."""
+import multiprocessing
+import os
+import time
+import numpy as np
+import pytest
+from artifacts import current_version, publish_artifacts, serving_pointer_path, token_artifacts_path
+from kline_decode import KLINE_FIELDS, KLINE_INTERVAL_MS
+from live_feed import last_closed_open_time
+from serving import ModelCoordinator
+from shared_klines import SharedKlineFeed, SharedKlineRing
+from config import SHARED_STATE_PATH
+
+PAIRS = ["ETHUSDT", "BTCUSDT"]
+SIZE = 4
+
+def _bar(open_time):
+    # Every field carries the open time, so a torn copy shows up as a mismatch
+    return np.full(len(KLINE_FIELDS), float(open_time))
+
+def _open_times(first, count):
+    return [first + i * KLINE_INTERVAL_MS for i in range(count)]
+
+@pytest.fixture
+def ring_path(tmp_path):
+    return str(tmp_path / "klines.ring")
+
+def test_window_appends_replaces_and_rejects(ring_path):
+    window = SharedKlineRing.create(ring_path, PAIRS, SIZE).windows()["ETHUSDT"]
+    assert len(window) == 0 and window.last_open_time is None
+    for open_time in _open_times(0, 3):
+        assert window.append(open_time, _bar(open_time))
+    # The last bar is updated in place, an older one is dropped
+    assert window.append(2 * KLINE_INTERVAL_MS, _bar(7))
+    assert not window.append(KLINE_INTERVAL_MS, _bar(1))
+    open_time, values = window.arrays()
+    assert open_time.tolist() == _open_times(0, 3)
+    assert values[:, 0].tolist() == [0.0, float(KLINE_INTERVAL_MS), 7.0]
+    assert window.last_open_time == 2 * KLINE_INTERVAL_MS
+
+def test_window_wraps_around(ring_path):
+    windows = SharedKlineRing.create(ring_path, PAIRS, SIZE).windows()
+    for open_time in _open_times(0, SIZE + 3):
+        windows["ETHUSDT"].append(open_time, _bar(open_time))
+    open_time, values = windows["ETHUSDT"].arrays()
+    assert len(windows["ETHUSDT"]) == SIZE
+    assert open_time.tolist() == _open_times(3 * KLINE_INTERVAL_MS, SIZE)
+    assert np.array_equal(values[:, 0], open_time)
+    assert windows["ETHUSDT"].arrays(until_open_time=4 * KLINE_INTERVAL_MS)[0].tolist() == _open_times(3 * KLINE_INTERVAL_MS, 2)
+    # The other pair's window is untouched
+    assert len(windows["BTCUSDT"]) == 0
+
+def test_window_clear(ring_path):
+    window = SharedKlineRing.create(ring_path, PAIRS, SIZE).windows()["ETHUSDT"]
+    for open_time in _open_times(0, 3):
+        window.append(open_time, _bar(open_time))
+    window.clear()
+    assert len(window) == 0 and window.last_open_time is None
+    window.append(10 * KLINE_INTERVAL_MS, _bar(10 * KLINE_INTERVAL_MS))
+    assert window.arrays()[0].tolist() == [10 * KLINE_INTERVAL_MS]
+
+def test_feed_snapshot_is_cut_at_the_last_common_bar(ring_path):
+    feed = SharedKlineFeed(ring_path, PAIRS, SIZE)
+    assert feed.snapshot() is None
+    ring = SharedKlineRing.create(ring_path, PAIRS, SIZE)
+    windows = ring.windows()
+    last_closed = last_closed_open_time()
+    for open_time in _open_times(last_closed - 3 * KLINE_INTERVAL_MS, 4):
+        windows["ETHUSDT"].append(open_time, _bar(open_time))
+    # Until every pair has a bar there is nothing to serve
+    assert feed.snapshot() is None
+    for open_time in _open_times(last_closed - 3 * KLINE_INTERVAL_MS, 3):
+        windows["BTCUSDT"].append(open_time, _bar(open_time))
+    snapshot = feed.snapshot()
+    assert sorted(snapshot) == sorted(PAIRS)
+    for open_time, values in snapshot.values():
+        assert open_time.tolist() == _open_times(last_closed - 3 * KLINE_INTERVAL_MS, 3)
+        assert np.array_equal(values[:, 0], open_time)
+    assert not feed.is_fresh()
+    ring.set_ready()
+    assert feed.is_fresh()
+    # A restarted sidecar replaces the file: the feed maps the new, empty ring
+    SharedKlineRing.create(ring_path, PAIRS, SIZE)
+    assert feed.snapshot() is None
+
+def _torn_reads(ring_path, seconds):
+    feed = SharedKlineFeed(ring_path, PAIRS, SIZE)
+    torn, reads, deadline = 0, 0, time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        snapshot = feed.snapshot()
+        if snapshot is None:
+            continue
+        reads += 1
+        for open_time, values in snapshot.values():
+            if not np.array_equal(values, np.repeat(open_time[:, None].astype(float), len(KLINE_FIELDS), axis=1)) or (
+                    np.any(np.diff(open_time) != KLINE_INTERVAL_MS)):
+                torn += 1
+    return torn, reads
+
+def test_reader_in_another_process_never_sees_a_partial_write(ring_path):
+    windows = SharedKlineRing.create(ring_path, PAIRS, SIZE).windows()
+    with multiprocessing.get_context("fork").Pool(1) as pool:
+        result = pool.apply_async(_torn_reads, (ring_path, 0.5))
+        open_time = 0
+        while not result.ready():
+            for window in windows.values():
+                window.append(open_time, _bar(open_time))
+            open_time += KLINE_INTERVAL_MS
+        torn, reads = result.get()
+    assert reads > 0 and torn == 0
+
+def _publish(token, weights):
+    return publish_artifacts({"weights": weights}, {"model": "LinearRegression"}, path=token_artifacts_path(token))
+
+def _serving(token):
+    with open(serving_pointer_path(token)) as f:
+        return f.read().strip()
+
+def test_coordinator_never_publishes_a_version_that_fails_to_load(capsys):
+    token = "COORD"
+    # As run_sidecar does before its first poll
+    os.makedirs(SHARED_STATE_PATH, exist_ok=True)
+    good = _publish(token, np.zeros(3))
+    coordinator = ModelCoordinator([token])
+    coordinator.poll()
+    assert _serving(token) == good
+    broken = _publish(token, np.ones(3))
+    with open(f"{token_artifacts_path(token)}/{broken}/weights.npy", "wb") as f:
+        f.write(b"not an array")
+    coordinator.poll()
+    assert current_version(token_artifacts_path(token)) == broken
+    assert _serving(token) == good
+    assert f"Not publishing {token} model version {broken}" in capsys.readouterr().out
+    # The broken version is not tried again on every poll
+    coordinator.poll()
+    assert capsys.readouterr().out == ""
+    fixed = _publish(token, np.ones(3))
+    coordinator.poll()
+    assert _serving(token) == fixed
+    # A restarted sidecar carries on from the pointer the workers follow
+    assert ModelCoordinator([token]).serving == {token: fixed}
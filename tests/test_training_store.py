@@ -0,0 +1,30 @@
+"""The training store: contiguous token blocks, the last good store kept when a format yields no rows, and no CoinGecko training."""
+import numpy as np
+import pytest
+import model
+from tokens import TOKEN_REGISTRY, token_spec
+from training_store import open_training_store, store_columns
+
+def test_token_columns_are_views(training_files):
+    assert model.format_data(training_files, "binance")
+    store = open_training_store()
+    for spec in TOKEN_REGISTRY.values():
+        assert np.shares_memory(store_columns(store, spec.features), store.matrix)
+        assert np.shares_memory(store_columns(store, spec.targets), store.matrix)
+
+def test_format_without_rows_keeps_store(training_files, daily_zips, monkeypatch):
+    assert model.format_data(training_files, "binance")
+    before = open_training_store().schema
+    # A horizon longer than the data leaves no row with a target
+    monkeypatch.setattr(model, "PREDICTION_HORIZONS", ["3d"])
+    files = daily_zips(["ETHUSDT", "BTCUSDT"], days=["2026-03-01"])
+    assert not model.format_data(files, "binance", registry={"ETH": token_spec("ETH", ["3d"])})
+    after = open_training_store().schema
+    assert after == before and after["rows"] > 0
+
+def test_coingecko_training_is_rejected(training_files):
+    assert model.format_data(training_files, "binance")
+    before = open_training_store().schema
+    with pytest.raises(ValueError, match="DATA_PROVIDER=binance"):
+        model.format_data({pair: ["bitcoin_ohlc.json"] for pair in training_files}, "coingecko")
+    assert open_training_store().schema == before
@@ -0,0 +1,86 @@
+"""Daily zip downloads from bench.fake_exchange, with the failures it can stage."""
+import os
+import pytest
+from bench.fake_exchange import daily_zip
+from updater import download_files
+
+PAIR = "ETHUSDT"
+DAY = "2026-03-01"
+
+@pytest.fixture
+def exchange(fake_exchange):
+    return fake_exchange()
+
+def _job(exchange, tmp_path, day=DAY):
+    name = f"{PAIR}-1m-{day}.zip"
+    return f"{exchange.url}/data/spot/daily/klines/{PAIR}/1m/{name}", str(tmp_path / name)
+
+def _download(jobs, retries=3):
+    return download_files(jobs, concurrency=2, retries=retries, backoff=0)
+
+def _assert_downloaded(result, attempts):
+    assert (result.status, result.attempts, result.error) == ("downloaded", attempts, None)
+    with open(result.path, "rb") as f:
+        assert f.read() == daily_zip(PAIR, DAY)
+    assert not os.path.exists(f"{result.path}.part")
+
+def test_checksum_mismatch_discards_the_part_file(exchange, tmp_path):
+    exchange.app["faults"].append("corrupt")
+    [result] = _download([_job(exchange, tmp_path)])
+    # A resumed .part would keep the corrupt bytes: the retry has to start over
+    _assert_downloaded(result, 2)
+
+def test_every_attempt_corrupt_fails(exchange, tmp_path):
+    exchange.app["faults"].extend(["corrupt", "corrupt"])
+    url, file_name = _job(exchange, tmp_path)
+    [result] = _download([(url, file_name)], retries=2)
+    assert (result.status, result.path, result.attempts) == ("failed", None, 2)
+    assert "does not match" in result.error
+    assert not os.path.exists(file_name) and not os.path.exists(f"{file_name}.part")
+
+def test_partial_download_is_resumed(exchange, tmp_path):
+    url, file_name = _job(exchange, tmp_path)
+    with open(f"{file_name}.part", "wb") as f:
+        f.write(daily_zip(PAIR, DAY)[:1000])
+    # Answered 206 with the rest of the file, appended to what is there
+    _assert_downloaded(_download([(url, file_name)])[0], 1)
+
+def test_full_response_to_a_range_rewrites_the_part_file(exchange, tmp_path):
+    url, file_name = _job(exchange, tmp_path)
+    with open(f"{file_name}.part", "wb") as f:
+        f.write(b"stale" * 200)
+    exchange.app["faults"].append("ignore_range")
+    _assert_downloaded(_download([(url, file_name)])[0], 1)
+
+def test_unsatisfiable_range_restarts_the_download(exchange, tmp_path):
+    url, file_name = _job(exchange, tmp_path)
+    with open(f"{file_name}.part", "wb") as f:
+        f.write(b"stale" * 200)
+    exchange.app["faults"].append("unsatisfiable_range")
+    _assert_downloaded(_download([(url, file_name)])[0], 2)
+
+def test_truncated_zip_is_downloaded_again(exchange, tmp_path):
+    url, file_name = _job(exchange, tmp_path)
+    with open(file_name, "wb") as f:
+        f.write(daily_zip(PAIR, DAY)[:1000])
+    _assert_downloaded(_download([(url, file_name)])[0], 1)
+
+def test_result_per_job(exchange, tmp_path):
+    cached = _job(exchange, tmp_path, "2026-02-28")
+    with open(cached[1], "wb") as f:
+        f.write(daily_zip(PAIR, "2026-02-28"))
+    # The exchange has no files for days that have not ended
+    jobs = [cached, _job(exchange, tmp_path), _job(exchange, tmp_path, "2099-01-01")]
+    results = _download(jobs)
+    assert [(result.url, result.status) for result in results] == [
+        (jobs[0][0], "cached"), (jobs[1][0], "downloaded"), (jobs[2][0], "not_found")]
+    assert [result.path for result in results] == [cached[1], jobs[1][1], None]
+    # The cached file took no request, the others one checksum and one download each
+    assert exchange.requests["daily"] == 4
+
+def test_unchanged_file_is_not_modified(exchange, tmp_path):
+    job = (f"{exchange.url}/coingecko/api/v3/coins/ethereum/ohlc?vs_currency=usd&days=7", str(tmp_path / "ethereum_ohlc.json"))
+    options = dict(verify_checksum=False, overwrite=True, conditional=True, backoff=0)
+    assert download_files([job], **options)[0].status == "downloaded"
+    assert download_files([job], **options)[0].status == "not_modified"
+    assert exchange.requests["not_modified"] == 1
@@ -0,0 +1,27 @@
+from collections import namedtuple
+from features import feature_columns, target_columns
+from config import TOKENS, PREDICTION_HORIZONS
+
+# A token's model uses its own USDT pair plus one reference pair: BTC for every token
+# except BTC itself, which uses ETH
+REFERENCE_PAIRS = ["BTCUSDT", "ETHUSDT"]
+
+TokenSpec = namedtuple("TokenSpec", ["token", "pair", "pairs", "features", "targets"])
+
+def token_spec(token, horizons=PREDICTION_HORIZONS):
+    pair = f"{token}USDT"
+    reference = next(p for p in REFERENCE_PAIRS if p != pair)
+    pairs = [pair, reference]
+    return TokenSpec(token, pair, pairs, feature_columns(pairs, pair), target_columns(horizons, pair))
+
+TOKEN_REGISTRY = {token: token_spec(token) for token in TOKENS}
+
+def registry_pairs(registry=TOKEN_REGISTRY):
+    """Every pair some model of the registry needs, each once, in registry order."""
+    pairs = []
+    for spec in registry.values():
+        pairs += [pair for pair in spec.pairs if pair not in pairs]
+    return pairs
+
+def pair_token(pair):
+    return pair[:-len("USDT")]
@@ -0,0 +1,84 @@
+import json
+import os
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from config import data_base_path
+
+training_store_path = os.path.join(data_base_path, "training_store")
+
+SCHEMA_FILE = "schema.json"
+STORE_VERSION = 1
+
+TrainingStore = namedtuple("TrainingStore", ["index", "matrix", "columns", "schema"])
+
+def training_store_exists(path=training_store_path):
+    return os.path.exists(os.path.join(path, SCHEMA_FILE))
+
+def write_training_store(df, path=training_store_path, dtype=np.float64):
+    """Write a formatted frame as a memory-mappable columnar store.
+
+    The store is an int64 nanosecond timestamp index, one (columns x rows) matrix whose
+    rows are the frame's columns, and a small JSON schema. The schema is written last
+    and atomically replaced, so readers always see a complete generation.
+    """
+    os.makedirs(path, exist_ok=True)
+    generation = time.time_ns()
+    index_file = f"index-{generation}.npy"
+    matrix_file = f"matrix-{generation}.npy"
+
+    np.save(os.path.join(path, index_file), df.index.values.astype("datetime64[ns]").view(np.int64))
+    matrix = np.lib.format.open_memmap(os.path.join(path, matrix_file), mode="w+", dtype=dtype, shape=(df.shape[1], df.shape[0]))
+    # By position: a column name can repeat, once per token block
+    for i in range(df.shape[1]):
+        matrix[i] = df.iloc[:, i].to_numpy(dtype=dtype)
+    matrix.flush()
+    del matrix
+
+    schema = {
+        "version": STORE_VERSION,
+        "rows": int(df.shape[0]),
+        "columns": [str(column) for column in df.columns],
+        "dtype": np.dtype(dtype).name,
+        "index": index_file,
+        "matrix": matrix_file,
+    }
+    tmp_schema = os.path.join(path, f"{SCHEMA_FILE}.tmp")
+    with open(tmp_schema, "w") as f:
+        json.dump(schema, f)
+    os.replace(tmp_schema, os.path.join(path, SCHEMA_FILE))
+
+    # Drop the arrays of older generations; readers that still map them keep their pages
+    for name in os.listdir(path):
+        if name.endswith(".npy") and name not in (index_file, matrix_file):
+            os.remove(os.path.join(path, name))
+
+def open_training_store(path=training_store_path, schema=None):
+    """Map the current generation of the training store read-only, without copying it.
+
+    Passing the schema of an already opened store maps that same generation, so worker
+    processes share its pages instead of receiving a pickled copy.
+    """
+    if schema is None:
+        with open(os.path.join(path, SCHEMA_FILE)) as f:
+            schema = json.load(f)
+    if schema.get("version") != STORE_VERSION:
+        raise ValueError(f"Unsupported training store version {schema.get('version')} in {path}")
+    index = np.load(os.path.join(path, schema["index"]), mmap_mode="r")
+    matrix = np.load(os.path.join(path, schema["matrix"]), mmap_mode="r")
+    if matrix.shape != (len(schema["columns"]), schema["rows"]) or len(index) != schema["rows"]:
+        raise ValueError(f"Training store in {path} does not match its schema")
+    return TrainingStore(index, matrix, schema["columns"], schema)
+
+def store_datetime_index(store):
+    return pd.DatetimeIndex(store.index.view("datetime64[ns]"), name="date")
+
+def store_columns(store, columns, rows=slice(None)):
+    """Return the requested columns (and rows) as a (rows x columns) view when the store holds
+    them as one contiguous block, as format_data writes each token's features, else a copy."""
+    columns = list(columns)
+    for start, column in enumerate(store.columns):
+        if column == columns[0] and store.columns[start:start + len(columns)] == columns:
+            return store.matrix[start:start + len(columns), rows].T
+    return store.matrix[[store.columns.index(column) for column in columns], rows].T
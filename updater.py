@@ -1,91 +1,144 @@
+import asyncio
+import hashlib
+import json
 import os
+import zipfile
+from collections import Counter, namedtuple
 from datetime import date, timedelta
 import pathlib
-import time
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
-from concurrent.futures import ThreadPoolExecutor
-import pandas as pd
-import json
-
-# Define the retry strategy
-retry_strategy = Retry(
-    total=4,
-    backoff_factor=2,
-    status_forcelist=[429, 500, 502, 503, 504],
-)
-
-adapter = HTTPAdapter(max_retries=retry_strategy)
-session = requests.Session()
-session.mount('http://', adapter)
-session.mount('https://', adapter)
-
-files = []
-
-def download_url(url, download_path, name=None):
-    global files
+import aiohttp
+from outbound import BACKFILL, RateLimited, conditional_headers, response_validators, scheduler
+from config import BINANCE_DATA_URL, COINGECKO_API_URL, DOWNLOAD_CONCURRENCY
+
+DownloadResult = namedtuple("DownloadResult", ["url", "path", "status", "sha256", "attempts", "error"])
+
+class ChecksumMismatch(Exception):
+    pass
+
+def _sha256(file_name):
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def _fetch_checksum(session, url, priority):
+    """Expected sha256 from Binance's "<hash>  <file>" .CHECKSUM file, or None if there is none."""
+    async with await scheduler.get_async(session, f"{url}.CHECKSUM", priority) as response:
+        if response.status == 404:
+            return None
+        response.raise_for_status()
+        return (await response.text()).split()[0].lower()
+
+def _read_validators(file_name):
     try:
-        if name:
-            file_name = os.path.join(download_path, name)
-        else:
-            file_name = os.path.join(download_path, os.path.basename(url))
-        dir_path = os.path.dirname(file_name)
-        pathlib.Path(dir_path).mkdir(parents=True, exist_ok=True)
-        if os.path.isfile(file_name):
-            print(f"{file_name} already exists, skipping download")
-            files.append(file_name)
-            return
-        print(f"Attempting to download: {url}")
-        response = session.get(url)
-        if response.status_code == 404:
-            print(f"File not found (404): {url}")
-        elif response.status_code == 200:
-            with open(file_name, 'wb') as f:
-                f.write(response.content)
-            print(f"Successfully downloaded: {url} to {file_name}")
-            files.append(file_name)
-        else:
-            print(f"Failed to download {url}, status code: {response.status_code}")
-    except Exception as e:
-        print(f"Error downloading {url}: {str(e)}")
+        with open(f"{file_name}.validators") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _write_validators(file_name, validators):
+    if validators is None:
+        if os.path.exists(f"{file_name}.validators"):
+            os.remove(f"{file_name}.validators")
+        return
+    with open(f"{file_name}.validators", "w") as f:
+        json.dump(validators, f)
+
+async def _download_file(session, semaphore, url, file_name, verify_checksum, overwrite, retries, backoff, priority, conditional):
+    if not overwrite and os.path.isfile(file_name):
+        # Files are only renamed into place once complete, but older runs wrote in place
+        if not file_name.endswith(".zip") or zipfile.is_zipfile(file_name):
+            return DownloadResult(url, file_name, "cached", None, 0, None)
+        print(f"{file_name} is not a valid zip, downloading it again")
+        os.remove(file_name)
+
+    pathlib.Path(os.path.dirname(file_name)).mkdir(parents=True, exist_ok=True)
+    part_file = f"{file_name}.part"
+    error = None
+    async with semaphore:
+        for attempt in range(1, retries + 1):
+            try:
+                expected = await _fetch_checksum(session, url, priority) if verify_checksum else None
+                # Resume a partial download left by a failed attempt or an interrupted run
+                offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+                headers = {"Range": f"bytes={offset}-"} if offset else {}
+                if conditional and os.path.isfile(file_name):
+                    headers.update(conditional_headers(_read_validators(file_name)))
+                async with await scheduler.get_async(session, url, priority, headers=headers) as response:
+                    if response.status == 404:
+                        return DownloadResult(url, None, "not_found", None, attempt, None)
+                    if response.status == 304:
+                        return DownloadResult(url, file_name, "not_modified", None, attempt, None)
+                    if response.status == 416:
+                        os.remove(part_file)
+                        raise aiohttp.ClientError("Range not satisfiable, restarting download")
+                    response.raise_for_status()
+                    mode = "ab" if response.status == 206 else "wb"
+                    with open(part_file, mode) as f:
+                        async for chunk in response.content.iter_chunked(1 << 16):
+                            f.write(chunk)
+                sha256 = _sha256(part_file)
+                if expected and sha256 != expected:
+                    os.remove(part_file)
+                    raise ChecksumMismatch(f"sha256 {sha256} does not match {expected}")
+                os.replace(part_file, file_name)
+                if conditional:
+                    _write_validators(file_name, response_validators(response.headers))
+                return DownloadResult(url, file_name, "downloaded", sha256, attempt, None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ChecksumMismatch, RateLimited) as e:
+                error = str(e) or type(e).__name__
+                print(f"Attempt {attempt}/{retries} to download {url} failed: {error}")
+                # After a 429 the scheduler already holds the next attempt for the Retry-After
+                if attempt < retries and not isinstance(e, RateLimited):
+                    await asyncio.sleep(backoff * 2 ** (attempt - 1))
+    return DownloadResult(url, None, "failed", None, retries, error)
+
+async def _download_files(jobs, concurrency, verify_checksum, overwrite, retries, backoff, priority, conditional):
+    semaphore = asyncio.Semaphore(concurrency)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        return await asyncio.gather(*(
+            _download_file(session, semaphore, url, file_name, verify_checksum, overwrite, retries, backoff, priority, conditional)
+            for url, file_name in jobs
+        ))
+
+def download_files(jobs, concurrency=DOWNLOAD_CONCURRENCY, verify_checksum=True, overwrite=False, retries=4, backoff=2,
+                   priority=BACKFILL, conditional=False):
+    """Download (url, file_name) pairs with at most `concurrency` transfers in flight.
+
+    Each file is streamed to <file_name>.part, checked against the published .CHECKSUM
+    when verify_checksum is set, and renamed into place. Failed attempts are retried and
+    resume from the partial file. Every request is admitted by the outbound scheduler at
+    the given priority. With conditional, a file fetched again is revalidated with the
+    ETag / Last-Modified of its last download and kept when unchanged (status not_modified).
+    Returns one DownloadResult per job, in order.
+    """
+    return asyncio.run(_download_files(jobs, concurrency, verify_checksum, overwrite, retries, backoff, priority, conditional))
+
+def _report(results):
+    counts = Counter(result.status for result in results)
+    print(f"Download results: {dict(counts)}")
+    for result in results:
+        if result.status == "failed":
+            print(f"Failed to download {result.url} after {result.attempts} attempts: {result.error}")
+    return [result.path for result in results if result.status in ("downloaded", "cached", "not_modified")]
 
 def daterange(start_date, end_date):
     for n in range(int((end_date - start_date).days)):
         yield start_date + timedelta(n)
 
 def download_binance_daily_data(pair, training_days, region, download_path):
-    base_url = f"https://data.binance.vision/data/spot/daily/klines"
+    base_url = f"{BINANCE_DATA_URL}/data/spot/daily/klines"
     end_date = date.today()  # Use real current date
     start_date = end_date - timedelta(days=int(training_days))
-    
-    global files
-    files = []
-
-    with ThreadPoolExecutor() as executor:
-        print(f"Downloading data for {pair} from {start_date} to {end_date}")
-        for single_date in daterange(start_date, end_date):
-            url = f"{base_url}/{pair}/1m/{pair}-1m-{single_date}.zip"
-            executor.submit(download_url, url, download_path)
-    
-    return files
-
-def download_binance_current_day_data(pair, region):
-    limit = 1000
-    base_url = f'https://api.binance.{region}/api/v3/klines?symbol={pair}&interval=1m&limit={limit}'
-    print(f"Fetching current day data from {base_url}")
-    response = session.get(base_url)
-    response.raise_for_status()
-    resp = str(response.content, 'utf-8').rstrip()
-
-    columns = ['start_time','open','high','low','close','volume','end_time','volume_usd','n_trades','taker_volume','taker_volume_usd','ignore']
-    
-    df = pd.DataFrame(json.loads(resp), columns=columns)
-    df['date'] = [pd.to_datetime(x+1, unit='ms') for x in df['end_time']]
-    df['date'] = df['date'].apply(pd.to_datetime)
-    df[["volume", "taker_volume", "open", "high", "low", "close"]] = df[["volume", "taker_volume", "open", "high", "low", "close"]].apply(pd.to_numeric)
-
-    return df.sort_index()
+
+    print(f"Downloading data for {pair} from {start_date} to {end_date}")
+    jobs = []
+    for single_date in daterange(start_date, end_date):
+        url = f"{base_url}/{pair}/1m/{pair}-1m-{single_date}.zip"
+        jobs.append((url, os.path.join(download_path, os.path.basename(url))))
+    return _report(download_files(jobs))
 
 def get_coingecko_coin_id(token):
     token_map = {
@@ -121,31 +174,9 @@ def download_coingecko_data(token, training_days, download_path, CG_API_KEY):
     coin_id = get_coingecko_coin_id(token)
     print(f"Coin ID: {coin_id}")
 
-    url = f'https://api.coingecko.com/api/v3/coins/{coin_id}/ohlc?vs_currency=usd&days={days}&api_key={CG_API_KEY}'
-    global files
-    files = []
-
-    with ThreadPoolExecutor() as executor:
-        print(f"Downloading data for {coin_id}")
-        name = os.path.basename(url).split("?")[0].replace("/", "_") + ".json"
-        executor.submit(download_url, url, download_path, name)
-    
-    return files
-
-def download_coingecko_current_day_data(token, CG_API_ID):
-    coin_id = get_coingecko_coin_id(token)
-    print(f"Coin ID: {coin_id}")
-
-    url = f'https://api.coingecko.com/api/v3/coins/{coin_id}/ohlc?vs_currency=usd&days=1&api_key={CG_API_KEY}'
-    response = session.get(url)
-    response.raise_for_status()
-    resp = str(response.content, 'utf-8').rstrip()
-
-    columns = ['timestamp','open','high','low','close']
-    
-    df = pd.DataFrame(json.loads(resp), columns=columns)
-    df['date'] = [pd.to_datetime(x, unit='ms') for x in df['timestamp']]
-    df['date'] = df['date'].apply(pd.to_datetime)
-    df[["open", "high", "low", "close"]] = df[["open", "high", "low", "close"]].apply(pd.to_numeric)
-
-    return df.sort_index()
+    url = f'{COINGECKO_API_URL}/api/v3/coins/{coin_id}/ohlc?vs_currency=usd&days={days}&api_key={CG_API_KEY}'
+    print(f"Downloading data for {coin_id}")
+    # The OHLC payload moves with every new candle, so it is fetched again each update, but
+    # conditionally: until a candle closes CoinGecko answers 304 and the saved file stays
+    name = f"{coin_id}_ohlc.json"
+    return _report(download_files([(url, os.path.join(download_path, name))], verify_checksum=False, overwrite=True, conditional=True))
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.model_selection import TimeSeriesSplit
+from features import horizon_minutes
+from tokens import TOKEN_REGISTRY
+from training_store import training_store_path, open_training_store, store_columns
+from config import TOKEN, PREDICTION_HORIZONS, INGEST_WORKERS
+
+ROWS_PER_DAY = 1440
+
+def walk_forward_folds(n_rows, n_folds=5, mode="expanding", train_rows=None, test_rows=None, gap=0):
+    """(train, test) row slices of each fold, oldest first.
+
+    "expanding" folds train on every row before their test block; "sliding" folds on the
+    last train_rows of them. gap rows are left out between the two, so training targets
+    never look into the test block.
+    """
+    if mode not in ["expanding", "sliding"]:
+        raise ValueError(f"Walk-forward mode must be 'expanding' or 'sliding', got: {mode}")
+    if mode == "sliding" and not train_rows:
+        raise ValueError("Sliding walk-forward folds need a training window size")
+    splitter = TimeSeriesSplit(n_splits=n_folds, max_train_size=train_rows if mode == "sliding" else None, test_size=test_rows, gap=gap)
+    # The splitter only needs the row count; a zero-width array avoids touching the data
+    return [(slice(int(train[0]), int(train[-1]) + 1), slice(int(test[0]), int(test[-1]) + 1)) for train, test in splitter.split(np.empty((n_rows, 0)))]
+
+def _evaluate_fold(task):
+    """Fit one fold in a worker process; the store is mapped, not sent to the worker."""
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    from sklearn.preprocessing import StandardScaler
+    from model import MODEL_REGISTRY, _evaluation_rows
+
+    start = time.perf_counter()
+    store = open_training_store(task["path"], task["schema"])
+    train, test = task["train"], task["test"]
+    X_train = store_columns(store, task["features"], train)
+    y_train = store_columns(store, task["targets"], train)
+    scaler = StandardScaler().fit(X_train)
+    model = MODEL_REGISTRY[task["model"]]["build"]()
+    model.fit(scaler.transform(X_train), y_train)
+    fit_seconds = time.perf_counter() - start
+
+    rows = _evaluation_rows(test.stop - test.start, MODEL_REGISTRY[task["model"]]["kind"])
+    X_test = store_columns(store, task["features"], test)[rows]
+    y_test = np.asarray(store_columns(store, task["targets"], test)[rows])
+    predictions = model.predict(scaler.transform(X_test)).reshape(y_test.shape)
+    residuals = y_test - predictions
+
+    metrics = {}
+    for i, horizon in enumerate(task["horizons"]):
+        metrics[horizon] = {
+            "mae": mean_absolute_error(y_test[:, i], predictions[:, i]),
+            "rmse": float(np.sqrt(mean_squared_error(y_test[:, i], predictions[:, i]))),
+            "r2": r2_score(y_test[:, i], predictions[:, i]),
+            "bias": float(residuals[:, i].mean()),
+        }
+    return {
+        "fold": task["fold"],
+        "train_rows": train.stop - train.start,
+        "test_rows": test.stop - test.start,
+        "train_start": str(np.datetime64(int(store.index[train.start]), "ns")),
+        "test_start": str(np.datetime64(int(store.index[test.start]), "ns")),
+        "test_end": str(np.datetime64(int(store.index[test.stop - 1]), "ns")),
+        "metrics": metrics,
+        "fit_seconds": fit_seconds,
+        "seconds": time.perf_counter() - start,
+    }
+
+def walk_forward_evaluate(model_name, token=TOKEN, n_folds=5, mode="expanding", window_days=None, gap=None, workers=INGEST_WORKERS, file_path=training_store_path):
+    """Walk-forward evaluation of one model over a token's rows of the training store.
+
+    Folds run across a process pool. Each worker maps the same store generation read-only,
+    so the feature matrix is shared through the page cache rather than copied per fold.
+    Returns the per-fold reports and a summary whose bias_correction (the mean signed test
+    residual over every fold, per horizon) training can persist instead of a single holdout's.
+    """
+    spec = TOKEN_REGISTRY[token]
+    store = open_training_store(file_path)
+    # By default the gap covers the longest horizon, the furthest a training target looks ahead
+    gap = max(horizon_minutes(h) for h in PREDICTION_HORIZONS) if gap is None else gap
+    train_rows = window_days * ROWS_PER_DAY if window_days else None
+    folds = walk_forward_folds(store.schema["rows"], n_folds, mode, train_rows, gap=gap)
+    tasks = [
+        {
+            "fold": i, "path": file_path, "schema": store.schema, "model": model_name, "features": spec.features,
+            "targets": spec.targets, "horizons": PREDICTION_HORIZONS, "train": train, "test": test,
+        }
+        for i, (train, test) in enumerate(folds)
+    ]
+
+    start = time.perf_counter()
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(_evaluate_fold, tasks))
+    else:
+        results = [_evaluate_fold(task) for task in tasks]
+
+    weights = np.array([result["test_rows"] for result in results], dtype=np.float64)
+    summary = {}
+    for horizon in PREDICTION_HORIZONS:
+        values = {name: np.array([result["metrics"][horizon][name] for result in results]) for name in ["mae", "rmse", "r2", "bias"]}
+        summary[horizon] = {
+            "mae": float(values["mae"].mean()),
+            "mae_std": float(values["mae"].std()),
+            "rmse": float(values["rmse"].mean()),
+            "r2": float(values["r2"].mean()),
+            "bias": float(np.average(values["bias"], weights=weights)),
+        }
+    return {
+        "model": model_name,
+        "token": token,
+        "mode": mode,
+        "window_days": window_days,
+        "gap": gap,
+        "folds": results,
+        "summary": summary,
+        "bias_correction": [summary[horizon]["bias"] for horizon in PREDICTION_HORIZONS],
+        "seconds": time.perf_counter() - start,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward evaluation of models and training windows over the training store")
+    parser.add_argument("--models", nargs="+", default=["LinearRegression"])
+    parser.add_argument("--token", default=TOKEN)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--mode", choices=["expanding", "sliding"], default="expanding")
+    parser.add_argument("--window-days", nargs="+", type=int, default=[None], help="training window lengths to compare (sliding mode)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--output", help="write every report to this JSON file")
+    args = parser.parse_args()
+
+    reports = []
+    for model_name in args.models:
+        for window_days in args.window_days:
+            report = walk_forward_evaluate(model_name, args.token, args.folds, args.mode, window_days, workers=args.workers)
+            reports.append(report)
+            window = f"{window_days}d" if window_days else "all"
+            for horizon, summary in report["summary"].items():
+                print(f"{model_name} window={window} {horizon}: MAE {summary['mae']:.4f} ± {summary['mae_std']:.4f}, RMSE {summary['rmse']:.4f}, R² {summary['r2']:.4f}, bias {summary['bias']:.4f} ({report['seconds']:.2f}s)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Reports written to {os.path.abspath(args.output)}")
+
+if __name__ == "__main__":
+    main()